@@ -1,6 +1,11 @@
 #!/usr/bin/env python
+import argparse
+
 from dotenv import load_dotenv
 
+from mavis.budget import RunBudget
+from mavis.batch import BatchLimits, load_action_scenes, run_batch
+from mavis.edits import create_model_router
 from mavis.mavis import run
 from mavis.vlm import OpenAIVLM
 from mavis.schema import ActionScene, RelativeWhere
@@ -14,7 +19,36 @@ load_dotenv()
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--manifest", help="JSONL/YAML file of action scenes to run as a batch"
+    )
+    parser.add_argument("--resume", help="UID of a run to resume (single-scene mode)")
+    parser.add_argument("--spec-workers", type=int, default=BatchLimits.spec_workers)
+    parser.add_argument("--render-workers", type=int, default=BatchLimits.render_workers)
+    parser.add_argument("--edit-workers", type=int, default=BatchLimits.edit_workers)
+    parser.add_argument(
+        "--max-usd", type=float, help="Estimated cost budget per run (per scene in batches)"
+    )
+    parser.add_argument(
+        "--max-wall-s", type=float, help="Time budget per run (per scene in batches)"
+    )
+    args = parser.parse_args()
+
     vlm = OpenAIVLM(model="gpt-5.2-2025-12-11")
+    # Adaptive edit model routing (static selection tables act as priors)
+    router = create_model_router()
+
+    if args.manifest is not None:
+        limits = BatchLimits(
+            spec_workers=args.spec_workers,
+            render_workers=args.render_workers,
+            edit_workers=args.edit_workers,
+            max_usd_per_scene=args.max_usd,
+            max_wall_s_per_scene=args.max_wall_s,
+        )
+        run_batch(vlm, load_action_scenes(args.manifest), limits, router=router)
+        return
 
     # action_scene = ActionScene(
     #     who="bird",
@@ -54,7 +88,13 @@ def main():
         where=RelativeWhere(preposition="over", what="sign"),
         to_whom="basketball",
     )
-    output_images = run(vlm, action_scene)
+    output_images = run(
+        vlm,
+        action_scene,
+        router=router,
+        resume_run_uid=args.resume,
+        budget=RunBudget(args.max_usd, args.max_wall_s),
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,330 @@
+import json
+import os
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from enum import StrEnum
+from pathlib import Path
+
+from mavis.budget import RunBudget
+from mavis.concurrency import (
+    PROVIDER_CONCURRENCY_LIMITS,
+    Provider,
+    set_provider_concurrency_limit,
+)
+from mavis.globals import BATCH_SUMMARIES_DIR_PATH, OUTPUT_DIR_PATH, RunContext
+from mavis.hedging import HedgeConfig
+from mavis.mavis import (
+    BackgroundMode,
+    ScenePlan,
+    edit_render,
+    iter_scene_renders,
+    plan_scene,
+)
+from mavis.routing import ModelRouter
+from mavis.schema import ActionScene
+from mavis.tracing import Tracer, submit_in_context, use_tracer
+from mavis.vlm import VLM
+
+
+# Seconds between rewrites of a running batch's summary (if any status changed)
+SUMMARY_WRITE_INTERVAL_S = 5.0
+
+
+@dataclass
+class BatchLimits:
+    """Worker pool sizes per stage, optional global provider concurrency limits, and
+    optional per-scene budgets (see budget.RunBudget).
+
+    Each stage has its own pool, so CPU-bound rendering and network-bound edits and
+    checks overlap across scenes instead of alternating.
+    """
+
+    spec_workers: int = 4  # Scene spec/param generation (VLM)
+    render_workers: int = 2  # Concurrent Blender processes
+    edit_workers: int = 16  # Per-render edit chains (fal edits + VLM checks)
+    openai_concurrency: int | None = None  # See concurrency.PROVIDER_CONCURRENCY_LIMITS
+    fal_concurrency: int | None = None
+    max_usd_per_scene: float | None = None
+    max_wall_s_per_scene: float | None = None
+
+
+class SceneStatus(StrEnum):
+    pending = "pending"
+    planning = "planning"
+    rendering = "rendering"
+    editing = "editing"
+    succeeded = "succeeded"  # All renders were edited successfully
+    partial = "partial"  # Some renders were edited successfully
+    failed = "failed"
+
+
+@dataclass
+class SceneRecord:
+    index: int
+    action_scene: str
+    run_uid: str | None = None
+    status: SceneStatus = SceneStatus.pending
+    n_renders: int = 0
+    n_successful_renders: int = 0
+    final_paths: list[str] | None = None
+    error: str | None = None
+    elapsed_s: float | None = None
+    cost_usd: float | None = None
+    trace_path: str | None = None
+
+
+def load_action_scenes(manifest_path: os.PathLike) -> list[ActionScene]:
+    """Load action scenes from a JSONL manifest (one per line) or a YAML list.
+
+    Entries use ActionScene's fields, e.g. ``{"who": "dog", "does": "chases", ...}``.
+    """
+    manifest_path = Path(manifest_path)
+    if manifest_path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("Reading YAML manifests requires PyYAML") from e
+        with open(manifest_path) as f:
+            entries = yaml.safe_load(f) or []
+    else:
+        with open(manifest_path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    return [ActionScene.model_validate(entry) for entry in entries]
+
+
+def _write_summary(entries: list[dict], summary_path: Path) -> None:
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = summary_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, summary_path)
+
+
+def run_batch(
+    vlm: VLM,
+    action_scenes: list[ActionScene],
+    limits: BatchLimits | None = None,
+    summary_path: os.PathLike | None = None,
+    structured_generation: bool = True,
+    hedge: HedgeConfig | None = None,
+    router: ModelRouter | None = None,
+    background_mode: BackgroundMode = BackgroundMode.generative,
+    local_pose_edits: bool = False,
+    output_dir: Path = OUTPUT_DIR_PATH,
+) -> list[SceneRecord]:
+    """Run the pipeline for many action scenes, scheduling all their stages together.
+
+    A scene moves from the spec pool to the render pool once planned, and each of
+    its renders moves to the edit pool as soon as Blender publishes it. Per-scene
+    status (including its estimated cost) is rewritten to ``summary_path`` (by
+    default in BATCH_SUMMARIES_DIR_PATH) every SUMMARY_WRITE_INTERVAL_S while it
+    changes, and once more when the batch ends. Each planned
+    scene's spans are written to its run's trace path once it finishes. Runs'
+    outputs go in ``output_dir``. Returns the final records.
+    """
+    limits = limits or BatchLimits()
+    batch_uid = f"{datetime.now().strftime('%y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    summary_path = Path(summary_path or BATCH_SUMMARIES_DIR_PATH / f"{batch_uid}.json")
+    records = [
+        SceneRecord(index=i, action_scene=action_scene.shorthand_str)
+        for i, action_scene in enumerate(action_scenes)
+    ]
+    start_times = {}
+    budgets = {
+        record.index: RunBudget(limits.max_usd_per_scene, limits.max_wall_s_per_scene)
+        for record in records
+    }
+    tracers = {record.index: Tracer() for record in records}
+    lock = threading.Lock()
+    all_finished = threading.Event()
+    summary_changed = threading.Event()
+    stop_writing_summary = threading.Event()
+    finished: set[int] = set()
+    n_unfinished = len(records)
+
+    def update(record: SceneRecord, **changes) -> None:
+        with lock:
+            for name, value in changes.items():
+                setattr(record, name, value)
+        summary_changed.set()
+
+    def write_summary() -> None:
+        summary_changed.clear()
+        with lock:
+            entries = [asdict(record) for record in records]
+        try:
+            _write_summary(entries, summary_path)
+        except OSError as e:
+            warnings.warn(f"Writing the batch summary failed: {e!r}")
+
+    def write_summary_periodically() -> None:
+        # Rewriting the summary on every status change would be quadratic in the
+        # number of scenes (and serialize the workers), so it is written in batches
+        while not stop_writing_summary.wait(SUMMARY_WRITE_INTERVAL_S):
+            if summary_changed.is_set():
+                write_summary()
+
+    def finish(record: SceneRecord, status: SceneStatus, error: str | None = None) -> None:
+        # Every scene is finished exactly once, even if recording its end fails,
+        # or run_batch would wait for it forever
+        nonlocal n_unfinished
+        with lock:
+            if record.index in finished:
+                return
+            finished.add(record.index)
+        print(f"Batch scene {record.index} ({record.action_scene}) {status}.")
+        try:
+            with lock:
+                record.status = status
+                record.error = error
+                record.elapsed_s = time.perf_counter() - start_times[record.index]
+                record.cost_usd = budgets[record.index].spent_usd
+            summary_changed.set()
+            if record.trace_path is not None:
+                tracers[record.index].export_chrome_trace(record.trace_path)
+        except Exception as e:
+            warnings.warn(f"Recording the end of scene {record.index} failed: {e!r}")
+        finally:
+            with lock:
+                n_unfinished -= 1
+                if n_unfinished == 0:
+                    all_finished.set()
+
+    def plan_stage(record: SceneRecord, action_scene: ActionScene) -> None:
+        start_times[record.index] = time.perf_counter()
+        try:
+            update(record, status=SceneStatus.planning)
+            with use_tracer(tracers[record.index]):
+                try:
+                    plan = plan_scene(
+                        vlm,
+                        action_scene,
+                        structured_generation,
+                        RunContext.create(action_scene.shorthand_str, output_dir),
+                        budget=budgets[record.index],
+                    )
+                except Exception as e:
+                    warnings.warn(f"Planning scene {record.index} failed: {e!r}")
+                    finish(record, SceneStatus.failed, repr(e))
+                    return
+                update(
+                    record,
+                    run_uid=plan.run_ctx.run_uid,
+                    trace_path=str(plan.run_ctx.trace_path),
+                )
+                # The render stage (and the edits it submits) record to the scene's tracer
+                submit_in_context(render_pool, render_stage, record, plan)
+        except Exception as e:
+            warnings.warn(f"Scheduling scene {record.index} failed: {e!r}")
+            finish(record, SceneStatus.failed, repr(e))
+
+    def render_stage(record: SceneRecord, plan: ScenePlan) -> None:
+        try:
+            update(record, status=SceneStatus.rendering)
+            edit_futures: list[Future] = []
+            render_error = None
+            try:
+                for render_id, render_path, masks in iter_scene_renders(plan):
+                    edit_futures.append(
+                        submit_in_context(
+                            edit_pool,
+                            edit_render,
+                            vlm=vlm,
+                            action_scene=plan.action_scene,
+                            action_scene_specs=plan.action_scene_specs,
+                            objects_are_animate=plan.objects_are_animate,
+                            run_ctx=plan.run_ctx,
+                            render_id=render_id,
+                            render_path=render_path,
+                            masks=masks,
+                            hedge=hedge,
+                            router=router,
+                            background_mode=background_mode,
+                            local_pose_edits=local_pose_edits,
+                            manifest=plan.manifest,
+                            budget=budgets[record.index],
+                        )
+                    )
+                    update(record, n_renders=len(edit_futures))
+            except Exception as e:
+                warnings.warn(f"Rendering scene {record.index} failed: {e!r}")
+                render_error = repr(e)
+            if not edit_futures:
+                finish(record, SceneStatus.failed, render_error or "No renders")
+                return
+            update(record, status=SceneStatus.editing)
+        except Exception as e:
+            warnings.warn(f"Rendering scene {record.index} failed: {e!r}")
+            finish(record, SceneStatus.failed, repr(e))
+            return
+
+        final_paths = []
+        n_pending = len(edit_futures)
+
+        def on_edit_done(future: Future) -> None:
+            nonlocal n_pending
+            try:
+                final_path = future.result()
+            except Exception as e:
+                warnings.warn(f"Editing a render of scene {record.index} failed: {e!r}")
+                final_path = None
+            with lock:
+                if final_path is not None:
+                    final_paths.append(str(final_path))
+                n_pending -= 1
+                is_last = n_pending == 0
+            if not is_last:
+                return
+            record.n_successful_renders = len(final_paths)
+            record.final_paths = sorted(final_paths)
+            if not final_paths:
+                finish(record, SceneStatus.failed, render_error or "All edits failed")
+            elif len(final_paths) < record.n_renders or render_error is not None:
+                finish(record, SceneStatus.partial, render_error)
+            else:
+                finish(record, SceneStatus.succeeded)
+
+        for future in edit_futures:
+            future.add_done_callback(on_edit_done)
+
+    # The batch's limits apply process-wide until it returns
+    previous_concurrency = dict(PROVIDER_CONCURRENCY_LIMITS)
+    if limits.openai_concurrency is not None:
+        set_provider_concurrency_limit(Provider.openai, limits.openai_concurrency)
+    if limits.fal_concurrency is not None:
+        set_provider_concurrency_limit(Provider.fal, limits.fal_concurrency)
+    write_summary()
+    summary_writer = threading.Thread(target=write_summary_periodically, daemon=True)
+    summary_writer.start()
+    try:
+        with (
+            ThreadPoolExecutor(limits.spec_workers) as spec_pool,
+            ThreadPoolExecutor(limits.render_workers) as render_pool,
+            ThreadPoolExecutor(limits.edit_workers) as edit_pool,
+        ):
+            for record, action_scene in zip(records, action_scenes):
+                spec_pool.submit(plan_stage, record, action_scene)
+            if records:
+                all_finished.wait()
+    finally:
+        stop_writing_summary.set()
+        summary_writer.join()
+        write_summary()
+        if router is not None:
+            try:
+                router.save()
+            except OSError as e:
+                warnings.warn(f"Saving the model routing statistics failed: {e!r}")
+        for provider, limit in previous_concurrency.items():
+            set_provider_concurrency_limit(provider, limit)
+
+    print(f"Batch summary written to {summary_path}")
+    usage_summary = getattr(vlm, "usage_summary", None)
+    if usage_summary is not None:
+        print(f"VLM usage by template: {json.dumps(usage_summary(), indent=2)}")
+    return records
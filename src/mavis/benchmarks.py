@@ -0,0 +1,434 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+
+from mavis.batch import BatchLimits, run_batch
+from mavis.budget import FAL_PRICES_PER_IMAGE
+from mavis.concurrency import (
+    PROVIDER_CONCURRENCY_LIMITS,
+    Provider,
+    set_provider_concurrency_limit,
+)
+from mavis.fakes import (
+    FAKE_VLM_MODEL,
+    SRC_DIR_PATH,
+    FakeOpenAIClient,
+    LatencyModel,
+    fake_blender,
+    fake_fal,
+    fake_scene_placements_response,
+    fake_scene_specs_response,
+)
+from mavis.globals import BENCHMARKS_DIR_PATH
+from mavis.prompts import (
+    render_check_object_preserved_prompt,
+    render_generate_scene_setup_code_prompt,
+    render_generate_scene_specs_prompt,
+)
+from mavis.resilience import (
+    DEFAULT_RATE_LIMITS,
+    clear_rate_limit,
+    get_rate_limit_override,
+    set_rate_limit,
+)
+from mavis.responses import (
+    parse_generate_scene_params_response,
+    parse_generate_scene_specs_response,
+)
+from mavis.schema import ActionScene, RelativeWhere
+from mavis.tracing import latency_breakdown
+from mavis.vlm import OpenAIVLM
+
+# Benchmarks of the whole pipeline (run_batch) on the offline services in fakes.py,
+# and microbenchmarks of its CPU-bound helpers. Results are written as JSON (to
+# BENCHMARKS_DIR_PATH by default) so that runs can be compared over time, e.g.
+#   python -m mavis.benchmarks --compare outputs/benchmarks/<earlier run>.json
+
+BENCHMARK_ACTION_SCENE = ActionScene(
+    who="dog",
+    does="throws",
+    what="chair",
+    where=RelativeWhere(preposition="over", what="bookshelf"),
+    to_whom="puma",
+)
+# Each level c runs c scenes' planning and rendering at once, with c times the
+# default edit workers and provider concurrency limits
+DEFAULT_CONCURRENCY_LEVELS = (1, 2, 4)
+DEFAULT_N_SCENES = 4
+# Typical real latencies (median seconds), which the fake services take times
+# --time-scale (rate limits are scaled to match)
+REAL_VLM_LATENCY_S = 4.0
+REAL_FAL_EDIT_LATENCY_S = 12.0
+REAL_UPLOAD_LATENCY_S = 0.5
+REAL_RENDER_S_PER_POV = 20.0
+DEFAULT_TIME_SCALE = 0.01
+# Fraction of fake VLM answers that pass their check (image checks ask once per
+# object), so that retries are exercised
+DEFAULT_CHECK_PASS_RATE = 0.95
+# Times each microbenchmark is repeated (each repeat lasts at least 0.2s; see
+# timeit.Timer.autorange)
+MICROBENCHMARK_REPEATS = 5
+# Modules that importing mavis must not import (they are imported on first use)
+DEFERRED_IMPORTS = ("fal_client", "requests", "tenacity", "jinja2", "openai")
+N_IMPORT_TIMINGS = 5
+
+
+def _time_call(fn: Callable[[], object]) -> dict:
+    """Time ``fn`` with timeit: calls per repeat, and the fastest and median per call."""
+    timer = timeit.Timer(fn)
+    n_calls, _ = timer.autorange()
+    per_call_us = [t / n_calls * 1e6 for t in timer.repeat(MICROBENCHMARK_REPEATS, n_calls)]
+    return {
+        "n_calls": n_calls,
+        "best_us": min(per_call_us),
+        "median_us": statistics.median(per_call_us),
+    }
+
+
+def _geometry_microbenchmarks() -> dict[str, dict]:
+    try:
+        # Requires Blender's Python modules (bpy, mathutils)
+        from mathutils import Matrix
+
+        from mavis.render_scene import (
+            compute_combined_bbox,
+            compute_min_camera_distance_to_capture_bbox,
+        )
+    except ImportError as e:
+        skipped = {"skipped": f"requires Blender's Python modules ({e})"}
+        return {
+            "compute_combined_bbox": skipped,
+            "compute_min_camera_distance_to_capture_bbox": skipped,
+        }
+    unit_box = [(x, y, z) for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)]
+    objects = [
+        SimpleNamespace(bound_box=unit_box, matrix_world=Matrix.Translation((3 * i, 0, 0)))
+        for i in range(len(BENCHMARK_ACTION_SCENE.object_strs))
+    ]
+    bbox = compute_combined_bbox(objects)
+    return {
+        "compute_combined_bbox": _time_call(lambda: compute_combined_bbox(objects)),
+        "compute_min_camera_distance_to_capture_bbox": _time_call(
+            lambda: compute_min_camera_distance_to_capture_bbox(bbox, 0.6, 1.0, 0.9, 1.0)
+        ),
+    }
+
+
+def measure_import(module: str, n_runs: int = N_IMPORT_TIMINGS) -> dict:
+    """Time importing ``module`` in fresh interpreters.
+
+    Also reports which DEFERRED_IMPORTS the import pulled in, and whether it read
+    the Blender object catalog.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed_s = time.perf_counter() - start\n"
+        "from mavis.globals import BLENDER_OBJECTS\n"
+        f"deferred = [name for name in {DEFERRED_IMPORTS!r} if name in sys.modules]\n"
+        "print(json.dumps([elapsed_s, deferred, BLENDER_OBJECTS.is_loaded]))\n"
+    )
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR_PATH)}
+    runs = []
+    for _ in range(n_runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    elapsed_s = [run[0] for run in runs]
+    return {
+        "best_s": min(elapsed_s),
+        "median_s": statistics.median(elapsed_s),
+        "deferred_imports_loaded": runs[-1][1],
+        "catalog_loaded": runs[-1][2],
+    }
+
+
+def run_microbenchmarks() -> dict[str, dict]:
+    """Time importing mavis, camera geometry (if bpy is available), parsers and prompts."""
+    action_scene = BENCHMARK_ACTION_SCENE
+    specs_response = fake_scene_specs_response(action_scene)
+    scene_characteristics = specs_response.scene_characteristics
+    action_scene_specs = specs_response.specs.to_action_scene_specs()
+    placements = fake_scene_placements_response(action_scene).model_dump()["placements"]
+    specs_text = (
+        f"{scene_characteristics}\n\n```json\n"
+        f"{action_scene_specs.model_dump_json(indent=2)}\n```"
+    )
+    params_text = f"Placements:\n\n```json\n{json.dumps(placements, indent=2)}\n```"
+    return {
+        "import_mavis": measure_import("mavis.mavis"),
+        **_geometry_microbenchmarks(),
+        "parse_generate_scene_specs_response": _time_call(
+            lambda: parse_generate_scene_specs_response(specs_text)
+        ),
+        "parse_generate_scene_params_response": _time_call(
+            lambda: parse_generate_scene_params_response(params_text)
+        ),
+        "render_generate_scene_specs_prompt": _time_call(
+            lambda: render_generate_scene_specs_prompt(action_scene, structured_output=True)
+        ),
+        "render_generate_scene_setup_code_prompt": _time_call(
+            lambda: render_generate_scene_setup_code_prompt(
+                action_scene, scene_characteristics, action_scene_specs, True
+            )
+        ),
+        "render_check_object_preserved_prompt": _time_call(
+            lambda: render_check_object_preserved_prompt(
+                action_scene.object_strs[0], action_scene
+            )
+        ),
+    }
+
+
+RateLimits = dict[tuple[Provider, str], tuple[float, int] | None]
+
+
+def _scale_rate_limits(time_scale: float) -> RateLimits:
+    """Scale the rate limits of the models the fake services stand in for.
+
+    Returns the models' previous limits (None for the provider default), for
+    _restore_rate_limits.
+    """
+    models = [(Provider.openai, FAKE_VLM_MODEL)]
+    models += [(Provider.fal, model) for model in [*FAL_PRICES_PER_IMAGE, "upload"]]
+    previous = {key: get_rate_limit_override(*key) for key in models}
+    for provider, model in models:
+        rate, burst = DEFAULT_RATE_LIMITS[provider]
+        set_rate_limit(provider, model, rate / time_scale, burst)
+    return previous
+
+
+def _restore_rate_limits(previous: RateLimits) -> None:
+    for (provider, model), limit in previous.items():
+        if limit is None:
+            clear_rate_limit(provider, model)
+        else:
+            set_rate_limit(provider, model, *limit)
+
+
+def _percentiles(values: list[float]) -> dict[str, float | None]:
+    if not values:
+        return {"p50_s": None, "p95_s": None}
+    if len(values) == 1:
+        return {"p50_s": values[0], "p95_s": values[0]}
+    return {
+        "p50_s": statistics.median(values),
+        "p95_s": statistics.quantiles(values, n=20, method="inclusive")[-1],
+    }
+
+
+def run_pipeline_benchmark(
+    work_dir: Path,
+    concurrency: int,
+    n_scenes: int = DEFAULT_N_SCENES,
+    time_scale: float = DEFAULT_TIME_SCALE,
+    check_pass_rate: float = DEFAULT_CHECK_PASS_RATE,
+    use_blender: bool = False,
+    seed: int = 0,
+) -> dict:
+    """Run ``n_scenes`` copies of BENCHMARK_ACTION_SCENE through run_batch offline.
+
+    The VLM and fal are fakes whose latencies are the REAL_*_LATENCY_S times
+    ``time_scale``, and so is Blender unless ``use_blender``. Returns throughput,
+    per-scene latency, calls and estimated cost per accepted (final) image, and a
+    latency breakdown of the scenes' spans (time per stage).
+    """
+    default_concurrency = dict(PROVIDER_CONCURRENCY_LIMITS)
+    vlm_client = FakeOpenAIClient(
+        responses={
+            "generate_scene_specs": fake_scene_specs_response(BENCHMARK_ACTION_SCENE),
+            "generate_scene_params": fake_scene_placements_response(
+                BENCHMARK_ACTION_SCENE
+            ),
+        },
+        latency=LatencyModel(REAL_VLM_LATENCY_S * time_scale),
+        check_pass_rate=check_pass_rate,
+        seed=seed,
+    )
+    vlm = OpenAIVLM(model=FAKE_VLM_MODEL, client=vlm_client)
+    limits = BatchLimits(
+        spec_workers=concurrency,
+        render_workers=concurrency,
+        edit_workers=BatchLimits.edit_workers * concurrency,
+        openai_concurrency=default_concurrency[Provider.openai] * concurrency,
+        fal_concurrency=default_concurrency[Provider.fal] * concurrency,
+    )
+    renderer = nullcontext() if use_blender else fake_blender(REAL_RENDER_S_PER_POV * time_scale)
+    previous_rate_limits = _scale_rate_limits(time_scale)
+    try:
+        with (
+            fake_fal(
+                work_dir / "fal_store",
+                latency=LatencyModel(REAL_FAL_EDIT_LATENCY_S * time_scale),
+                upload_latency=LatencyModel(REAL_UPLOAD_LATENCY_S * time_scale),
+                seed=seed,
+            ) as fal_client,
+            renderer,
+        ):
+            start = time.perf_counter()
+            records = run_batch(
+                vlm,
+                [BENCHMARK_ACTION_SCENE] * n_scenes,
+                limits,
+                summary_path=work_dir / "batch.json",
+                output_dir=work_dir / "outputs",
+            )
+            wall_s = time.perf_counter() - start
+    finally:
+        # Leave the process's (real) limits as they were
+        _restore_rate_limits(previous_rate_limits)
+        for provider, limit in default_concurrency.items():
+            set_provider_concurrency_limit(provider, limit)
+
+    events = []
+    for record in records:
+        if record.trace_path is not None and Path(record.trace_path).exists():
+            with open(record.trace_path) as f:
+                events += json.load(f)["traceEvents"]
+    n_accepted = sum(record.n_successful_renders for record in records)
+    n_vlm_calls = sum(vlm_client.n_calls.values())
+    n_edit_calls = sum(n for name, n in fal_client.n_calls.items() if name != "upload")
+    cost_usd = sum(record.cost_usd or 0.0 for record in records)
+
+    def per_accepted(value: float) -> float | None:
+        return value / n_accepted if n_accepted else None
+
+    return {
+        "concurrency": concurrency,
+        "n_scenes": n_scenes,
+        "n_renders": sum(record.n_renders for record in records),
+        "n_accepted_images": n_accepted,
+        "n_failed_scenes": sum(record.status == "failed" for record in records),
+        "wall_s": wall_s,
+        "scenes_per_hour": n_scenes / wall_s * 3600,
+        "scene_latency": _percentiles(
+            sorted(record.elapsed_s for record in records if record.elapsed_s is not None)
+        ),
+        "vlm_calls_per_accepted_image": per_accepted(n_vlm_calls),
+        "edit_calls_per_accepted_image": per_accepted(n_edit_calls),
+        "cost_usd_per_accepted_image": per_accepted(cost_usd),
+        "stages": latency_breakdown(events),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _numeric_leaves(results: dict, prefix: str = "") -> dict[str, float]:
+    leaves = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            leaves |= _numeric_leaves(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            leaves[f"{prefix}{key}"] = value
+    return leaves
+
+
+def compare_results(old: dict, new: dict) -> dict[str, tuple[float, float]]:
+    """Return the (old, new) values of the numeric results present in both runs."""
+    old_leaves, new_leaves = _numeric_leaves(old), _numeric_leaves(new)
+    return {key: (old_leaves[key], new_leaves[key]) for key in old_leaves if key in new_leaves}
+
+
+def format_comparison(comparison: dict[str, tuple[float, float]]) -> str:
+    lines = [f"{'result':<80} {'old':>12} {'new':>12} {'change':>8}"]
+    for key, (old, new) in comparison.items():
+        change = f"{(new - old) / old:+.0%}" if old else ""
+        lines.append(f"{key:<80} {old:>12.4g} {new:>12.4g} {change:>8}")
+    return "\n".join(lines)
+
+
+def run_benchmarks(
+    concurrency_levels: tuple[int, ...] = DEFAULT_CONCURRENCY_LEVELS,
+    n_scenes: int = DEFAULT_N_SCENES,
+    time_scale: float = DEFAULT_TIME_SCALE,
+    check_pass_rate: float = DEFAULT_CHECK_PASS_RATE,
+    use_blender: bool = False,
+    skip_pipeline: bool = False,
+) -> dict:
+    """Run the microbenchmarks and the pipeline benchmark at each concurrency level."""
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "n_scenes": n_scenes,
+            "time_scale": time_scale,
+            "check_pass_rate": check_pass_rate,
+            "use_blender": use_blender,
+        },
+        "microbenchmarks": run_microbenchmarks(),
+        "pipeline": {},
+    }
+    if skip_pipeline:
+        return results
+    for concurrency in concurrency_levels:
+        print(f"Benchmarking the pipeline at concurrency {concurrency}...")
+        with tempfile.TemporaryDirectory() as work_dir:
+            results["pipeline"][str(concurrency)] = run_pipeline_benchmark(
+                Path(work_dir),
+                concurrency,
+                n_scenes,
+                time_scale,
+                check_pass_rate,
+                use_blender,
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY_LEVELS)
+    )
+    parser.add_argument("--scenes", type=int, default=DEFAULT_N_SCENES)
+    parser.add_argument("--time-scale", type=float, default=DEFAULT_TIME_SCALE)
+    parser.add_argument("--check-pass-rate", type=float, default=DEFAULT_CHECK_PASS_RATE)
+    parser.add_argument(
+        "--blender", action="store_true", help="Render with Blender (see BLENDER_EXE)"
+    )
+    parser.add_argument("--micro-only", action="store_true", help="Skip the pipeline")
+    parser.add_argument("--output", type=Path, help="Results JSON path")
+    parser.add_argument("--compare", type=Path, help="Earlier results JSON to compare to")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        tuple(args.concurrency),
+        args.scenes,
+        args.time_scale,
+        args.check_pass_rate,
+        args.blender,
+        args.micro_only,
+    )
+    output_path = args.output or BENCHMARKS_DIR_PATH / f"{datetime.now():%y%m%d%H%M%S}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results written to {output_path}")
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(format_comparison(compare_results(json.load(f), results)))
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+# Approximate list prices in USD; update them when providers change their pricing.
+# OpenAI prices are per million tokens (reasoning tokens are billed as output)
+OPENAI_TOKEN_PRICES = {
+    "gpt-5.2-2025-12-11": {"input": 1.75, "cached_input": 0.175, "output": 14.0},
+}
+DEFAULT_OPENAI_TOKEN_PRICES = OPENAI_TOKEN_PRICES["gpt-5.2-2025-12-11"]
+# fal prices are per generated image at IMG_RESOLUTION_X x IMG_RESOLUTION_Y
+FAL_PRICES_PER_IMAGE = {
+    "fal-ai/flux-2": 0.012,
+    "fal-ai/flux-2/edit": 0.03,
+    "fal-ai/flux-2/turbo/edit": 0.008,
+    "fal-ai/gemini-25-flash-image/edit": 0.039,
+    "fal-ai/nano-banana/edit": 0.039,
+    "fal-ai/gpt-image-1.5/edit": 0.05,
+    "fal-ai/hunyuan-image/v3/instruct/edit": 0.09,
+    "xai/grok-imagine-image/edit": 0.02,
+}
+DEFAULT_FAL_PRICE_PER_IMAGE = 0.05
+# Cost of one second of local Blender rendering (e.g. a render machine's hourly rate)
+BLENDER_PRICE_PER_S = 0.5 / 3600
+
+
+class BudgetExceeded(Exception):
+    """Raised instead of starting paid work once a run is over its budget."""
+
+
+@dataclass
+class CostRecord:
+    """One charge against a run's budget."""
+
+    stage: str  # E.g. a prompt template name, "background", "pose" or "render"
+    model: str
+    quantity: float  # Tokens, images or seconds, depending on the stage
+    cost_usd: float
+
+
+class RunBudget:
+    """Records what a run spends, per stage, and enforces its time and cost limits.
+
+    ``max_usd`` caps the estimated spend (see the *_PRICE* tables) and ``max_wall_s``
+    the time since the budget was created; either may be None (no limit). Work that
+    is already paid for finishes, but check() raises BudgetExceeded before any more
+    is started, so that a run over budget winds down instead of stopping abruptly.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_usd: float | None = None, max_wall_s: float | None = None):
+        self.max_usd = max_usd
+        self.max_wall_s = max_wall_s
+        self.records: list[CostRecord] = []
+        self._start = time.perf_counter()
+        self._spent_usd = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def spent_usd(self) -> float:
+        with self._lock:
+            return self._spent_usd
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self._start
+
+    def exceeded(self) -> str | None:
+        """Return why the run is over budget, or None if it isn't."""
+        if self.max_usd is not None and (spent := self.spent_usd) >= self.max_usd:
+            return f"spent ${spent:.2f} of ${self.max_usd:.2f}"
+        if self.max_wall_s is not None and (elapsed := self.elapsed_s) >= self.max_wall_s:
+            return f"ran {elapsed:.0f}s of {self.max_wall_s:.0f}s"
+        return None
+
+    def check(self) -> None:
+        """Raise BudgetExceeded if the run is over budget."""
+        if (reason := self.exceeded()) is not None:
+            raise BudgetExceeded(reason)
+
+    def charge(self, stage: str, model: str, quantity: float, cost_usd: float) -> None:
+        with self._lock:
+            self.records.append(CostRecord(stage, model, quantity, cost_usd))
+            self._spent_usd += cost_usd
+
+    def charge_tokens(
+        self,
+        stage: str,
+        model: str,
+        prompt_tokens: int,
+        cached_tokens: int,
+        completion_tokens: int,
+    ) -> None:
+        prices = OPENAI_TOKEN_PRICES.get(model, DEFAULT_OPENAI_TOKEN_PRICES)
+        cost_usd = (
+            (prompt_tokens - cached_tokens) * prices["input"]
+            + cached_tokens * prices["cached_input"]
+            + completion_tokens * prices["output"]
+        ) / 1e6
+        self.charge(stage, model, prompt_tokens + completion_tokens, cost_usd)
+
+    def charge_images(self, stage: str, model: str, n_images: int = 1) -> None:
+        price = FAL_PRICES_PER_IMAGE.get(model, DEFAULT_FAL_PRICE_PER_IMAGE)
+        self.charge(stage, model, n_images, n_images * price)
+
+    def charge_render_seconds(self, seconds: float) -> None:
+        self.charge("render", "blender", seconds, seconds * BLENDER_PRICE_PER_S)
+
+    def summary(self) -> dict:
+        """Total spend and elapsed time, with calls, quantity and spend per stage."""
+        by_stage: dict[str, dict] = defaultdict(
+            lambda: {"calls": 0, "quantity": 0.0, "cost_usd": 0.0}
+        )
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            entry = by_stage[record.stage]
+            entry["calls"] += 1
+            entry["quantity"] += record.quantity
+            entry["cost_usd"] += record.cost_usd
+        return {
+            "cost_usd": sum(record.cost_usd for record in records),
+            "elapsed_s": self.elapsed_s,
+            "by_stage": dict(by_stage),
+        }
+
+
+def with_budget(vlm, budget: RunBudget | None):
+    """Return ``vlm`` charging its usage to ``budget``, if it supports budgets."""
+    if budget is None or not hasattr(vlm, "with_budget"):
+        return vlm
+    return vlm.with_budget(budget)
@@ -9,6 +9,9 @@ from mavis.schema import (
     BinaryResponse,
     ImageChoice,
     ImageComparisonResponse,
+    ImageDetail,
+    ImageFormat,
+    ImagePayloadOptions,
     VLMPrompt,
     YesNo,
 )
@@ -17,15 +20,35 @@ from mavis.vlm import VLM
 
 OBJECT_PRESERVATION_CONFIDENCE_THRESHOLD = 0.9  # 0.75
 
+# Image payloads sent with check prompts (see mavis.images)
+OBJECT_PRESERVATION_IMAGE_OPTIONS = ImagePayloadOptions(
+    max_side=512, format=ImageFormat.jpeg, quality=85, detail=ImageDetail.low
+)
+POSE_EDIT_COMPARISON_IMAGE_OPTIONS = ImagePayloadOptions(
+    max_side=512, format=ImageFormat.jpeg, quality=85, detail=ImageDetail.auto
+)
+
 
 def objects_are_preserved(
-    image_path: os.PathLike, action_scene: ActionScene, vlm: VLM
+    image_path: os.PathLike,
+    action_scene: ActionScene,
+    vlm: VLM,
 ) -> bool:
+    """Ask a VLM whether each scene object appears exactly once and intact.
+
+    The whole image is sent (never cropped), as edits may add copies of objects
+    anywhere in it.
+    """
     print("Checking object preservation...")
     for object_str in action_scene.object_strs:
         prompt = render_check_object_preserved_prompt(object_str, action_scene)
         response = vlm.generate_structured(
-            prompt=VLMPrompt(user=prompt, image_paths=[image_path]),
+            prompt=prompt.model_copy(
+                update={
+                    "image_paths": [image_path],
+                    "image_options": OBJECT_PRESERVATION_IMAGE_OPTIONS,
+                }
+            ),
             response_format=BinaryResponse,
         )
         is_no = response.answer == YesNo.no
@@ -54,7 +77,7 @@ def is_object_animate(object_name: str, vlm: VLM) -> bool:
 
     prompt = f'Is a "{object_name}" an animate thing? I.e., does it move of its own accord? (Yes/No)'
     response = vlm.generate_structured(
-        prompt=VLMPrompt(user=prompt),
+        prompt=VLMPrompt(template_name="is_object_animate", user=prompt),
         response_format=BinaryResponse,
     )
     is_animate = response.answer == YesNo.yes
@@ -74,13 +97,17 @@ def pose_edit_is_improvement(
 
     Shows the pre-edit image (first) and post-edit image (second) and asks which
     better satisfies the pose specs. Returns True if the edited image is preferred.
+    The images are not cropped, as the edit may move the object out of its
+    pre-edit region.
     """
     print(f"Checking if pose edit improved {object_name}...")
     prompt = render_check_pose_edit_is_improvement_prompt(object_name, pose_specs)
     response = vlm.generate_structured(
-        prompt=VLMPrompt(
-            user=prompt,
-            image_paths=[pre_edit_path, post_edit_path],
+        prompt=prompt.model_copy(
+            update={
+                "image_paths": [pre_edit_path, post_edit_path],
+                "image_options": POSE_EDIT_COMPARISON_IMAGE_OPTIONS,
+            }
         ),
         response_format=ImageComparisonResponse,
     )
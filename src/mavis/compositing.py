@@ -0,0 +1,284 @@
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from mavis.globals import BACKGROUND_PLATES_DIR_PATH
+from mavis.images import compute_mask_bbox
+
+# Number of distinct plates generated per background type before plates are reused
+PLATES_PER_BG_TYPE = 4
+# Reservations of plate slots older than this are left over from a crashed run and
+# are reclaimed
+PLATE_RESERVATION_TIMEOUT_S = 600.0
+# How long (and how often) to wait for plates being generated by other threads when
+# a background type has none yet
+PLATE_WAIT_TIMEOUT_S = 120.0
+PLATE_POLL_INTERVAL_S = 0.5
+
+# How far object colours are pulled toward the plate's mean colour (0 = not at all)
+COLOR_MATCH_STRENGTH = 0.25
+# Contact shadow: max darkening, vertical offset and blur (fractions of image height)
+SHADOW_OPACITY = 0.45
+SHADOW_OFFSET = 0.01
+SHADOW_BLUR = 0.015
+# Feathering of the object mask edge, in pixels
+MASK_FEATHER_RADIUS = 1.0
+
+# Localized edits: crop padding around the object's mask (fraction of its bbox's
+# longer side) and how far the blend-back mask grows beyond the object's mask
+# (fraction of the crop's longer side), so small pose changes aren't clipped
+LOCAL_EDIT_PADDING = 0.35
+LOCAL_EDIT_MASK_GROWTH = 0.12
+
+BBox = tuple[int, int, int, int]
+
+_plate_bank_lock = threading.Lock()
+
+
+class PlateUnavailableError(RuntimeError):
+    """A background type has no plate, and none is being generated."""
+
+
+def _slugify(background_type: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", background_type.lower()).strip("_")
+
+
+def get_plate_dir(background_type: str) -> Path:
+    return BACKGROUND_PLATES_DIR_PATH / _slugify(background_type)
+
+
+def list_plates(background_type: str) -> list[Path]:
+    return sorted(get_plate_dir(background_type).glob("*.png"))
+
+
+def _reservation_is_live(reservation_path: Path) -> bool:
+    try:
+        age_s = time.time() - reservation_path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return age_s < PLATE_RESERVATION_TIMEOUT_S
+
+
+def reserve_plate_path(background_type: str) -> Path | None:
+    """Return a new plate path if the bank for ``background_type`` isn't full, else None.
+
+    Slots reserved longer than PLATE_RESERVATION_TIMEOUT_S ago (e.g. by a crashed
+    run) count as free.
+    """
+    with _plate_bank_lock:
+        plate_dir = get_plate_dir(background_type)
+        plate_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(PLATES_PER_BG_TYPE):
+            plate_path = plate_dir / f"{i:03d}.png"
+            reservation_path = plate_path.with_suffix(".reserved")
+            if not plate_path.exists() and not _reservation_is_live(reservation_path):
+                # Mark as reserved so concurrent callers don't generate the same slot
+                reservation_path.touch()
+                return plate_path
+        return None
+
+
+def release_plate_reservation(plate_path: Path) -> None:
+    plate_path.with_suffix(".reserved").unlink(missing_ok=True)
+
+
+def choose_plate(background_type: str, timeout_s: float = PLATE_WAIT_TIMEOUT_S) -> Path:
+    """Return a random existing plate for ``background_type``.
+
+    If there is none yet, waits (up to ``timeout_s``) for plates other threads are
+    generating. Raises PlateUnavailableError if none appears.
+    """
+    deadline = time.monotonic() + timeout_s
+    while True:
+        plates = list_plates(background_type)
+        if plates:
+            return random.choice(plates)
+        reservations = get_plate_dir(background_type).glob("*.reserved")
+        if not any(map(_reservation_is_live, reservations)):
+            raise PlateUnavailableError(f"No background plates for {background_type!r}")
+        if time.monotonic() >= deadline:
+            raise PlateUnavailableError(
+                f"No background plate for {background_type!r} within {timeout_s:.0f}s"
+            )
+        time.sleep(PLATE_POLL_INTERVAL_S)
+
+
+def _load_mask(mask_path: os.PathLike, size: tuple[int, int]) -> np.ndarray:
+    with Image.open(mask_path) as mask:
+        mask = mask.convert("L").resize(size, Image.Resampling.BILINEAR)
+    return np.asarray(mask, dtype=np.float32) / 255.0
+
+
+def _fit_plate(plate_path: os.PathLike, size: tuple[int, int]) -> np.ndarray:
+    """Load a plate and center-crop/resize it to ``size``."""
+    with Image.open(plate_path) as plate:
+        plate = plate.convert("RGB")
+        w, h = size
+        scale = max(w / plate.width, h / plate.height)
+        plate = plate.resize(
+            (round(plate.width * scale), round(plate.height * scale)),
+            Image.Resampling.LANCZOS,
+        )
+        left, top = (plate.width - w) // 2, (plate.height - h) // 2
+        plate = plate.crop((left, top, left + w, top + h))
+    return np.asarray(plate, dtype=np.float32)
+
+
+def _contact_shadow(mask: np.ndarray) -> np.ndarray:
+    """Soft shadow alpha: the object silhouette nudged downward and blurred."""
+    h = mask.shape[0]
+    offset = max(1, round(SHADOW_OFFSET * h))
+    shifted = np.zeros_like(mask)
+    shifted[offset:] = mask[:-offset]
+    shadow = Image.fromarray((shifted * 255).astype(np.uint8)).filter(
+        ImageFilter.GaussianBlur(radius=SHADOW_BLUR * h)
+    )
+    return np.asarray(shadow, dtype=np.float32) / 255.0
+
+
+def composite_render_onto_plate(
+    render_path: os.PathLike,
+    mask_path: os.PathLike,
+    plate_path: os.PathLike,
+    save_path: os.PathLike,
+) -> None:
+    """Composite a render's objects (given by its ``all`` mask) onto a background plate.
+
+    Adds a soft contact shadow under the objects and pulls the objects' colours
+    slightly toward the plate's so they sit in its lighting.
+    """
+    with Image.open(render_path) as render:
+        render = render.convert("RGB")
+        size = render.size
+        objects = np.asarray(render, dtype=np.float32)
+    mask = _load_mask(mask_path, size)
+    plate = _fit_plate(plate_path, size)
+
+    # Colour matching: shift object pixels' mean toward the plate's mean
+    object_pixels = objects[mask > 0.5]
+    if len(object_pixels):
+        shift = plate.reshape(-1, 3).mean(axis=0) - object_pixels.mean(axis=0)
+        objects = objects + COLOR_MATCH_STRENGTH * shift
+
+    # Contact shadow darkens the plate around/below the objects
+    shadow = _contact_shadow(mask)[..., None]
+    background = plate * (1 - SHADOW_OPACITY * shadow)
+
+    alpha = Image.fromarray((mask * 255).astype(np.uint8)).filter(
+        ImageFilter.GaussianBlur(radius=MASK_FEATHER_RADIUS)
+    )
+    alpha = (np.asarray(alpha, dtype=np.float32) / 255.0)[..., None]
+    composite = background * (1 - alpha) + objects * alpha
+    Image.fromarray(np.clip(composite, 0, 255).astype(np.uint8)).save(save_path)
+
+
+def local_edit_region(mask_path: os.PathLike) -> BBox | None:
+    """Return the crop a localized edit of the mask's object uses, in mask pixels."""
+    with Image.open(mask_path) as mask:
+        size = mask.size
+    return compute_mask_bbox(mask_path, size, LOCAL_EDIT_PADDING)
+
+
+def regions_intersect(a: BBox, b: BBox) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def group_disjoint_regions(regions: dict[str, BBox | None]) -> list[list[str]]:
+    """Group names (first-fit, in order) so no two regions in a group intersect.
+
+    Names without a region (empty masks) each get a group of their own.
+    """
+    groups: list[list[str]] = []
+    for name, region in regions.items():
+        for group in groups:
+            if region is not None and all(
+                regions[other] is not None and not regions_intersect(region, regions[other])
+                for other in group
+            ):
+                group.append(name)
+                break
+        else:
+            groups.append([name])
+    return groups
+
+
+def crop_for_local_edit(
+    image_path: os.PathLike,
+    mask_path: os.PathLike,
+    image_save_path: os.PathLike,
+    mask_save_path: os.PathLike,
+) -> BBox | None:
+    """Crop an image and its object mask to the padded region around the object.
+
+    Returns the crop's bbox in image pixels, or None if the mask is empty.
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+    bbox = compute_mask_bbox(mask_path, image.size, LOCAL_EDIT_PADDING)
+    if bbox is None:
+        return None
+    image.crop(bbox).save(image_save_path)
+    with Image.open(mask_path) as mask:
+        mask = mask.convert("L").resize(image.size, Image.Resampling.NEAREST)
+        mask.crop(bbox).save(mask_save_path)
+    return bbox
+
+
+def blend_local_edit(
+    image_path: os.PathLike,
+    edited_crop_path: os.PathLike,
+    mask_path: os.PathLike,
+    bbox: BBox,
+    save_path: os.PathLike,
+) -> None:
+    """Blend an edited crop back into the full image within the object's grown mask.
+
+    Outside the grown, feathered mask the full image is left untouched, so the
+    edit model cannot change unrelated regions.
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+    left, top, right, bottom = bbox
+    crop_size = (right - left, bottom - top)
+    with Image.open(edited_crop_path) as crop:
+        crop = crop.convert("RGB").resize(crop_size, Image.Resampling.LANCZOS)
+
+    mask = _load_mask(mask_path, image.size)[top:bottom, left:right]
+    # Grow the mask (blur + threshold is a cheap dilation), then feather its edge
+    grow = max(1, round(LOCAL_EDIT_MASK_GROWTH * max(crop_size)))
+    grown = Image.fromarray((mask * 255).astype(np.uint8)).filter(
+        ImageFilter.GaussianBlur(radius=grow)
+    )
+    grown = grown.point(lambda v: 255 if v > 8 else 0).filter(
+        ImageFilter.GaussianBlur(radius=grow / 4)
+    )
+    image.paste(crop, (left, top), grown)
+    image.save(save_path)
+
+
+def merge_local_edits(
+    image_path: os.PathLike,
+    edits: list[tuple[os.PathLike, os.PathLike]],
+    save_path: os.PathLike,
+) -> None:
+    """Merge localized edits (edited image, object mask) of the same image.
+
+    Each edit differs from the image only within its object's crop region, so as
+    long as the regions don't intersect, pasting them into one image combines the
+    edits exactly.
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+    for edit_path, mask_path in edits:
+        bbox = compute_mask_bbox(mask_path, image.size, LOCAL_EDIT_PADDING)
+        if bbox is None:
+            continue
+        with Image.open(edit_path) as edit:
+            image.paste(edit.convert("RGB").crop(bbox), bbox[:2])
+    image.save(save_path)
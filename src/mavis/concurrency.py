@@ -0,0 +1,43 @@
+import threading
+from contextlib import contextmanager
+from enum import StrEnum
+from typing import Iterator
+
+
+class Provider(StrEnum):
+    openai = "openai"
+    fal = "fal"
+
+
+# Max simultaneous in-flight requests per remote provider (shared by all threads)
+PROVIDER_CONCURRENCY_LIMITS: dict[Provider, int] = {
+    Provider.openai: 8,
+    Provider.fal: 4,
+}
+
+_semaphores: dict[Provider, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def _get_semaphore(provider: Provider) -> threading.BoundedSemaphore:
+    with _semaphores_lock:
+        if provider not in _semaphores:
+            _semaphores[provider] = threading.BoundedSemaphore(
+                PROVIDER_CONCURRENCY_LIMITS[provider]
+            )
+        return _semaphores[provider]
+
+
+def set_provider_concurrency_limit(provider: Provider, limit: int) -> None:
+    """Change a provider's concurrency limit. Call before any requests are in flight."""
+    with _semaphores_lock:
+        PROVIDER_CONCURRENCY_LIMITS[provider] = limit
+        _semaphores.pop(provider, None)
+
+
+@contextmanager
+def provider_slot(provider: Provider) -> Iterator[None]:
+    """Block until the provider has a free request slot, and hold it for the block."""
+    semaphore = _get_semaphore(provider)
+    with semaphore:
+        yield
@@ -1,11 +1,35 @@
 import os
 import random
-import requests
+import threading
+import warnings
+from pathlib import Path
 
-import fal_client
-
-from mavis.globals import OUTPUT_EDITS_DIR_PATH
-from mavis.prompts import render_add_background_prompt, render_modify_pose_prompt
+from mavis.budget import RunBudget
+from mavis.concurrency import Provider, provider_slot
+from mavis.fal import get_fal_client
+from mavis.compositing import (
+    blend_local_edit,
+    choose_plate,
+    composite_render_onto_plate,
+    crop_for_local_edit,
+    release_plate_reservation,
+    reserve_plate_path,
+)
+from mavis.globals import IMG_RESOLUTION_X, IMG_RESOLUTION_Y, RunContext
+from mavis.prompts import (
+    render_add_background_prompt,
+    render_background_plate_prompt,
+    render_harmonize_background_prompt,
+    render_modify_pose_prompt,
+)
+from mavis.resilience import call_with_backoff
+from mavis.transfers import (
+    call_with_uploads,
+    download_file,
+    ensure_local,
+    save_remote_result,
+)
+from mavis.routing import ROUTING_STATS_PATH, EditStage, ModelRouter
 
 
 BG_TYPES = [
@@ -34,6 +58,11 @@ BG_TYPES = [
 
 TAKES_ONLY_ONE_IMAGE = {"xai/grok-imagine-image/edit"}
 
+# Text-to-image model used to generate reusable background plates
+BG_PLATE_MODEL = "fal-ai/flux-2"
+# Cheap edit model used to harmonize locally composited backgrounds
+BG_HARMONIZATION_MODEL = "fal-ai/flux-2/turbo/edit"
+
 BG_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY = {
     1: {
         "fal-ai/hunyuan-image/v3/instruct/edit": 0.2,
@@ -73,80 +102,299 @@ POSE_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY = {
 def _select_model(
     try_number: int,
     distribution_by_min_try: dict[int, dict[str, float]],
+    exclude: set[str] | frozenset[str] = frozenset(),
 ) -> str:
     """Select an image editing model from a weighted distribution based on try number.
 
     Uses the distribution whose key is the highest value <= try_number.
     E.g. try 1-2 use the key-1 distribution, try 3+ use the key-3 distribution.
+    Models in ``exclude`` (e.g. ones already in flight) are skipped unless that
+    would leave nothing to choose from.
     """
     applicable_key = max(k for k in distribution_by_min_try if k <= try_number)
     distribution = distribution_by_min_try[applicable_key]
+    if any(model not in exclude for model in distribution):
+        distribution = {m: w for m, w in distribution.items() if m not in exclude}
     models = list(distribution.keys())
     weights = list(distribution.values())
     return random.choices(models, weights=weights, k=1)[0]
 
 
+def select_background_model(
+    try_number: int, exclude: set[str] | frozenset[str] = frozenset()
+) -> str:
+    return _select_model(try_number, BG_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY, exclude)
+
+
+def select_pose_model(
+    try_number: int, exclude: set[str] | frozenset[str] = frozenset()
+) -> str:
+    return _select_model(try_number, POSE_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY, exclude)
+
+
+def create_model_router(stats_path: Path | None = ROUTING_STATS_PATH) -> ModelRouter:
+    """Create a model router using the static selection distributions as priors."""
+    return ModelRouter(
+        {
+            EditStage.background: BG_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY,
+            EditStage.pose: POSE_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY,
+        },
+        stats_path=stats_path,
+    )
+
+
+class EditCancelled(Exception):
+    """A fal request was cancelled while queued, as its result was no longer needed."""
+
+
+def _subscribe_cancellable(
+    model: str, arguments: dict, with_logs: bool, cancelled: threading.Event
+) -> dict:
+    """Like fal_client.subscribe, but cancels the request if ``cancelled`` is set while
+    it is still queued (raising EditCancelled). Started requests run to completion.
+    """
+    from fal_client import Queued
+
+    handle = get_fal_client().submit(model, arguments=arguments)
+    for status in handle.iter_events(with_logs=with_logs):
+        if cancelled.is_set() and isinstance(status, Queued):
+            try:
+                handle.cancel()
+            except Exception as e:
+                # It has most likely started meanwhile
+                warnings.warn(f"Cancelling queued {model} request failed: {e}")
+            else:
+                raise EditCancelled(f"Queued {model} request cancelled")
+    return handle.get()
+
+
+def _run_fal_model(
+    model: str,
+    arguments: dict,
+    budget_stage: str,
+    budget: RunBudget | None,
+    with_logs: bool = True,
+    cancelled: threading.Event | None = None,
+) -> dict:
+    """Run a fal model (with backoff) and charge the image it generates to ``budget``.
+
+    Raises budget.BudgetExceeded instead of running it if the budget is exceeded.
+    With ``cancelled``, the request goes through fal's queue, so that it can be
+    cancelled (see _subscribe_cancellable).
+    """
+    if budget is not None:
+        budget.check()
+
+    def attempt() -> dict:
+        # Hold a provider slot per attempt, not while backing off between attempts
+        with provider_slot(Provider.fal):
+            if cancelled is not None:
+                return _subscribe_cancellable(model, arguments, with_logs, cancelled)
+            return get_fal_client().subscribe(
+                model, arguments=arguments, with_logs=with_logs
+            )
+
+    result = call_with_backoff(Provider.fal, model, attempt)
+    if budget is not None:
+        budget.charge_images(budget_stage, model)
+    return result
+
+
+def _run_fal_edit(
+    model: str,
+    prompt: str,
+    image_paths: list[os.PathLike],
+    budget_stage: str,
+    budget: RunBudget | None,
+    cancelled: threading.Event | None = None,
+) -> dict:
+    """Run a fal edit model (see _run_fal_model) on local images, uploading them as needed.
+
+    Input URLs that fal no longer serves are uploaded again once.
+    """
+
+    def run(image_urls: list[str]) -> dict:
+        image_arg = (
+            {"image_url": image_urls[0]}
+            if model in TAKES_ONLY_ONE_IMAGE
+            else {"image_urls": image_urls}
+        )
+        arguments = {"prompt": prompt, **image_arg}
+        return _run_fal_model(model, arguments, budget_stage, budget, cancelled=cancelled)
+
+    return call_with_uploads(image_paths, run)
+
+
+def _edit_filename(stem: str, attempt_tag: str | None) -> str:
+    return f"{stem}.png" if attempt_tag is None else f"{stem}_{attempt_tag}.png"
+
+
 def add_background(
     render_id: str,
-    run_uid: str,
+    run_ctx: RunContext,
     render_path: os.PathLike,
     action_scene,
     try_number: int = 1,
+    model: str | None = None,
+    attempt_tag: str | None = None,
+    budget: RunBudget | None = None,
+    cancelled: threading.Event | None = None,
 ) -> os.PathLike:
+    """Add a generated background to a render and save it to the edits dir.
+
+    ``model`` overrides the try-number-based model selection. ``attempt_tag``
+    gives the output a unique filename, for attempts that run concurrently. The
+    returned file may still be downloading: call transfers.ensure_local before
+    reading it (passing it to a further edit does not require this). The edit is
+    charged to ``budget``, and raises budget.BudgetExceeded if it is exceeded.
+    Setting ``cancelled`` while the edit request is still queued cancels it,
+    raising EditCancelled.
+    """
     background_type = random.choice(BG_TYPES)
-    model = _select_model(try_number, BG_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY)
+    model = model or select_background_model(try_number)
     print(f"Adding {background_type} background to render {render_id} (model={model})...")
     prompt = render_add_background_prompt(background_type, action_scene).strip()
-    render_url = fal_client.upload_file(render_path)
-    image_arg = (
-        {"image_url": render_url}
-        if model in TAKES_ONLY_ONE_IMAGE
-        else {"image_urls": [render_url]}
+    result = _run_fal_edit(
+        model, prompt, [render_path], "background", budget, cancelled
     )
-    result = fal_client.subscribe(
-        model,
-        arguments={"prompt": prompt, **image_arg},
-        with_logs=True,
-    )
-    edits_dir = OUTPUT_EDITS_DIR_PATH / run_uid / render_id
+    edits_dir = run_ctx.edits_dir / render_id
     edits_dir.mkdir(parents=True, exist_ok=True)
-    save_path = edits_dir / "background.png"
-    with open(save_path, "wb") as f:
-        f.write(requests.get(result["images"][0]["url"]).content)
+    save_path = edits_dir / _edit_filename("background", attempt_tag)
+    # The local copy downloads in the background; see transfers.ensure_local
+    save_remote_result(result["images"][0]["url"], save_path)
     return save_path
 
 
 def modify_pose(
     render_id: str,
-    run_uid: str,
+    run_ctx: RunContext,
     start_img_path: os.PathLike,
     object_name: str,
     pose_specs: list[str],
     masks: dict[str, os.PathLike],
     try_number: int = 1,
+    model: str | None = None,
+    attempt_tag: str | None = None,
+    localized: bool = False,
+    budget: RunBudget | None = None,
+    cancelled: threading.Event | None = None,
 ) -> os.PathLike:
-    model = _select_model(try_number, POSE_MODEL_SELECTION_DISTRIBUTION_BY_MIN_TRY)
+    """Edit one object's pose and save the result to the edits dir.
+
+    ``model``, ``attempt_tag``, ``budget`` and ``cancelled`` behave as in
+    add_background. With ``localized``, only a crop around the object is sent to
+    the edit model and the result is blended back within the object's mask (see
+    compositing.crop_for_local_edit), so the rest of the image is untouched. The
+    result is then saved synchronously.
+    """
+    model = model or select_pose_model(try_number)
     print(
         f"Modifying pose of {object_name} to be: {' | '.join(pose_specs)} (model={model})..."
     )
     prompt = render_modify_pose_prompt(
         object_name=object_name, pose_specs=pose_specs
     ).strip()
-    start_img_url = fal_client.upload_file(start_img_path)
-    mask_url = fal_client.upload_file(masks[object_name])
-    image_arg = (
-        {"image_url": start_img_url}
-        if model in TAKES_ONLY_ONE_IMAGE
-        else {"image_urls": [start_img_url, mask_url]}
-    )
-    result = fal_client.subscribe(
-        model,
-        arguments={"prompt": prompt, **image_arg},
-        with_logs=True,
+    edits_dir = run_ctx.edits_dir / render_id
+    edits_dir.mkdir(parents=True, exist_ok=True)
+    save_path = edits_dir / _edit_filename(object_name, attempt_tag)
+
+    bbox = None
+    if localized:
+        ensure_local(start_img_path)
+        crop_path = edits_dir / _edit_filename(f"{object_name}_crop_input", attempt_tag)
+        mask_crop_path = edits_dir / _edit_filename(f"{object_name}_crop_mask", attempt_tag)
+        bbox = crop_for_local_edit(
+            start_img_path, masks[object_name], crop_path, mask_crop_path
+        )
+    if bbox is not None:
+        image_paths = [crop_path, mask_crop_path]
+    else:
+        # Chained edit results and repeated masks reuse their existing CDN URLs
+        image_paths = [start_img_path, masks[object_name]]
+    result = _run_fal_edit(model, prompt, image_paths, "pose", budget, cancelled)
+    if bbox is not None:
+        edited_crop_path = edits_dir / _edit_filename(f"{object_name}_crop", attempt_tag)
+        download_file(result["images"][0]["url"], edited_crop_path)
+        blend_local_edit(
+            start_img_path, edited_crop_path, masks[object_name], bbox, save_path
+        )
+        return save_path
+    # The local copy downloads in the background; see transfers.ensure_local
+    save_remote_result(result["images"][0]["url"], save_path)
+    return save_path
+
+
+def get_background_plate(
+    background_type: str, budget: RunBudget | None = None
+) -> os.PathLike:
+    """Return a background plate for ``background_type``.
+
+    Plates are generated with a text-to-image model until the type's bank holds
+    compositing.PLATES_PER_BG_TYPE of them; after that, existing plates are reused.
+    """
+    plate_path = reserve_plate_path(background_type)
+    if plate_path is None:
+        return choose_plate(background_type)
+    print(f"Generating {background_type} background plate (model={BG_PLATE_MODEL})...")
+    prompt = render_background_plate_prompt(background_type).strip()
+    try:
+        result = _run_fal_model(
+            BG_PLATE_MODEL,
+            {
+                "prompt": prompt,
+                "image_size": {"width": IMG_RESOLUTION_X, "height": IMG_RESOLUTION_Y},
+            },
+            "background_plate",
+            budget,
+            with_logs=False,
+        )
+        download_file(result["images"][0]["url"], plate_path)
+    finally:
+        release_plate_reservation(plate_path)
+    return plate_path
+
+
+def add_composited_background(
+    render_id: str,
+    run_ctx: RunContext,
+    render_path: os.PathLike,
+    masks: dict[str, os.PathLike],
+    budget: RunBudget | None = None,
+) -> os.PathLike:
+    """Add a background by compositing the render onto a plate locally.
+
+    Uses the render's ``all`` mask, so the objects are preserved exactly.
+    """
+    background_type = random.choice(BG_TYPES)
+    plate_path = get_background_plate(background_type, budget)
+    print(f"Compositing render {render_id} onto {background_type} plate {plate_path}...")
+    edits_dir = run_ctx.edits_dir / render_id
+    edits_dir.mkdir(parents=True, exist_ok=True)
+    save_path = edits_dir / "background_composite.png"
+    composite_render_onto_plate(render_path, masks["all"], plate_path, save_path)
+    return save_path
+
+
+def harmonize_background(
+    render_id: str,
+    run_ctx: RunContext,
+    composite_path: os.PathLike,
+    action_scene,
+    budget: RunBudget | None = None,
+) -> os.PathLike:
+    """Blend a composited background with one cheap edit (lighting/shadows only).
+
+    The returned file may still be downloading, and ``budget`` is charged, as in
+    add_background.
+    """
+    model = BG_HARMONIZATION_MODEL
+    print(f"Harmonizing composited background of render {render_id} (model={model})...")
+    prompt = render_harmonize_background_prompt(action_scene).strip()
+    result = _run_fal_edit(
+        model, prompt, [composite_path], "background_harmonization", budget
     )
-    edits_dir = OUTPUT_EDITS_DIR_PATH / run_uid / render_id
+    edits_dir = run_ctx.edits_dir / render_id
     edits_dir.mkdir(parents=True, exist_ok=True)
-    save_path = edits_dir / f"{object_name}.png"
-    with open(save_path, "wb") as f:
-        f.write(requests.get(result["images"][0]["url"]).content)
+    save_path = edits_dir / "background.png"
+    save_remote_result(result["images"][0]["url"], save_path)
     return save_path
@@ -0,0 +1,548 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Iterator
+
+import numpy as np
+from fal_client import Completed, Queued
+from fal_client.client import FalClientHTTPError
+from PIL import Image
+from pydantic import BaseModel
+
+from mavis import transfers
+from mavis.fal import use_fal_client
+from mavis.globals import (
+    IMG_RESOLUTION_X,
+    IMG_RESOLUTION_Y,
+    RENDER_EVENTS_FILENAME,
+    ObjectPlacementSpec,
+    RunContext,
+)
+from mavis.schema import (
+    ActionScene,
+    BinaryResponse,
+    ImageChoice,
+    ImageComparisonResponse,
+    ObjectSpecs,
+    ScenePlacementsResponse,
+    SceneSpecsResponse,
+    StructuredActionSceneSpecs,
+    YesNo,
+)
+from mavis.tracing import Tracer, span, use_tracer
+from mavis.vlm import OpenAIVLM
+
+# Offline, deterministic (given a seed) stand-ins for OpenAI, fal and Blender, with
+# simulated latency and failures, so that scheduling, retries and throughput can be
+# exercised without live keys or Blender. See fake_vlm, fake_fal and fake_blender.
+
+FAKE_VLM_MODEL = "fake-vlm"
+# Tokens charged per image in a fake VLM request (as for OpenAI's low detail)
+FAKE_TOKENS_PER_IMAGE = 85
+# Size of images generated from text only, when no image_size is requested
+FAKE_IMAGE_SIZE = (512, 512)
+# Pixels within this distance (0-255, per channel) of an input image's commonest color
+# count as blank background, which the default fake edit fills in
+FAKE_BLANK_TOLERANCE = 3
+FAKE_MIN_BLANK_FRACTION = 0.2
+# Environment variable giving the fake Blender's median seconds per POV
+FAKE_RENDER_S_ENV = "MAVIS_FAKE_RENDER_S"
+# Gray of the fake Blender's empty backdrop (as in render_scene.py's world color)
+FAKE_RENDER_BACKDROP = 128
+SRC_DIR_PATH = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class LatencyModel:
+    """Log-normal request latency with median ``median_s`` and log-space std ``sigma``."""
+
+    median_s: float = 0.0
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median_s <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median_s), self.sigma)
+
+
+@dataclass
+class FaultModel:
+    """Fractions of requests that fail, and how."""
+
+    rate_limit_rate: float = 0.0  # 429s, retried by mavis.resilience
+    content_policy_rate: float = 0.0  # Content-policy rejections, not retried
+    retry_after_s: float = 0.0  # Retry-After sent with 429s
+
+
+class FakeHTTPError(Exception):
+    """An HTTP error from a fake OpenAI endpoint (classified by mavis.resilience)."""
+
+    def __init__(self, message: str, status_code: int, response_headers: dict[str, str]):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_headers = response_headers
+
+
+class _FakeService:
+    """Shared latency and fault simulation, with per-endpoint call counts."""
+
+    def __init__(self, faults: FaultModel | None, seed: int):
+        self.faults = faults or FaultModel()
+        self.n_calls: dict[str, int] = defaultdict(int)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(
+        self,
+        endpoint: str,
+        latency: LatencyModel,
+        raise_error: Callable[[str, int, dict[str, str]], None],
+    ) -> None:
+        with self._lock:
+            self.n_calls[endpoint] += 1
+            delay_s = latency.sample(self._rng)
+            draw = self._rng.random()
+        time.sleep(delay_s)
+        if draw < self.faults.rate_limit_rate:
+            headers = {"retry-after": str(self.faults.retry_after_s)}
+            raise_error(f"Rate limit exceeded for {endpoint}", 429, headers)
+        if draw < self.faults.rate_limit_rate + self.faults.content_policy_rate:
+            raise_error(f"content_policy_violation from {endpoint}", 400, {})
+
+
+def _raise_openai_error(message: str, status_code: int, headers: dict[str, str]) -> None:
+    raise FakeHTTPError(message, status_code, headers)
+
+
+def _raise_fal_error(message: str, status_code: int, headers: dict[str, str]) -> None:
+    raise FalClientHTTPError(message, status_code, headers, response=None)
+
+
+# Response rules map a prompt template name to a canned response, or to a function
+# of (messages, response_format) returning one (text, or a response_format instance)
+ResponseRule = str | BaseModel | Callable[[list[dict], type[BaseModel] | None], object]
+
+
+class FakeOpenAIClient(_FakeService):
+    """Stands in for ``openai.OpenAI`` in OpenAIVLM (see fake_vlm).
+
+    Responses come from ``responses`` (keyed by prompt template name). Without a
+    rule, yes/no checks answer yes, and image comparisons prefer the edited image,
+    with probability ``check_pass_rate``; other structured responses (e.g. scene
+    specs) must be given as rules.
+    """
+
+    def __init__(
+        self,
+        responses: dict[str, ResponseRule] | None = None,
+        latency: LatencyModel | None = None,
+        faults: FaultModel | None = None,
+        check_pass_rate: float = 1.0,
+        seed: int = 0,
+    ):
+        super().__init__(faults, seed)
+        self.responses = responses or {}
+        self.latency = latency or LatencyModel()
+        self.check_pass_rate = check_pass_rate
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.beta = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(parse=self._parse))
+        )
+
+    def _respond(self, kwargs: dict, response_format: type[BaseModel] | None):
+        template_name = kwargs.get("prompt_cache_key")
+        self._simulate(template_name or "untagged", self.latency, _raise_openai_error)
+        rule = self.responses.get(template_name)
+        if callable(rule) and not isinstance(rule, BaseModel):
+            return rule(kwargs["messages"], response_format)
+        if rule is not None:
+            return rule
+        with self._lock:
+            passes = self._rng.random() < self.check_pass_rate
+        if response_format is BinaryResponse:
+            return BinaryResponse(answer=YesNo.yes if passes else YesNo.no, confidence=0.95)
+        if response_format is ImageComparisonResponse:
+            answer = ImageChoice.second if passes else ImageChoice.first
+            return ImageComparisonResponse(answer=answer, confidence=0.9)
+        if response_format is None:
+            return ""
+        raise ValueError(f"No fake {response_format.__name__} for template {template_name!r}")
+
+    @staticmethod
+    def _usage(messages: list[dict], completion: str) -> SimpleNamespace:
+        n_prompt_chars, n_images = 0, 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                n_prompt_chars += len(content)
+                continue
+            for part in content:
+                if part["type"] == "text":
+                    n_prompt_chars += len(part["text"])
+                else:
+                    n_images += 1
+        return SimpleNamespace(
+            prompt_tokens=n_prompt_chars // 4 + n_images * FAKE_TOKENS_PER_IMAGE,
+            completion_tokens=len(completion) // 4,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+            completion_tokens_details=None,
+        )
+
+    def _create(self, stream: bool = False, stream_options=None, **kwargs):
+        text = str(self._respond(kwargs, None))
+        usage = self._usage(kwargs["messages"], text)
+        if not stream:
+            message = SimpleNamespace(content=text)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+        chunks = [
+            SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i : i + 16]))],
+                usage=None,
+            )
+            for i in range(0, len(text), 16)
+        ]
+        chunks.append(SimpleNamespace(choices=[], usage=usage))
+        return _FakeStream(chunks)
+
+    def _parse(self, response_format: type[BaseModel], **kwargs):
+        parsed = self._respond(kwargs, response_format)
+        usage = self._usage(kwargs["messages"], parsed.model_dump_json())
+        message = SimpleNamespace(parsed=parsed, content=parsed.model_dump_json())
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class _FakeStream:
+    def __init__(self, chunks: list):
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self) -> None:
+        pass
+
+
+def fake_scene_specs_response(action_scene: ActionScene) -> SceneSpecsResponse:
+    """A canned (structured) scene specs answer for ``action_scene``."""
+
+    def specs(kind: str) -> list[ObjectSpecs]:
+        return [
+            ObjectSpecs(object_name=name, specs=[f"{kind} of the {name}"])
+            for name in action_scene.object_strs
+        ]
+
+    return SceneSpecsResponse(
+        scene_characteristics=f"The scene shows {action_scene.shorthand_str}.",
+        specs=StructuredActionSceneSpecs(
+            position=specs("position"),
+            orientation=specs("orientation"),
+            size=specs("size"),
+            state=specs("pose"),
+        ),
+    )
+
+
+def fake_scene_placements_response(action_scene: ActionScene) -> ScenePlacementsResponse:
+    """A canned placements answer for ``action_scene``, its objects 3m apart in a row."""
+    return ScenePlacementsResponse(
+        placements=[
+            ObjectPlacementSpec(
+                object_name=name,
+                target_location=[3.0 * i, 0.0, 0.0],
+                target_facing_direction=[0.0, 0.0, 0.0],
+                touching_ground=True,
+            )
+            for i, name in enumerate(action_scene.object_strs)
+        ]
+    )
+
+
+def fake_vlm(**kwargs) -> OpenAIVLM:
+    """An OpenAIVLM backed by a FakeOpenAIClient (``kwargs`` go to the client)."""
+    return OpenAIVLM(model=FAKE_VLM_MODEL, client=FakeOpenAIClient(**kwargs))
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeFalServer:
+    """Serves a local upload/result store over HTTP on localhost (in a daemon thread)."""
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        handler = partial(_QuietHandler, directory=str(self.store_dir))
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_port}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def url_for(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def path_for(self, url: str) -> Path:
+        return self.store_dir / url.rsplit("/", 1)[-1]
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def _texture(size: tuple[int, int], seed: int) -> np.ndarray:
+    """A smooth random RGB texture (0-255) of ``size`` (width, height)."""
+    w, h = size
+    coarse = np.random.default_rng(seed).integers(0, 256, (max(1, h // 32), max(1, w // 32), 3))
+    image = Image.fromarray(coarse.astype(np.uint8)).resize(size, Image.Resampling.BILINEAR)
+    return np.asarray(image)
+
+
+def fill_blank_background(
+    model: str, arguments: dict, input_paths: list[Path]
+) -> Image.Image:
+    """Default fake edit: paint a texture over the first input's blank background.
+
+    Blank means close to the input's commonest color, e.g. a render's empty backdrop;
+    inputs with little of it (e.g. ones that already have a background) are
+    returned unchanged. Without inputs, returns a texture of the requested size.
+    """
+    seed = int(hashlib.sha256(f"{model}{arguments.get('prompt')}".encode()).hexdigest()[:8], 16)
+    if not input_paths:
+        image_size = arguments.get("image_size", {})
+        size = (
+            image_size.get("width", FAKE_IMAGE_SIZE[0]),
+            image_size.get("height", FAKE_IMAGE_SIZE[1]),
+        )
+        return Image.fromarray(_texture(size, seed))
+    with Image.open(input_paths[0]) as image:
+        pixels = np.asarray(image.convert("RGB")).copy()
+    rgb = pixels.astype(np.int32)
+    packed = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    colors, counts = np.unique(packed, return_counts=True)
+    backdrop = colors[counts.argmax()]
+    backdrop_rgb = np.array([backdrop >> 16, (backdrop >> 8) & 255, backdrop & 255])
+    distance = np.abs(rgb - backdrop_rgb).max(axis=-1)
+    blank = distance <= FAKE_BLANK_TOLERANCE
+    if blank.mean() >= FAKE_MIN_BLANK_FRACTION:
+        pixels[blank] = _texture((pixels.shape[1], pixels.shape[0]), seed)[blank]
+    return Image.fromarray(pixels)
+
+
+FakeEdit = Callable[[str, dict, list[Path]], Image.Image]
+
+
+class FakeFalClient(_FakeService):
+    """Stands in for the ``fal_client`` module (see mavis.fal.set_fal_client).
+
+    Uploads are copied to a local store, and results are written to it, which a
+    FakeFalServer serves over HTTP, so results are downloaded by mavis.transfers
+    like real ones. Results are made by ``edit(model, arguments, input_paths)``
+    (fill_blank_background by default). ``latency`` may differ per model.
+    Requests made with ``submit`` wait in a queue for ``queue_latency`` first.
+    """
+
+    def __init__(
+        self,
+        store_dir: Path,
+        edit: FakeEdit = fill_blank_background,
+        latency: LatencyModel | dict[str, LatencyModel] | None = None,
+        upload_latency: LatencyModel | None = None,
+        queue_latency: LatencyModel | None = None,
+        faults: FaultModel | None = None,
+        seed: int = 0,
+    ):
+        super().__init__(faults, seed)
+        self.server = FakeFalServer(store_dir)
+        self.edit = edit
+        self.latency = latency or LatencyModel()
+        self.upload_latency = upload_latency or LatencyModel()
+        self.queue_latency = queue_latency or LatencyModel()
+
+    def _model_latency(self, model: str) -> LatencyModel:
+        if isinstance(self.latency, dict):
+            return self.latency.get(model, LatencyModel())
+        return self.latency
+
+    def upload_file(self, path) -> str:
+        self._simulate("upload", self.upload_latency, _raise_fal_error)
+        name = f"upload_{uuid.uuid4().hex}{Path(path).suffix}"
+        shutil.copyfile(path, self.server.store_dir / name)
+        return self.server.url_for(name)
+
+    def subscribe(self, application: str, arguments: dict, with_logs: bool = False, **kwargs):
+        self._simulate(application, self._model_latency(application), _raise_fal_error)
+        image_urls = arguments.get("image_urls") or (
+            [arguments["image_url"]] if "image_url" in arguments else []
+        )
+        input_paths = [self.server.path_for(url) for url in image_urls]
+        name = f"result_{uuid.uuid4().hex}.png"
+        self.edit(application, arguments, input_paths).save(self.server.store_dir / name)
+        return {"images": [{"url": self.server.url_for(name)}]}
+
+    def submit(self, application: str, arguments: dict, **kwargs) -> "FakeRequestHandle":
+        with self._lock:
+            queued_s = self.queue_latency.sample(self._rng)
+        queued_until = time.monotonic() + queued_s
+        return FakeRequestHandle(self, application, arguments, queued_until)
+
+    def close(self) -> None:
+        self.server.close()
+
+
+class FakeRequestHandle:
+    """Stands in for ``fal_client.SyncRequestHandle`` (see FakeFalClient.submit).
+
+    The request is queued until ``queued_until`` (a time.monotonic time), and can
+    only be cancelled until then; it runs once polled past it.
+    """
+
+    def __init__(
+        self,
+        client: FakeFalClient,
+        application: str,
+        arguments: dict,
+        queued_until: float,
+    ):
+        self.client = client
+        self.application = application
+        self.arguments = arguments
+        self.queued_until = queued_until
+        self._cancelled = False
+        self._result: dict | None = None
+
+    def iter_events(self, with_logs: bool = False, interval: float = 0.1):
+        while not self._cancelled and time.monotonic() < self.queued_until:
+            yield Queued(position=0)
+            time.sleep(interval)
+        self.get()
+        yield Completed(logs=None, metrics={})
+
+    def cancel(self) -> None:
+        with self.client._lock:
+            self.client.n_calls["cancel"] += 1
+        if time.monotonic() >= self.queued_until:
+            raise FalClientHTTPError(
+                "Request is already in progress", 400, {}, response=None
+            )
+        self._cancelled = True
+
+    def get(self) -> dict:
+        if self._cancelled:
+            raise FalClientHTTPError("Request was cancelled", 400, {}, response=None)
+        if self._result is None:
+            self._result = self.client.subscribe(self.application, self.arguments)
+        return self._result
+
+
+@contextmanager
+def fake_fal(store_dir: Path, **kwargs) -> Iterator[FakeFalClient]:
+    """Route all fal calls to a FakeFalClient (``kwargs`` go to it) while in context."""
+    client = FakeFalClient(store_dir, **kwargs)
+    # CDN URLs cached from another client would point nowhere
+    transfers.forget_remote_urls()
+    try:
+        with use_fal_client(client):
+            yield client
+    finally:
+        transfers.forget_remote_urls()
+        client.close()
+
+
+def _fake_render_pov(placement_specs: list[dict], run_ctx: RunContext, pov: int) -> None:
+    """Draw each object as a box in its own column of a gray backdrop, with masks."""
+    rng = np.random.default_rng(
+        int(hashlib.sha256(f"{run_ctx.run_uid}{pov}".encode()).hexdigest()[:8], 16)
+    )
+    w, h = IMG_RESOLUTION_X, IMG_RESOLUTION_Y
+    pixels = np.full((h, w, 3), FAKE_RENDER_BACKDROP, dtype=np.uint8)
+    masks_dir = run_ctx.masks_dir / f"{pov:04d}"
+    masks_dir.mkdir(parents=True, exist_ok=True)
+    all_objects = np.zeros((h, w), dtype=bool)
+    column_w = w // max(1, len(placement_specs))
+    for i, spec in enumerate(placement_specs):
+        box_w = int(rng.integers(column_w // 3, column_w * 3 // 4))
+        box_h = int(rng.integers(h // 6, h // 2))
+        x0 = i * column_w + int(rng.integers(0, column_w - box_w))
+        y0 = int(rng.integers(0, h - box_h))
+        mask = np.zeros((h, w), dtype=bool)
+        mask[y0 : y0 + box_h, x0 : x0 + box_w] = True
+        pixels[mask] = rng.integers(0, 256, 3)
+        all_objects |= mask
+        Image.fromarray(mask).save(masks_dir / f"{spec['object_name']}.png")
+    Image.fromarray(all_objects).save(masks_dir / "all.png")
+    run_ctx.renders_dir.mkdir(parents=True, exist_ok=True)
+    Image.fromarray(pixels).save(run_ctx.renders_dir / f"{pov:04d}.png")
+
+
+def fake_render_main(argv: list[str]) -> None:
+    """Fake Blender entry point: render and publish POVs as render_scene.py does.
+
+    Takes the same arguments as start_scene_render_subprocess passes to Blender, and
+    takes FAKE_RENDER_S_ENV (median) seconds per POV.
+    """
+    script_argv = argv[argv.index("--") + 1 :] if "--" in argv else argv
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--first-pov", type=int, default=0)
+    parser.add_argument("--n-povs", type=int, default=1)
+    pov_args, _ = parser.parse_known_args(script_argv)
+    run_ctx = RunContext.from_argv(script_argv)
+    with open(run_ctx.placement_specs_path) as f:
+        placement_specs = json.load(f)
+    latency = LatencyModel(float(os.environ.get(FAKE_RENDER_S_ENV, 0)))
+    rng = random.Random(run_ctx.run_uid)
+    with use_tracer(Tracer(run_ctx.render_spans_path)):
+        for pov in range(pov_args.first_pov, pov_args.first_pov + pov_args.n_povs):
+            with span("blender.fake_render", "render", pov=pov):
+                time.sleep(latency.sample(rng))
+                _fake_render_pov(placement_specs, run_ctx, pov)
+            with open(run_ctx.renders_dir / RENDER_EVENTS_FILENAME, "a") as f:
+                f.write(json.dumps({"render_id": f"{pov:04d}"}) + "\n")
+
+
+@contextmanager
+def fake_blender(render_s: float = 0.0) -> Iterator[None]:
+    """Have renders started while in context run fake_render_main instead of Blender.
+
+    Works by pointing BLENDER_EXE at a shim script (POSIX only), so renders still go
+    through a subprocess and its published events. Changes the process's environment,
+    so don't enter it from several threads at once.
+    """
+    saved_env = {name: os.environ.get(name) for name in ("BLENDER_EXE", FAKE_RENDER_S_ENV)}
+    with tempfile.TemporaryDirectory() as shim_dir:
+        shim_path = Path(shim_dir) / "blender"
+        shim_path.write_text(
+            "#!/bin/sh\n"
+            f'PYTHONPATH="{SRC_DIR_PATH}${{PYTHONPATH:+:$PYTHONPATH}}" '
+            f'exec "{sys.executable}" -m mavis.fakes "$@"\n'
+        )
+        shim_path.chmod(0o755)
+        os.environ["BLENDER_EXE"] = str(shim_path)
+        os.environ[FAKE_RENDER_S_ENV] = str(render_s)
+        try:
+            yield
+        finally:
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+if __name__ == "__main__":
+    fake_render_main(sys.argv[1:])
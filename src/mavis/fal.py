@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+# Client used for fal uploads and model calls: the fal_client module unless replaced,
+# e.g. by mavis.fakes.FakeFalClient for offline runs
+_client = None
+
+
+def get_fal_client():
+    """Return the fal client (``subscribe`` and ``upload_file``) in use."""
+    if _client is None:
+        import fal_client
+
+        return fal_client
+    return _client
+
+
+def set_fal_client(client) -> None:
+    """Route all fal calls to ``client`` (None restores the real fal_client)."""
+    global _client
+    _client = client
+
+
+@contextmanager
+def use_fal_client(client) -> Iterator[None]:
+    previous = _client
+    set_fal_client(client)
+    try:
+        yield
+    finally:
+        set_fal_client(previous)
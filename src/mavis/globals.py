@@ -1,5 +1,10 @@
+import argparse
 import json
+import threading
+import uuid
+from collections.abc import Iterator, Mapping
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import Literal, Optional
 
@@ -15,16 +20,92 @@ BASE_SCENE_PATH = OBJAVERSE_DIR_PATH / "base_scene.blend"
 
 PROMPTS_DIR_PATH = Path(__file__).resolve().parent / "prompts"
 
-TEMP_JSON_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "temp.json"
-
 OUTPUT_DIR_PATH = Path(__file__).resolve().parent.parent.parent / "outputs"
-OUTPUT_RENDERS_DIR_PATH = OUTPUT_DIR_PATH / "renders"
-OUTPUT_MASKS_DIR_PATH = OUTPUT_DIR_PATH / "masks"
-OUTPUT_EDITS_DIR_PATH = OUTPUT_DIR_PATH / "edits"
-FINAL_OUTPUTS_DIR_PATH = OUTPUT_DIR_PATH / "final"
-SCENE_SPECS_DIR_PATH = OUTPUT_DIR_PATH / "scene_specs"
+# Reusable background plates (one subdir per background type), shared across runs
+BACKGROUND_PLATES_DIR_PATH = OUTPUT_DIR_PATH / "background_plates"
+BATCH_SUMMARIES_DIR_PATH = OUTPUT_DIR_PATH / "batches"
+# Results of benchmarks.py runs, one JSON file per run
+BENCHMARKS_DIR_PATH = OUTPUT_DIR_PATH / "benchmarks"
+
+# Per-run JSONL file (in the run's renders dir) to which Blender appends one event
+# per POV once its render and masks are written
+RENDER_EVENTS_FILENAME = "events.jsonl"
+# Per-run file (in the run's renders dir) from which Blender reads placement specs
+PLACEMENT_SPECS_FILENAME = "placement_specs.json"
+# Per-run JSONL file (in the run's renders dir) to which Blender appends its spans
+RENDER_SPANS_FILENAME = "spans.jsonl"
+
+
+@dataclass(frozen=True)
+class RunContext:
+    """Identifies one pipeline run and where its outputs go.
+
+    Passed explicitly everywhere (incl. to the Blender subprocess, via its argv),
+    so concurrent runs never share mutable state. Outputs are laid out as
+    ``{output_dir}/{renders,masks,edits,final}/{run_uid}/`` and
+    ``{output_dir}/{scene_specs,manifests,traces}/{run_uid}.json``.
+    """
+
+    run_uid: str
+    output_dir: Path = OUTPUT_DIR_PATH
+
+    @classmethod
+    def create(cls, label: str, output_dir: Path = OUTPUT_DIR_PATH) -> "RunContext":
+        """Create a context with a collision-free run UID (timestamp + random suffix)."""
+        run_uid = f"{datetime.now().strftime('%y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}_{label}"
+        return cls(run_uid=run_uid, output_dir=Path(output_dir))
+
+    @property
+    def renders_dir(self) -> Path:
+        return self.output_dir / "renders" / self.run_uid
+
+    @property
+    def masks_dir(self) -> Path:
+        return self.output_dir / "masks" / self.run_uid
+
+    @property
+    def edits_dir(self) -> Path:
+        return self.output_dir / "edits" / self.run_uid
+
+    @property
+    def final_outputs_dir(self) -> Path:
+        return self.output_dir / "final" / self.run_uid
+
+    @property
+    def scene_specs_path(self) -> Path:
+        return self.output_dir / "scene_specs" / f"{self.run_uid}.json"
+
+    @property
+    def stage_manifest_path(self) -> Path:
+        return self.output_dir / "manifests" / f"{self.run_uid}.json"
+
+    @property
+    def trace_path(self) -> Path:
+        return self.output_dir / "traces" / f"{self.run_uid}.json"
+
+    @property
+    def placement_specs_path(self) -> Path:
+        return self.renders_dir / PLACEMENT_SPECS_FILENAME
+
+    @property
+    def render_spans_path(self) -> Path:
+        return self.renders_dir / RENDER_SPANS_FILENAME
 
-CUR_RUN_UID_ENV_VAR = "CUR_MAVIS_RUN_UID"
+    def render_profile_path(self, first_pov: int = 0) -> Path:
+        """Profile of the Blender render starting at ``first_pov`` (see --profile)."""
+        return self.renders_dir / f"profile_{first_pov:04d}.json"
+
+    def to_argv(self) -> list[str]:
+        return ["--run-uid", self.run_uid, "--output-dir", str(self.output_dir)]
+
+    @classmethod
+    def from_argv(cls, argv: list[str]) -> "RunContext":
+        """Parse the arguments written by to_argv (other arguments are ignored)."""
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--run-uid", required=True)
+        parser.add_argument("--output-dir", type=Path, required=True)
+        args, _ = parser.parse_known_args(argv)
+        return cls(run_uid=args.run_uid, output_dir=args.output_dir)
 
 
 @dataclass
@@ -40,11 +121,42 @@ class BlenderObject:
         return OBJAVERSE_SHAPES_DIR_PATH / self.file / "Object" / self.name
 
 
-_blender_object_data = json.load(open(OBJAVERSE_DIR_PATH / "properties.json"))
+class BlenderObjectCatalog(Mapping[str, BlenderObject]):
+    """The Blender objects described by a properties.json, keyed by name.
+
+    The file is only read (and indexed) on first access, so that importing mavis
+    stays cheap for processes that never look up an object.
+    """
+
+    def __init__(self, properties_path: Path):
+        self.properties_path = properties_path
+        self._objects: dict[str, BlenderObject] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._objects is not None
+
+    def _load(self) -> dict[str, BlenderObject]:
+        if self._objects is None:
+            with self._lock:
+                if self._objects is None:
+                    with open(self.properties_path) as f:
+                        data = json.load(f)
+                    self._objects = {name: BlenderObject(**d) for name, d in data.items()}
+        return self._objects
+
+    def __getitem__(self, name: str) -> BlenderObject:
+        return self._load()[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
 
-BLENDER_OBJECTS: dict[str, BlenderObject] = {
-    name: BlenderObject(**data) for name, data in _blender_object_data.items()
-}
+BLENDER_OBJECTS = BlenderObjectCatalog(OBJAVERSE_DIR_PATH / "properties.json")
 
 
 @dataclass
@@ -0,0 +1,98 @@
+import threading
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, TypeVar
+
+from mavis.tracing import submit_in_context
+
+R = TypeVar("R")
+
+
+@dataclass
+class HedgeConfig:
+    """Settings for hedged (speculative, concurrent) edit attempts.
+
+    Attributes:
+        k: Max attempts of one edit in flight at once, each on a different model.
+        max_extra_in_flight: Cost cap on speculative attempts, i.e. attempts beyond
+            the first of each edit, in flight at once across all edits sharing
+            this config.
+    """
+
+    k: int = 2
+    max_extra_in_flight: int = 4
+    _extra_slots: threading.BoundedSemaphore = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._extra_slots = threading.BoundedSemaphore(self.max_extra_in_flight)
+
+
+def run_hedged_attempts(
+    attempt: Callable[[int, str, threading.Event], R | None],
+    select_model: Callable[[int, set[str]], str],
+    max_attempts: int,
+    hedge: HedgeConfig,
+    reraise: tuple[type[Exception], ...] = (),
+) -> R | None:
+    """Run up to ``max_attempts`` attempts, up to ``hedge.k`` at a time, first success wins.
+
+    ``attempt(try_number, model, cancelled)`` returns a result on success or None
+    on failure; it should cancel its requests that haven't started, and check
+    ``cancelled`` before spending on verification, once it is set (when another
+    attempt has won). ``select_model(try_number, in_flight)``
+    picks a model, avoiding those in flight. Attempts raising an exception count as
+    failures, except for ``reraise`` exceptions, which cancel the other attempts and
+    are re-raised. Returns the winning result (without waiting for the losers) or None.
+    """
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=hedge.k)
+    in_flight: dict[Future, str] = {}
+    holds_extra_slot: set[Future] = set()
+    n_started = 0
+
+    def release(future: Future) -> None:
+        if future in holds_extra_slot:
+            holds_extra_slot.discard(future)
+            hedge._extra_slots.release()
+
+    def fill() -> None:
+        nonlocal n_started
+        while n_started < max_attempts and len(in_flight) < hedge.k:
+            # The first attempt in flight is free; speculative ones need an extra slot
+            is_extra = len(in_flight) > 0
+            if is_extra and not hedge._extra_slots.acquire(blocking=False):
+                return
+            n_started += 1
+            model = select_model(n_started, set(in_flight.values()))
+            future = submit_in_context(executor, attempt, n_started, model, cancelled)
+            in_flight[future] = model
+            if is_extra:
+                holds_extra_slot.add(future)
+
+    try:
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                model = in_flight.pop(future)
+                release(future)
+                try:
+                    result = future.result()
+                except reraise:
+                    cancelled.set()
+                    raise
+                except Exception as e:
+                    warnings.warn(f"Hedged attempt with {model} failed: {e}")
+                    result = None
+                if result is not None:
+                    cancelled.set()
+                    return result
+            fill()
+        return None
+    finally:
+        # Losers that already started finish in the background (see ``cancelled``);
+        # the rest never start
+        for future in list(in_flight):
+            future.add_done_callback(release)
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,124 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image
+
+from mavis.schema import ImageFormat, ImagePayloadOptions
+
+_MIME_BY_EXT = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+_MIME_BY_FORMAT = {
+    ImageFormat.png: "image/png",
+    ImageFormat.jpeg: "image/jpeg",
+    ImageFormat.webp: "image/webp",
+}
+
+MAX_CACHED_ENCODINGS = 256
+
+# Encoded data URLs keyed by (image digest, mask digest, encoding options)
+_encoding_cache: dict[tuple, str] = {}
+_encoding_cache_lock = threading.Lock()
+
+
+def file_digest(path: os.PathLike) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compute_mask_bbox(
+    mask_path: os.PathLike,
+    image_size: tuple[int, int],
+    padding: float,
+) -> tuple[int, int, int, int] | None:
+    """Return the padded bbox of a mask's foreground, scaled to ``image_size``.
+
+    Edit models do not always preserve the render resolution, so the bbox is
+    computed in mask coordinates and rescaled to the target image. Returns None
+    if the mask is empty.
+    """
+    with Image.open(mask_path) as mask:
+        mask_w, mask_h = mask.size
+        bbox = mask.convert("L").point(lambda v: 255 if v > 127 else 0).getbbox()
+    if bbox is None:
+        return None
+    img_w, img_h = image_size
+    sx, sy = img_w / mask_w, img_h / mask_h
+    left, top, right, bottom = bbox[0] * sx, bbox[1] * sy, bbox[2] * sx, bbox[3] * sy
+    pad = padding * max(right - left, bottom - top)
+    return (
+        max(0, int(left - pad)),
+        max(0, int(top - pad)),
+        min(img_w, int(right + pad)),
+        min(img_h, int(bottom + pad)),
+    )
+
+
+def _encode_original(path: os.PathLike) -> str:
+    with open(path, "rb") as f:
+        b64 = base64.b64encode(f.read()).decode("utf-8")
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    mime = _MIME_BY_EXT.get(ext, "image/png")
+    return f"data:{mime};base64,{b64}"
+
+
+def _encode_transformed(path: os.PathLike, options: ImagePayloadOptions) -> str:
+    with Image.open(path) as img:
+        img.load()
+    if options.crop_mask_path is not None:
+        bbox = compute_mask_bbox(options.crop_mask_path, img.size, options.crop_padding)
+        if bbox is not None:
+            img = img.crop(bbox)
+    if options.max_side is not None:
+        img.thumbnail((options.max_side, options.max_side), Image.Resampling.LANCZOS)
+    if options.format == ImageFormat.jpeg and img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    save_kwargs = {} if options.format == ImageFormat.png else {"quality": options.quality}
+    img.save(buf, format=options.format.value, **save_kwargs)
+    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
+    return f"data:{_MIME_BY_FORMAT[options.format]};base64,{b64}"
+
+
+def encode_image_to_data_url(
+    path: os.PathLike, options: ImagePayloadOptions | None = None
+) -> str:
+    """Return a base64 data URL for an image, re-encoded according to ``options``.
+
+    With no options the original file bytes are sent unchanged. Encodings are
+    memoized by content hash, so re-checking an unchanged image (or the same image
+    for several objects) only pays for decoding and compressing it once.
+    """
+    mask_digest = (
+        file_digest(options.crop_mask_path)
+        if options is not None and options.crop_mask_path is not None
+        else None
+    )
+    options_key = (
+        None
+        if options is None
+        else options.model_dump_json(exclude={"crop_mask_path", "detail"})
+    )
+    key = (file_digest(path), mask_digest, options_key)
+    with _encoding_cache_lock:
+        if key in _encoding_cache:
+            return _encoding_cache[key]
+    if options is None:
+        data_url = _encode_original(path)
+    else:
+        data_url = _encode_transformed(path, options)
+    with _encoding_cache_lock:
+        if len(_encoding_cache) >= MAX_CACHED_ENCODINGS:
+            # Evict the oldest entry (dicts preserve insertion order)
+            del _encoding_cache[next(iter(_encoding_cache))]
+        _encoding_cache[key] = data_url
+    return data_url
@@ -3,42 +3,118 @@ import os
 import subprocess
 import sys
 import shutil
+import threading
+import time
 import warnings
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import asdict, dataclass
+from functools import cache, wraps
 from pathlib import Path
-from datetime import datetime
-from requests.exceptions import HTTPError
-
-from fal_client.client import FalClientHTTPError
-
-from PIL import Image
-
-from tenacity import retry, stop_after_attempt
+from enum import StrEnum
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
 
-from mavis.schema import ActionScene, ActionSceneSpecs
+from mavis.schema import (
+    ActionScene,
+    ActionSceneSpecs,
+    SceneSpecsResponse,
+    ScenePlacementsResponse,
+    VLMPrompt,
+)
 from mavis.vlm import VLM
-from mavis.edits import add_background, modify_pose
+from mavis.budget import BudgetExceeded, RunBudget, with_budget
+from mavis.edits import (
+    BG_HARMONIZATION_MODEL,
+    EditCancelled,
+    add_background,
+    add_composited_background,
+    harmonize_background,
+    modify_pose,
+    select_background_model,
+    select_pose_model,
+)
+from mavis.compositing import (
+    PlateUnavailableError,
+    group_disjoint_regions,
+    local_edit_region,
+    merge_local_edits,
+)
+from mavis.images import file_digest
+from mavis.hedging import HedgeConfig, run_hedged_attempts
+from mavis.resilience import ContentPolicyError
+from mavis.routing import EditStage, ModelRouter
+from mavis.stages import Stage, StageManifest, stage_key
+from mavis.tracing import (
+    Tracer,
+    current_tracer,
+    format_latency_breakdown,
+    span,
+    submit_in_context,
+    use_tracer,
+)
+from mavis.yields import n_povs_to_request
+from mavis.transfers import DownloadIntegrityError, ensure_local
 from mavis.checks import objects_are_preserved, is_object_animate, pose_edit_is_improvement
+from mavis.prechecks import background_edit_passes_prechecks, pose_edit_passes_prechecks
 from mavis.prompts import (
     render_generate_scene_specs_prompt,
     render_generate_scene_setup_code_prompt,
+    render_json_repair_prompt,
 )
-from mavis.utils import get_completed_renders
+from mavis.utils import get_render_masks, iter_renders_as_completed
 from mavis.responses import (
+    JsonBlockStreamParser,
+    extract_text_before_json_block,
     parse_generate_scene_specs_response,
     parse_generate_scene_params_response,
 )
 from mavis.globals import (
+    N_POVS,
     BASE_SCENE_PATH,
-    SCENE_SPECS_DIR_PATH,
-    TEMP_JSON_PATH,
-    CUR_RUN_UID_ENV_VAR,
-    FINAL_OUTPUTS_DIR_PATH,
+    IMG_RESOLUTION_X,
+    IMG_RESOLUTION_Y,
+    RENDER_EVENTS_FILENAME,
+    RunContext,
 )
 
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+T = TypeVar("T")
+
+
+@cache
+def _edit_aborting_errors() -> tuple[type[Exception], ...]:
+    """Return the edit errors that abort an edit rather than being retried.
+
+    Transient rate limit and server errors are already retried with backoff by
+    mavis.resilience. Built on first use, so that importing mavis doesn't import
+    the HTTP clients.
+    """
+    from fal_client.client import FalClientHTTPError
+    from requests.exceptions import RequestException
+
+    return (RequestException, FalClientHTTPError, ContentPolicyError, DownloadIntegrityError)
+
 
-# TODO: (a "someday" improvement)
-# Exponential backoff on rate limit errors
-# Immediate retry on output parsing errors
+class BackgroundMode(StrEnum):
+    """How backgrounds are added to renders.
+
+    - generative: a remote edit model paints the background (checked for preservation)
+    - composite: the render is composited onto a reusable background plate locally
+    - composite_harmonized: composite, then one cheap remote edit to blend lighting,
+      falling back to the plain composite if that edit fails the preservation check
+    """
+
+    generative = "generative"
+    composite = "composite"
+    composite_harmonized = "composite_harmonized"
 
 
 class MaxRetries:
@@ -53,17 +129,90 @@ def assess_generation_feasibility(action_scene: ActionScene) -> tuple[bool, str
     return True, None
 
 
-@retry(stop=stop_after_attempt(MaxRetries.GENERATE_SCENE_SPECS))
+def _generate_json_with_repair_turns(
+    vlm: VLM,
+    prompt: VLMPrompt,
+    parse_response: Callable[[str], T],
+    expected_opener: str,
+    max_attempts: int,
+) -> tuple[T, str]:
+    """Stream a ```json answer, repairing parse failures within the conversation.
+
+    When parsing fails, the rejected answer and the exact error are appended as
+    follow-up turns and the model is asked only for a corrected JSON block, which
+    costs a short completion instead of a full regeneration. Returns the parsed
+    result and the first (full) response.
+    """
+    first_response = None
+    for attempt in range(1, max_attempts + 1):
+        parser = JsonBlockStreamParser(expected_opener=expected_opener)
+        try:
+            # Stop streaming (and fail fast) as soon as the ```json block is complete
+            response = parser.consume(vlm.generate_stream(prompt))
+            if first_response is None:
+                first_response = response
+            return parse_response(response), first_response
+        except (ValueError, TypeError) as e:
+            if first_response is None:
+                first_response = parser.text
+            if attempt == max_attempts:
+                raise
+            warnings.warn(f"Unusable response (attempt {attempt}), requesting repair: {e}")
+            prompt = render_json_repair_prompt(prompt, parser.text, str(e))
+
+
+def _retry_unless(
+    max_attempts: int, *no_retry: type[Exception]
+) -> Callable[[Callable], Callable]:
+    """Retry a function up to ``max_attempts`` times on errors other than ``no_retry``.
+
+    The last error is re-raised once the attempts run out. tenacity is imported, and
+    the retrying function built, on the first call rather than with mavis.
+    """
+
+    def decorate(fn: Callable) -> Callable:
+        @cache
+        def retrying_fn() -> Callable:
+            from tenacity import retry, retry_if_not_exception_type, stop_after_attempt
+
+            return retry(
+                stop=stop_after_attempt(max_attempts),
+                retry=retry_if_not_exception_type(no_retry),
+                reraise=True,
+            )(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return retrying_fn()(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# Parse errors are repaired in-conversation (see _generate_json_with_repair_turns), so
+# only other failures start over; retrying can't help once the run is over budget
+@_retry_unless(MaxRetries.GENERATE_SCENE_SPECS, ValueError, TypeError, BudgetExceeded)
 def generate_scene_specs(
     vlm: VLM, action_scene: ActionScene
 ) -> tuple[str, ActionSceneSpecs]:
     prompts = render_generate_scene_specs_prompt(action_scene)
-    response = vlm.generate(prompts)
-    scene_characteristics, scene_specs = parse_generate_scene_specs_response(response)
+    (scene_characteristics, scene_specs), first_response = (
+        _generate_json_with_repair_turns(
+            vlm,
+            prompts,
+            parse_generate_scene_specs_response,
+            expected_opener="{",
+            max_attempts=MaxRetries.GENERATE_SCENE_SPECS,
+        )
+    )
+    # A repaired answer holds only the JSON block; keep the original reasoning
+    if not scene_characteristics:
+        scene_characteristics = extract_text_before_json_block(first_response)
     return scene_characteristics, scene_specs
 
 
-@retry(stop=stop_after_attempt(MaxRetries.GENERATE_SCENE_PARAMS))
+@_retry_unless(MaxRetries.GENERATE_SCENE_PARAMS, ValueError, TypeError, BudgetExceeded)
 def generate_scene_params(
     vlm: VLM,
     action_scene: ActionScene,
@@ -75,60 +224,777 @@ def generate_scene_params(
         scene_characteristics,
         action_scene_specs,
     )
-    response = vlm.generate(prompts)
-    return parse_generate_scene_params_response(response)
+    obj_placement_specs, _ = _generate_json_with_repair_turns(
+        vlm,
+        prompts,
+        parse_generate_scene_params_response,
+        expected_opener="[",
+        max_attempts=MaxRetries.GENERATE_SCENE_PARAMS,
+    )
+    return obj_placement_specs
 
 
-def invoke_and_await_scene_render_subprocess() -> None:
-    """Run Blender in background to render the scene from TEMP_JSON_PATH.
+@_retry_unless(MaxRetries.GENERATE_SCENE_SPECS, BudgetExceeded, ContentPolicyError)
+def generate_scene_specs_structured(
+    vlm: VLM, action_scene: ActionScene
+) -> tuple[str, ActionSceneSpecs]:
+    """Like generate_scene_specs, but schema-constrained instead of fence-parsed.
 
-    Requires Blender in PATH, or set BLENDER_EXE in the environment (e.g. on macOS:
-    BLENDER_EXE="/Applications/Blender.app/Contents/MacOS/Blender").
+    Invalid or refused answers are regenerated, up to MaxRetries.GENERATE_SCENE_SPECS
+    attempts.
+    """
+    prompts = render_generate_scene_specs_prompt(action_scene, structured_output=True)
+    response = vlm.generate_structured(prompts, response_format=SceneSpecsResponse)
+    return response.scene_characteristics, response.specs.to_action_scene_specs()
+
+
+@_retry_unless(MaxRetries.GENERATE_SCENE_PARAMS, BudgetExceeded, ContentPolicyError)
+def generate_scene_params_structured(
+    vlm: VLM,
+    action_scene: ActionScene,
+    scene_characteristics: str,
+    action_scene_specs: ActionSceneSpecs,
+) -> list:
+    """Like generate_scene_params, but schema-constrained instead of fence-parsed.
+
+    Invalid (e.g. naming an unknown object) or refused answers are regenerated, up
+    to MaxRetries.GENERATE_SCENE_PARAMS attempts.
+    """
+    prompts = render_generate_scene_setup_code_prompt(
+        action_scene,
+        scene_characteristics,
+        action_scene_specs,
+        structured_output=True,
+    )
+    response = vlm.generate_structured(prompts, response_format=ScenePlacementsResponse)
+    return [asdict(spec) for spec in response.placements]
+
+
+def start_scene_render_subprocess(
+    run_ctx: RunContext, first_pov: int = 0, n_povs: int = N_POVS
+) -> subprocess.Popen:
+    """Start Blender in background to render the scene from the run's placement specs.
+
+    Renders POVs ``first_pov`` to ``first_pov + n_povs - 1``. Requires Blender in
+    PATH, or set BLENDER_EXE in the environment (e.g. on macOS:
+    BLENDER_EXE="/Applications/Blender.app/Contents/MacOS/Blender"). Set
+    MAVIS_PROFILE_RENDERS=1 to have Blender profile the render and write its timings
+    to RunContext.render_profile_path.
     """
     blender_exe = os.environ.get("BLENDER_EXE", "blender")
+    profile_args = ["--profile"] if os.environ.get("MAVIS_PROFILE_RENDERS") else []
     project_root = Path(__file__).resolve().parent.parent.parent
-    subprocess.run(
+    return subprocess.Popen(
         [
             blender_exe,
             "--background",
             str(BASE_SCENE_PATH),
             "--python",
             "src/mavis/render_scene.py",
+            "--",
+            *run_ctx.to_argv(),
+            "--first-pov",
+            str(first_pov),
+            "--n-povs",
+            str(n_povs),
+            *profile_args,
         ],
         cwd=project_root,
-        check=True,
         stdout=sys.stdout,
         stderr=sys.stderr,
     )
 
 
-def run(
-    vlm: VLM, action_scene: ActionScene, n_camera_positions: int = 1
-) -> list[Image.Image]:
+def invoke_and_await_scene_render_subprocess(run_ctx: RunContext) -> None:
+    """Run Blender in background to render the scene and wait for it to finish."""
+    process = start_scene_render_subprocess(run_ctx)
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+
+def _check_outcome(passed_prechecks: bool, preserved: bool) -> str:
+    if not passed_prechecks:
+        return "precheck_rejected"
+    return "passed" if preserved else "rejected"
+
+
+def _add_background_with_retries(
+    vlm: VLM,
+    action_scene: ActionScene,
+    run_ctx: RunContext,
+    render_id: str,
+    render_path: os.PathLike,
+    masks: dict[str, os.PathLike],
+    hedge: HedgeConfig | None,
+    router: ModelRouter | None,
+    budget: RunBudget | None = None,
+) -> tuple[os.PathLike, str] | None:
+    """Add a background that passes the preservation check.
+
+    Returns the edited image's path and the model that made it, or None.
+    """
+
+    def select_model(try_number: int, in_flight: set[str]) -> str:
+        if router is not None:
+            return router.select(EditStage.background, try_number, in_flight)
+        return select_background_model(try_number, in_flight)
+
+    def edit(
+        try_number: int,
+        model: str,
+        attempt_tag: str | None,
+        cancelled: threading.Event | None = None,
+    ) -> tuple[os.PathLike, float]:
+        start = time.perf_counter()
+        try:
+            with span(
+                "edit.background",
+                "edit",
+                model=model,
+                try_number=try_number,
+                render_id=render_id,
+            ):
+                img_with_bg_path = add_background(
+                    render_id=render_id,
+                    run_ctx=run_ctx,
+                    render_path=render_path,
+                    action_scene=action_scene,
+                    try_number=try_number,
+                    model=model,
+                    attempt_tag=attempt_tag,
+                    budget=budget,
+                    cancelled=cancelled,
+                )
+        except _edit_aborting_errors():
+            if router is not None:
+                latency_s = time.perf_counter() - start
+                router.record_attempt(EditStage.background, model, latency_s, error=True)
+            raise
+        return img_with_bg_path, time.perf_counter() - start
+
+    def check(model: str, img_with_bg_path: os.PathLike, latency_s: float) -> bool:
+        with span("check.background", "check", model=model, render_id=render_id) as attrs:
+            ensure_local(img_with_bg_path)
+            # Cheap local pre-checks reject obviously broken edits without a VLM call
+            passed, reason = background_edit_passes_prechecks(
+                render_path, img_with_bg_path, masks["all"]
+            )
+            if not passed:
+                print(f"Background edit rejected by pre-check: {reason}.")
+            preserved = passed and objects_are_preserved(
+                img_with_bg_path, action_scene, vlm
+            )
+            attrs["outcome"] = _check_outcome(passed, preserved)
+        if router is not None:
+            router.record_attempt(EditStage.background, model, latency_s, preserved)
+        return preserved
+
+    if hedge is not None:
+
+        def attempt(try_number: int, model: str, cancelled: threading.Event):
+            try:
+                img_with_bg_path, latency_s = edit(
+                    try_number, model, f"try{try_number}", cancelled
+                )
+            except EditCancelled:
+                return None
+            if cancelled.is_set():
+                # Another attempt won; this edit was still charged, and its latency counts
+                if router is not None:
+                    router.record_attempt(
+                        EditStage.background, model, latency_s, checked=False
+                    )
+                return None
+            if check(model, img_with_bg_path, latency_s):
+                return img_with_bg_path, model
+            return None
+
+        return run_hedged_attempts(
+            attempt,
+            select_model,
+            MaxRetries.ADD_BACKGROUND,
+            hedge,
+            reraise=(BudgetExceeded,),
+        )
+
+    for try_number in range(1, MaxRetries.ADD_BACKGROUND + 1):
+        model = select_model(try_number, set())
+        try:
+            img_with_bg_path, latency_s = edit(try_number, model, None)
+            preserved = check(model, img_with_bg_path, latency_s)
+        # Sometimes images trigger false positive of content violation policies
+        except _edit_aborting_errors() as e:
+            warnings.warn(f"HTTP error: {e}")
+            return None
+
+        if preserved:
+            return img_with_bg_path, model
+    return None
+
+
+def _add_composited_background(
+    vlm: VLM,
+    action_scene: ActionScene,
+    run_ctx: RunContext,
+    render_id: str,
+    render_path: os.PathLike,
+    masks: dict[str, os.PathLike],
+    harmonize: bool,
+    budget: RunBudget | None = None,
+) -> tuple[os.PathLike, str] | None:
+    """Add a background by local compositing, optionally harmonized remotely.
+
+    The plain composite keeps the render's objects pixel-for-pixel, so it skips the
+    preservation check (and is kept if the run is over budget before harmonizing).
+    Returns the image's path and what made it.
+    """
+    try:
+        with span("edit.composite", "edit", render_id=render_id):
+            composite_path = add_composited_background(
+                render_id, run_ctx, render_path, masks, budget
+            )
+    # Generating a new plate failed (see edits.get_background_plate)
+    except _edit_aborting_errors() as e:
+        warnings.warn(f"HTTP error: {e}")
+        return None
+    if not harmonize:
+        return composite_path, "composite"
+    try:
+        with span(
+            "edit.harmonize", "edit", model=BG_HARMONIZATION_MODEL, render_id=render_id
+        ):
+            harmonized_path = harmonize_background(
+                render_id, run_ctx, composite_path, action_scene, budget
+            )
+        with span(
+            "check.harmonized",
+            "check",
+            model=BG_HARMONIZATION_MODEL,
+            render_id=render_id,
+        ) as attrs:
+            ensure_local(harmonized_path)
+            preserved = objects_are_preserved(harmonized_path, action_scene, vlm)
+            attrs["outcome"] = _check_outcome(True, preserved)
+        if preserved:
+            return harmonized_path, BG_HARMONIZATION_MODEL
+    except _edit_aborting_errors() as e:
+        warnings.warn(f"HTTP error: {e}")
+    except BudgetExceeded as e:
+        print(f"Run is over budget ({e}).")
+    print(f"Harmonization rejected for render {render_id} — keeping plain composite.")
+    return composite_path, "composite"
+
+
+def _modify_pose_with_retries(
+    vlm: VLM,
+    action_scene: ActionScene,
+    run_ctx: RunContext,
+    render_id: str,
+    start_img_path: os.PathLike,
+    object_name: str,
+    pose_specs: list[str],
+    masks: dict[str, os.PathLike],
+    hedge: HedgeConfig | None,
+    router: ModelRouter | None,
+    localized: bool = False,
+    budget: RunBudget | None = None,
+) -> tuple[os.PathLike, str] | None:
+    """Edit an object's pose until the result passes the preservation check.
+
+    Returns the edited image's path and the model that made it, or None.
+    """
+
+    def select_model(try_number: int, in_flight: set[str]) -> str:
+        if router is not None:
+            return router.select(EditStage.pose, try_number, in_flight)
+        return select_pose_model(try_number, in_flight)
+
+    def edit(
+        try_number: int,
+        model: str,
+        attempt_tag: str | None,
+        cancelled: threading.Event | None = None,
+    ) -> tuple[os.PathLike, float]:
+        start = time.perf_counter()
+        try:
+            with span(
+                "edit.pose",
+                "edit",
+                model=model,
+                try_number=try_number,
+                render_id=render_id,
+                object_name=object_name,
+            ):
+                modified_pose_img_path = modify_pose(
+                    render_id=render_id,
+                    run_ctx=run_ctx,
+                    start_img_path=start_img_path,
+                    object_name=object_name,
+                    pose_specs=pose_specs,
+                    masks=masks,
+                    try_number=try_number,
+                    model=model,
+                    attempt_tag=attempt_tag,
+                    localized=localized,
+                    budget=budget,
+                    cancelled=cancelled,
+                )
+        except _edit_aborting_errors():
+            if router is not None:
+                latency_s = time.perf_counter() - start
+                router.record_attempt(EditStage.pose, model, latency_s, error=True)
+            raise
+        return modified_pose_img_path, time.perf_counter() - start
+
+    def check(model: str, modified_pose_img_path: os.PathLike, latency_s: float) -> bool:
+        with span(
+            "check.pose",
+            "check",
+            model=model,
+            render_id=render_id,
+            object_name=object_name,
+        ) as attrs:
+            ensure_local(modified_pose_img_path)
+            ensure_local(start_img_path)
+            # Cheap local pre-checks reject obviously broken edits without a VLM call
+            passed, reason = pose_edit_passes_prechecks(
+                start_img_path, modified_pose_img_path, masks[object_name]
+            )
+            if not passed:
+                print(f"Pose edit of {object_name} rejected by pre-check: {reason}.")
+            preserved = passed and objects_are_preserved(
+                modified_pose_img_path, action_scene, vlm
+            )
+            attrs["outcome"] = _check_outcome(passed, preserved)
+        if router is not None:
+            router.record_attempt(EditStage.pose, model, latency_s, preserved)
+        return preserved
+
+    if hedge is not None:
+
+        def attempt(try_number: int, model: str, cancelled: threading.Event):
+            try:
+                modified_pose_img_path, latency_s = edit(
+                    try_number, model, f"try{try_number}", cancelled
+                )
+            except EditCancelled:
+                return None
+            if cancelled.is_set():
+                # Another attempt won; this edit was still charged, and its latency counts
+                if router is not None:
+                    router.record_attempt(EditStage.pose, model, latency_s, checked=False)
+                return None
+            if check(model, modified_pose_img_path, latency_s):
+                return modified_pose_img_path, model
+            return None
+
+        return run_hedged_attempts(
+            attempt,
+            select_model,
+            MaxRetries.MODIFY_STATE,
+            hedge,
+            reraise=(BudgetExceeded,),
+        )
 
+    for try_number in range(1, MaxRetries.MODIFY_STATE + 1):
+        model = select_model(try_number, set())
+        try:
+            modified_pose_img_path, latency_s = edit(try_number, model, None)
+            preserved = check(model, modified_pose_img_path, latency_s)
+        # Sometimes images trigger false positive of content violation policies
+        except _edit_aborting_errors() as e:
+            warnings.warn(f"HTTP error: {e}")
+            return None
+
+        if preserved:
+            return modified_pose_img_path, model
+    return None
+
+
+def _edit_object_pose(
+    vlm: VLM,
+    action_scene: ActionScene,
+    action_scene_specs: ActionSceneSpecs,
+    objects_are_animate: dict[str, bool],
+    run_ctx: RunContext,
+    render_id: str,
+    start_img_path: os.PathLike,
+    object_name: str,
+    masks: dict[str, os.PathLike],
+    hedge: HedgeConfig | None,
+    router: ModelRouter | None,
+    localized: bool,
+    budget: RunBudget | None = None,
+) -> os.PathLike | None:
+    """Edit one object's pose and decide whether to keep the edit.
+
+    Returns the image to continue from (the pre-edit image if the edit was deemed
+    worse than the original), or None if the edit chain should be aborted.
+    """
+    # Combine state and orientation specs to get "pose" specs
+    pose_specs = (
+        action_scene_specs.state[object_name]
+        + action_scene_specs.orientation[object_name]
+    )
+    pose_result = _modify_pose_with_retries(
+        vlm,
+        action_scene,
+        run_ctx,
+        render_id,
+        start_img_path,
+        object_name,
+        pose_specs,
+        masks,
+        hedge,
+        router,
+        localized,
+        budget,
+    )
+    if pose_result is None:
+        warnings.warn(
+            f"Failed to modify pose for object {object_name} after "
+            f"{MaxRetries.MODIFY_STATE} retries. Skipping this render."
+        )
+        return None
+
+    modified_pose_img_path, model = pose_result
+    edit_is_accepted = objects_are_animate[object_name]
+    if not edit_is_accepted:
+        with span(
+            "check.pose_improvement",
+            "check",
+            model=model,
+            render_id=render_id,
+            object_name=object_name,
+        ) as attrs:
+            edit_is_accepted = pose_edit_is_improvement(
+                pre_edit_path=start_img_path,
+                post_edit_path=modified_pose_img_path,
+                object_name=object_name,
+                pose_specs=pose_specs,
+                vlm=vlm,
+            )
+            attrs["outcome"] = "passed" if edit_is_accepted else "rejected"
+    if router is not None and not objects_are_animate[object_name]:
+        router.record_improvement_check(EditStage.pose, model, edit_is_accepted)
+    if not edit_is_accepted:
+        print(
+            f"Pose edit for inanimate object '{object_name}' "
+            f"deemed worse than original — keeping pre-edit image."
+        )
+        return start_img_path
+    return modified_pose_img_path
+
+
+def edit_render(
+    vlm: VLM,
+    action_scene: ActionScene,
+    action_scene_specs: ActionSceneSpecs,
+    objects_are_animate: dict[str, bool],
+    run_ctx: RunContext,
+    render_id: str,
+    render_path: os.PathLike,
+    masks: dict[str, os.PathLike],
+    hedge: HedgeConfig | None = None,
+    router: ModelRouter | None = None,
+    background_mode: BackgroundMode = BackgroundMode.generative,
+    local_pose_edits: bool = False,
+    manifest: StageManifest | None = None,
+    cancelled: threading.Event | None = None,
+    budget: RunBudget | None = None,
+) -> os.PathLike | None:
+    """Run one render's edit chain: background, then each object's pose.
+
+    Copies the final image to the run's final outputs dir and returns its path, or
+    returns None if the chain was aborted. Independent of other renders' chains,
+    so it is safe to run concurrently with them. With ``hedge``, each edit runs
+    several attempts on different models at once and takes the first that passes
+    the preservation check. With ``router``, models are chosen adaptively and each
+    attempt's outcome is recorded. ``background_mode`` selects how the background is
+    added (see BackgroundMode). With ``local_pose_edits``, pose edits only see a
+    crop around their object, and objects whose crops don't intersect are edited
+    in parallel. Stages already recorded in ``manifest`` (with the same inputs) are
+    skipped, and completed stages are recorded to it. If ``cancelled`` is set, or
+    ``budget`` (charged for the chain's edits and checks) is exceeded, the chain
+    stops (returning None) before its next paid call.
+    """
+    manifest = manifest or StageManifest()
+    cancelled = cancelled or threading.Event()
+    vlm = with_budget(vlm, budget)
+
+    def should_stop() -> bool:
+        if cancelled.is_set():
+            print(f"CANCELLED: edits stopped for render {render_id}.")
+            return True
+        if budget is not None and (reason := budget.exceeded()) is not None:
+            print(f"OVER BUDGET ({reason}): edits stopped for render {render_id}.")
+            return True
+        return False
+
+    if should_stop():
+        return None
+
+    # 5.1. Add background
+    cur_key = stage_key(
+        Stage.background,
+        render=file_digest(render_path),
+        render_id=render_id,
+        background_mode=background_mode,
+    )
+    if (cached := manifest.get(cur_key)) is not None:
+        cur_img_path = Path(cached["path"])
+    else:
+        try:
+            generative = background_mode == BackgroundMode.generative
+            if not generative:
+                try:
+                    bg_result = _add_composited_background(
+                        vlm,
+                        action_scene,
+                        run_ctx,
+                        render_id,
+                        render_path,
+                        masks,
+                        harmonize=background_mode == BackgroundMode.composite_harmonized,
+                        budget=budget,
+                    )
+                except PlateUnavailableError as e:
+                    warnings.warn(f"{e}: adding a generative background instead.")
+                    generative = True
+            if generative:
+                bg_result = _add_background_with_retries(
+                    vlm,
+                    action_scene,
+                    run_ctx,
+                    render_id,
+                    render_path,
+                    masks,
+                    hedge,
+                    router,
+                    budget,
+                )
+        except BudgetExceeded as e:
+            print(f"OVER BUDGET ({e}): edits stopped for render {render_id}.")
+            return None
+        if bg_result is None:
+            warnings.warn(
+                f"Failed to add background for render {render_id} after "
+                f"{MaxRetries.ADD_BACKGROUND} retries. Skipping this render."
+            )
+            print(f"FAILED: edits aborted for render {render_id}.")
+            return None
+        cur_img_path, model = bg_result
+        ensure_local(cur_img_path)
+        manifest.record(
+            Stage.background,
+            cur_key,
+            {"path": str(cur_img_path), "model": model},
+            files=[cur_img_path],
+        )
+
+    # 5.2. Modify poses
+    object_names = list(action_scene_specs.state)
+    if local_pose_edits:
+        object_groups = group_disjoint_regions(
+            {name: local_edit_region(masks[name]) for name in object_names}
+        )
+    else:
+        object_groups = [[name] for name in object_names]
+
+    def edit_object_pose(
+        start_img_path: os.PathLike, object_name: str, key: str
+    ) -> os.PathLike | None:
+        if (cached := manifest.get(key)) is not None:
+            return Path(cached["path"])
+        try:
+            result = _edit_object_pose(
+                vlm,
+                action_scene,
+                action_scene_specs,
+                objects_are_animate,
+                run_ctx,
+                render_id,
+                start_img_path,
+                object_name,
+                masks,
+                hedge,
+                router,
+                local_pose_edits,
+                budget,
+            )
+        except BudgetExceeded as e:
+            print(f"OVER BUDGET ({e}): pose edit of {object_name} stopped.")
+            return None
+        if result is not None:
+            ensure_local(result)
+            manifest.record(Stage.pose, key, {"path": str(result)}, files=[result])
+        return result
+
+    for object_group in object_groups:
+        if should_stop():
+            return None
+        # Each pose edit depends on the image it starts from and its own specs only
+        keys = [
+            stage_key(
+                Stage.pose,
+                start=cur_key,
+                object_name=name,
+                pose_specs=action_scene_specs.state[name]
+                + action_scene_specs.orientation[name],
+                is_animate=objects_are_animate[name],
+                localized=local_pose_edits,
+            )
+            for name in object_group
+        ]
+        if len(object_group) == 1:
+            results = [edit_object_pose(cur_img_path, object_group[0], keys[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(object_group)) as executor:
+                futures = [
+                    submit_in_context(
+                        executor, edit_object_pose, cur_img_path, name, key
+                    )
+                    for name, key in zip(object_group, keys)
+                ]
+                results = [future.result() for future in futures]
+        if any(result is None for result in results):
+            print(f"FAILED: edits aborted for render {render_id}.")
+            return None
+        edited = [
+            (result, masks[name])
+            for name, result in zip(object_group, results)
+            if result != cur_img_path
+        ]
+        if len(edited) == 1:
+            cur_img_path = edited[0][0]
+        elif len(edited) > 1:
+            # Localized edits of disjoint regions combine into one image
+            merged_path = (
+                run_ctx.edits_dir / render_id / f"{'_'.join(object_group)}_merged.png"
+            )
+            merge_local_edits(cur_img_path, edited, merged_path)
+            cur_img_path = merged_path
+        cur_key = keys[0] if len(keys) == 1 else stage_key(Stage.pose, merged=keys)
+
+    print(f"SUCCESS: edits made to render {render_id}.")
+
+    # If edits were successful, copy the final image to the final output dir
+    final_output_dir = run_ctx.final_outputs_dir
+    final_output_dir.mkdir(parents=True, exist_ok=True)
+    final_path = final_output_dir / f"{render_id}.png"
+    ensure_local(cur_img_path)
+    shutil.copy(cur_img_path, final_path)
+    manifest.record(
+        Stage.final,
+        stage_key(Stage.final, image=cur_key),
+        {"path": str(final_path)},
+        files=[final_path],
+    )
+    return final_path
+
+
+@dataclass
+class ScenePlan:
+    """Everything generated for an action scene before it is rendered."""
+
+    run_ctx: RunContext
+    action_scene: ActionScene
+    action_scene_specs: ActionSceneSpecs
+    obj_placement_specs: list[dict]
+    objects_are_animate: dict[str, bool]
+    manifest: StageManifest
+    budget: RunBudget | None = None
+
+
+def _vlm_id(vlm: VLM) -> str:
+    return getattr(vlm, "model", type(vlm).__name__)
+
+
+def plan_scene(
+    vlm: VLM,
+    action_scene: ActionScene,
+    structured_generation: bool = True,
+    run_ctx: RunContext | None = None,
+    budget: RunBudget | None = None,
+) -> ScenePlan:
+    """Generate an action scene's specs and object placements (steps 1-3).
+
+    Creates a new RunContext (in OUTPUT_DIR_PATH) unless ``run_ctx`` is given. When
+    resuming an existing run, stages recorded in its stage manifest are skipped, and
+    its saved scene specs (which may have been edited by hand) are used as is.
+    VLM calls are charged to ``budget``, which the plan keeps for later stages.
+    """
+    vlm = with_budget(vlm, budget)
     # 1. Assess generation feasibility
     generation_is_feasible, reason = assess_generation_feasibility(action_scene)
     if not generation_is_feasible:
         raise ValueError(f"Generation is not feasible: {reason}")
 
-    # Create short UID for the run and set the env variable
-    run_uid = f"{datetime.now().strftime('%y%m%d%H%M%S')}_{action_scene.shorthand_str}"
-    os.environ[CUR_RUN_UID_ENV_VAR] = run_uid
-    print(f"Beginning pipeline run with UID={run_uid} and action scene:")
+    # Create a collision-free UID (and output dirs) for the run
+    if run_ctx is None:
+        run_ctx = RunContext.create(action_scene.shorthand_str)
+    manifest = StageManifest(run_ctx.stage_manifest_path)
+    print(f"Beginning pipeline run with UID={run_ctx.run_uid} and action scene:")
     print(action_scene.as_readable_string())
 
     # 2. Generate scene specs
-    scene_characteristics, action_scene_specs = generate_scene_specs(vlm, action_scene)
+    specs_key = stage_key(
+        Stage.specs,
+        action_scene=action_scene.model_dump(),
+        structured_generation=structured_generation,
+        vlm=_vlm_id(vlm),
+    )
+    cached = manifest.get(specs_key)
+    if cached is not None and run_ctx.scene_specs_path.exists():
+        scene_characteristics = cached["scene_characteristics"]
+        with open(run_ctx.scene_specs_path) as f:
+            action_scene_specs = ActionSceneSpecs.model_validate(json.load(f))
+        print(f"Resuming with saved scene specs from {run_ctx.scene_specs_path}")
+    else:
+        with span("generate_scene_specs", "plan", structured=structured_generation):
+            if structured_generation:
+                scene_characteristics, action_scene_specs = (
+                    generate_scene_specs_structured(vlm, action_scene)
+                )
+            else:
+                scene_characteristics, action_scene_specs = generate_scene_specs(
+                    vlm, action_scene
+                )
 
-    # Save scene specs as JSON to SCENE_PARAMS_DIR_PATH
-    SCENE_SPECS_DIR_PATH.mkdir(parents=True, exist_ok=True)
-    with open(SCENE_SPECS_DIR_PATH / f"{run_uid}.json", "w") as f:
-        json.dump(action_scene_specs.model_dump(), f, indent=3)
+        # Save scene specs as JSON to the run's scene specs path
+        run_ctx.scene_specs_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(run_ctx.scene_specs_path, "w") as f:
+            json.dump(action_scene_specs.model_dump(), f, indent=3)
+        manifest.record(
+            Stage.specs, specs_key, {"scene_characteristics": scene_characteristics}
+        )
 
     # 3. Generate scene params
-    obj_placement_specs = generate_scene_params(
-        vlm, action_scene, scene_characteristics, action_scene_specs
+    # Object states (poses) are realized by edits, not placements, so changing them
+    # doesn't re-key placement, rendering or anything before the pose edits
+    params_key = stage_key(
+        Stage.params,
+        action_scene=action_scene.model_dump(),
+        scene_characteristics=scene_characteristics,
+        specs=action_scene_specs.model_dump(exclude={"state"}),
+        structured_generation=structured_generation,
+        vlm=_vlm_id(vlm),
     )
+    if (cached := manifest.get(params_key)) is not None:
+        obj_placement_specs = cached["obj_placement_specs"]
+    else:
+        with span("generate_scene_params", "plan", structured=structured_generation):
+            if structured_generation:
+                obj_placement_specs = generate_scene_params_structured(
+                    vlm, action_scene, scene_characteristics, action_scene_specs
+                )
+            else:
+                obj_placement_specs = generate_scene_params(
+                    vlm, action_scene, scene_characteristics, action_scene_specs
+                )
+        manifest.record(
+            Stage.params, params_key, {"obj_placement_specs": obj_placement_specs}
+        )
 
     # # TODO: Remove this convenient hardcoded artifact used for quicker testing
     # obj_placement_specs = [
@@ -158,101 +1024,300 @@ def run(
     #     },
     # ]
 
-    with open(TEMP_JSON_PATH, "w") as f:
-        json.dump(obj_placement_specs, f)
+    # Resolve object animacy up front so concurrent edit chains don't race on it
+    objects_are_animate = {}
+    for object_name in action_scene_specs.state:
+        animacy_key = stage_key(Stage.animacy, object_name=object_name, vlm=_vlm_id(vlm))
+        if (cached := manifest.get(animacy_key)) is not None:
+            objects_are_animate[object_name] = cached["is_animate"]
+        else:
+            with span("check.animacy", "plan", object_name=object_name):
+                objects_are_animate[object_name] = is_object_animate(object_name, vlm)
+            manifest.record(
+                Stage.animacy,
+                animacy_key,
+                {"is_animate": objects_are_animate[object_name]},
+            )
+    return ScenePlan(
+        run_ctx=run_ctx,
+        action_scene=action_scene,
+        action_scene_specs=action_scene_specs,
+        obj_placement_specs=obj_placement_specs,
+        objects_are_animate=objects_are_animate,
+        manifest=manifest,
+        budget=budget,
+    )
+
 
-    # 4. Invoke Blender to render the scene (reads TEMP_JSON_PATH, saves renders))
-    invoke_and_await_scene_render_subprocess()
+def start_scene_render(
+    plan: ScenePlan, first_pov: int = 0, n_povs: int = N_POVS
+) -> subprocess.Popen:
+    """Start Blender rendering a planned scene (step 4).
 
-    # 5. Make edits to rendered images
-    edits_were_successful = {}
-    for render_id, render_path, masks in get_completed_renders(run_uid):
-        # 5.1. Add background
-        bg_added_successfully = False
-        for try_number in range(1, MaxRetries.ADD_BACKGROUND + 1):
+    The placement specs are written to the run's own placement specs file, so any
+    number of renders can run at once.
+    """
+    placement_specs_path = plan.run_ctx.placement_specs_path
+    placement_specs_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(placement_specs_path, "w") as f:
+        json.dump(plan.obj_placement_specs, f)
+    # Events from an earlier render of this run (e.g. before a resume) are stale, and
+    # spans from one were already loaded
+    (plan.run_ctx.renders_dir / RENDER_EVENTS_FILENAME).unlink(missing_ok=True)
+    plan.run_ctx.render_spans_path.unlink(missing_ok=True)
+    return start_scene_render_subprocess(plan.run_ctx, first_pov, n_povs)
+
+
+def iter_scene_renders(
+    plan: ScenePlan, first_pov: int = 0, n_povs: int = N_POVS
+) -> Iterator[tuple[str, os.PathLike, dict[str, os.PathLike]]]:
+    """Yield a planned scene's renders (step 4) as they complete.
+
+    Renders recorded in the plan's manifest for the same placement specs and POVs
+    are yielded without invoking Blender. Closing the iterator early stops Blender.
+    Blender's running time is charged to the plan's budget, and its spans (see
+    render_scene.py) are added to the current tracer.
+    """
+    render_key = stage_key(
+        Stage.render,
+        obj_placement_specs=plan.obj_placement_specs,
+        first_pov=first_pov,
+        n_povs=n_povs,
+        resolution=[IMG_RESOLUTION_X, IMG_RESOLUTION_Y],
+    )
+    if (cached := plan.manifest.get(render_key)) is not None:
+        for render_id in cached["render_ids"]:
+            render_path = plan.run_ctx.renders_dir / f"{render_id}.png"
+            yield render_id, render_path, get_render_masks(plan.run_ctx, render_id)
+        return
+
+    render_start = time.perf_counter()
+    render_process = start_scene_render(plan, first_pov, n_povs)
+    render_ids, files = [], []
+    try:
+        with span("blender", "render", first_pov=first_pov, n_povs=n_povs) as attrs:
+            for render_id, render_path, masks in iter_renders_as_completed(
+                plan.run_ctx, render_process
+            ):
+                render_ids.append(render_id)
+                files += [render_path, *masks.values()]
+                yield render_id, render_path, masks
+            attrs["n_renders"] = len(render_ids)
+    finally:
+        if render_process.poll() is None:
+            render_process.terminate()
+            render_process.wait()
+        if plan.budget is not None:
+            plan.budget.charge_render_seconds(time.perf_counter() - render_start)
+        if (tracer := current_tracer()) is not None:
+            tracer.load_spans(plan.run_ctx.render_spans_path)
+    # Only a render that completed without errors is reused
+    plan.manifest.record(Stage.render, render_key, {"render_ids": render_ids}, files)
+
+
+def _edit_until_target_successes(
+    plan: ScenePlan,
+    target_successes: int,
+    max_concurrent_renders: int,
+    **edit_kwargs,
+) -> dict[str, os.PathLike | None]:
+    """Render POVs and edit them until ``target_successes`` final images exist.
+
+    Starts with as many POVs as the prior success rate says are needed, and renders
+    more whenever the chains still in flight are unlikely to make up the shortfall
+    (see yields.n_povs_to_request). Once the target is reached, Blender is stopped,
+    pending chains are cancelled and in-flight chains stop at their next stage. Once
+    the plan's budget is exceeded, no more POVs are rendered. Returns each started
+    render's final path (None if it failed or was cancelled).
+    """
+    cancelled = threading.Event()
+    final_paths: dict[str, os.PathLike | None] = {}
+    in_flight: dict[Future, str] = {}
+    n_povs_so_far = 0
+
+    def n_succeeded() -> int:
+        return sum(path is not None for path in final_paths.values())
+
+    def collect(done: set[Future]) -> None:
+        for future in done:
+            render_id = in_flight.pop(future)
+            final_paths[render_id] = None
+            if future.cancelled():
+                continue
             try:
-                img_with_bg_path = add_background(
-                    render_id=render_id,
-                    run_uid=run_uid,
-                    render_path=render_path,
-                    action_scene=action_scene,
-                    try_number=try_number,
+                final_paths[render_id] = future.result()
+            except Exception as e:
+                warnings.warn(f"Edit chain for render {render_id} failed: {e!r}")
+        if n_succeeded() >= target_successes:
+            cancelled.set()
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrent_renders)
+    try:
+        while not cancelled.is_set():
+            over_budget = plan.budget.exceeded() if plan.budget is not None else None
+            n_povs = 0
+            if over_budget is None:
+                n_povs = n_povs_to_request(
+                    target_successes,
+                    n_succeeded(),
+                    len(final_paths),
+                    len(in_flight),
+                    n_povs_so_far,
+                )
+            if n_povs == 0 and not in_flight:
+                warnings.warn(
+                    f"Stopping after {n_povs_so_far} POVs with {n_succeeded()} of "
+                    f"{target_successes} target successes"
+                    + (f" (over budget: {over_budget})." if over_budget else ".")
                 )
-            # Sometimes images trigger false positive of content violation policies
-            except (HTTPError, FalClientHTTPError) as e:
-                warnings.warn(f"HTTP error: {e}")
                 break
+            if n_povs > 0:
+                print(f"Rendering {n_povs} more POVs toward {target_successes} successes...")
+                renders = iter_scene_renders(plan, n_povs_so_far, n_povs)
+                n_povs_so_far += n_povs
+                try:
+                    for render_id, render_path, masks in renders:
+                        future = submit_in_context(
+                            executor,
+                            edit_render,
+                            run_ctx=plan.run_ctx,
+                            render_id=render_id,
+                            render_path=render_path,
+                            masks=masks,
+                            cancelled=cancelled,
+                            **edit_kwargs,
+                        )
+                        in_flight[future] = render_id
+                        collect({f for f in list(in_flight) if f.done()})
+                        if cancelled.is_set():
+                            break
+                finally:
+                    renders.close()
+            # Wait for chains to finish until more POVs are needed (or none are left)
+            while in_flight and not cancelled.is_set():
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+                if n_povs_to_request(
+                    target_successes,
+                    n_succeeded(),
+                    len(final_paths),
+                    len(in_flight),
+                    n_povs_so_far,
+                ):
+                    break
+    finally:
+        # In-flight chains stop at their next stage; wait for them so no edits (or
+        # their costs) land after this returns
+        cancelled.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+    collect(set(in_flight))
+    return final_paths
 
-            if objects_are_preserved(img_with_bg_path, action_scene, vlm):
-                bg_added_successfully = True
-                break
 
-        if not bg_added_successfully:
-            warnings.warn(
-                f"Failed to add background for render {render_id} after "
-                f"{MaxRetries.ADD_BACKGROUND} retries. Skipping this render."
+def _render_and_edit(
+    plan: ScenePlan,
+    target_successes: int | None,
+    max_concurrent_renders: int,
+    **edit_kwargs,
+) -> dict[str, bool]:
+    """Render a planned scene and run each render's edit chain (steps 4-5).
+
+    See run for ``target_successes``. Returns whether each render's edits succeeded.
+    """
+    if target_successes is not None:
+        # Render and edit POVs only until the target number of successes
+        final_paths = _edit_until_target_successes(
+            plan, target_successes, max_concurrent_renders, **edit_kwargs
+        )
+        return {render_id: path is not None for render_id, path in final_paths.items()}
+
+    # 4. Invoke Blender to render the scene (reads the run's placement specs)
+    # Blender publishes each POV as soon as it is written; it keeps rendering the
+    # remaining POVs while the ones already published are edited (step 5)
+    renders = iter_scene_renders(plan)
+
+    # 5. Make edits to rendered images (one independent edit chain per render)
+    edits_were_successful = {}
+    with ThreadPoolExecutor(max_workers=max_concurrent_renders) as executor:
+        futures = {}
+        for render_id, render_path, masks in renders:
+            future = submit_in_context(
+                executor,
+                edit_render,
+                run_ctx=plan.run_ctx,
+                render_id=render_id,
+                render_path=render_path,
+                masks=masks,
+                **edit_kwargs,
             )
-            edits_were_successful[render_id] = False
-            print(f"FAILED: edits aborted for render {render_id}.")
-            continue
-
-        # 5.2. Modify poses
-        cur_img_path = img_with_bg_path
-        for object_name, pose_specs in action_scene_specs.state.items():
-            pose_was_successfully_modified = False
-            # Combine state and orientation specs to get "pose" specs
-            pose_specs = pose_specs + action_scene_specs.orientation[object_name]
-            obj_is_animate = is_object_animate(object_name, vlm)
-            for try_number in range(1, MaxRetries.MODIFY_STATE + 1):
-                try:
-                    modified_pose_img_path = modify_pose(
-                        render_id=render_id,
-                        run_uid=run_uid,
-                        start_img_path=cur_img_path,
-                        object_name=object_name,
-                        pose_specs=pose_specs,
-                        masks=masks,
-                        try_number=try_number,
-                    )
-                    if objects_are_preserved(modified_pose_img_path, action_scene, vlm):
-                        pose_was_successfully_modified = True
-                        if not obj_is_animate and not pose_edit_is_improvement(
-                            pre_edit_path=cur_img_path,
-                            post_edit_path=modified_pose_img_path,
-                            object_name=object_name,
-                            pose_specs=pose_specs,
-                            vlm=vlm,
-                        ):
-                            print(
-                                f"Pose edit for inanimate object '{object_name}' "
-                                f"deemed worse than original — keeping pre-edit image."
-                            )
-                        else:
-                            cur_img_path = modified_pose_img_path
-                        break
-                # Sometimes images trigger false positive of content violation policies
-                except (HTTPError, FalClientHTTPError) as e:
-                    warnings.warn(f"HTTP error: {e}")
-                    break
-            if not pose_was_successfully_modified:
+            futures[future] = render_id
+            if plan.budget is not None and (reason := plan.budget.exceeded()) is not None:
+                print(f"Run is over budget ({reason}) — stopping Blender.")
+                renders.close()
                 break
+        for future in as_completed(futures):
+            edits_were_successful[futures[future]] = future.result() is not None
+    return edits_were_successful
 
-        if not pose_was_successfully_modified:
-            warnings.warn(
-                f"Failed to modify pose for object {object_name} after "
-                f"{MaxRetries.MODIFY_STATE} retries. Skipping this render."
-            )
-            edits_were_successful[render_id] = False
-            print(f"FAILED: edits aborted for render {render_id}.")
-            continue
 
-        edits_were_successful[render_id] = True
-        print(f"SUCCESS: edits made to render {render_id}.")
+def run(
+    vlm: VLM,
+    action_scene: ActionScene,
+    n_camera_positions: int = 1,
+    structured_generation: bool = True,
+    max_concurrent_renders: int = N_POVS,
+    hedge: HedgeConfig | None = None,
+    router: ModelRouter | None = None,
+    background_mode: BackgroundMode = BackgroundMode.generative,
+    local_pose_edits: bool = False,
+    resume_run_uid: str | None = None,
+    target_successes: int | None = None,
+    budget: RunBudget | None = None,
+) -> list["Image.Image"]:
+    """Run the pipeline for one action scene.
+
+    With ``resume_run_uid``, resumes that (e.g. crashed) run: stages already
+    completed with the same inputs are skipped, so only what failed, or what
+    depends on hand-edited scene specs, is executed again. With
+    ``target_successes=K``, POVs are rendered and edited only until K final images
+    exist (rendering more than N_POVS if needed) instead of editing N_POVS renders.
+    Usage is recorded per stage in ``budget`` (a new, unlimited one by default);
+    once its time or cost limit is exceeded, rendering stops and edit chains stop
+    before their next paid call. The run's spans are written to its trace path as
+    Chrome trace JSON, and their latency breakdown is printed.
+    """
+    budget = budget or RunBudget()
+    tracer = Tracer()
+
+    with use_tracer(tracer):
+        # 1-3. Generate scene specs and params
+        run_ctx = RunContext(run_uid=resume_run_uid) if resume_run_uid is not None else None
+        plan = plan_scene(vlm, action_scene, structured_generation, run_ctx, budget)
 
-        # If edits were successful, copy the final image to the final output dir
-        final_output_dir = FINAL_OUTPUTS_DIR_PATH / run_uid
-        final_output_dir.mkdir(parents=True, exist_ok=True)
-        if edits_were_successful[render_id]:
-            shutil.copy(cur_img_path, final_output_dir / f"{render_id}.png")
+        # 4-5. Render the scene and edit its renders
+        edits_were_successful = _render_and_edit(
+            plan,
+            target_successes,
+            max_concurrent_renders,
+            vlm=vlm,
+            action_scene=action_scene,
+            action_scene_specs=plan.action_scene_specs,
+            objects_are_animate=plan.objects_are_animate,
+            hedge=hedge,
+            router=router,
+            background_mode=background_mode,
+            local_pose_edits=local_pose_edits,
+            manifest=plan.manifest,
+            budget=budget,
+        )
 
     print(f"Edits were successful: {edits_were_successful}")
+
+    # Token usage (incl. prompt-cache hits) per prompt template, if the VLM tracks it
+    usage_summary = getattr(vlm, "usage_summary", None)
+    if usage_summary is not None:
+        print(f"VLM usage by template: {json.dumps(usage_summary(), indent=2)}")
+    print(f"Run cost by stage: {json.dumps(budget.summary(), indent=2)}")
+    tracer.export_chrome_trace(plan.run_ctx.trace_path)
+    print(f"Latency breakdown:\n{format_latency_breakdown(tracer.latency_breakdown())}")
+    print(f"Trace written to {plan.run_ctx.trace_path}")
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Images are compared at this size (longer side), after a slight blur, so that
+# re-encoding noise and edit models' resolution changes don't count as changes
+PRECHECK_SIDE = 128
+PRECHECK_BLUR = 1.0
+# Object masks are grown by this fraction of the image size before comparing
+# "outside the mask", so that small pose changes near the object are allowed
+MASK_GROWTH = 0.04
+
+# Mean absolute change (0-1) above which an edit is rejected
+MAX_CHANGE_OUTSIDE_OBJECT = 0.08  # Pose edits: pixels away from the edited object
+MAX_GLOBAL_CHANGE = 0.2  # Pose edits: whole image
+MAX_CHANGE_INSIDE_OBJECTS = 0.25  # Background edits: the render's objects
+
+# Tiles (of a TILE_GRID x TILE_GRID grid) whose std is below BLANK_TILE_STD are blank
+TILE_GRID = 8
+BLANK_TILE_STD = 0.01
+# Background edits: max fraction of background tiles left blank and unchanged
+MAX_UNFILLED_FRACTION = 0.25
+# Pose edits: max fraction of tiles that were not blank before but are after
+MAX_NEWLY_BLANK_FRACTION = 0.1
+# Non-blank tiles closer than this (mean absolute difference) are duplicates
+DUPLICATE_TILE_DIFF = 0.01
+MAX_DUPLICATE_TILE_INCREASE = 4
+
+
+def _load(path: os.PathLike, size: tuple[int, int]) -> np.ndarray:
+    with Image.open(path) as image:
+        image = image.convert("RGB").resize(size, Image.Resampling.BILINEAR)
+    image = image.filter(ImageFilter.GaussianBlur(radius=PRECHECK_BLUR))
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+def _load_pair(
+    pre_path: os.PathLike, post_path: os.PathLike
+) -> tuple[np.ndarray, np.ndarray]:
+    """Load both images at the pre-edit image's aspect ratio, scaled down."""
+    with Image.open(pre_path) as pre:
+        w, h = pre.size
+    scale = PRECHECK_SIDE / max(w, h)
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return _load(pre_path, size), _load(post_path, size)
+
+
+def _load_mask(mask_path: os.PathLike, size: tuple[int, int], grow: int) -> np.ndarray:
+    with Image.open(mask_path) as mask:
+        mask = mask.convert("L").resize(size, Image.Resampling.NEAREST)
+    if grow:
+        mask = mask.filter(ImageFilter.MaxFilter(2 * grow + 1))
+    return np.asarray(mask) > 127
+
+
+def _tiles(image: np.ndarray) -> list[np.ndarray]:
+    h, w = image.shape[:2]
+    ys = np.linspace(0, h, TILE_GRID + 1, dtype=int)
+    xs = np.linspace(0, w, TILE_GRID + 1, dtype=int)
+    return [
+        image[ys[i] : ys[i + 1], xs[j] : xs[j + 1]]
+        for i in range(TILE_GRID)
+        for j in range(TILE_GRID)
+    ]
+
+
+def _is_blank(tile: np.ndarray) -> bool:
+    return tile.std() < BLANK_TILE_STD
+
+
+def _unfilled_fraction(
+    pre: np.ndarray, post: np.ndarray, objects: np.ndarray
+) -> float:
+    """Fraction of background tiles that are still blank and unchanged after an edit."""
+    tile_pairs = [
+        (pre_tile, post_tile)
+        for pre_tile, post_tile, object_tile in zip(_tiles(pre), _tiles(post), _tiles(objects))
+        if not object_tile.any()
+    ]
+    if not tile_pairs:
+        return 0.0
+    n_unfilled = sum(
+        _is_blank(post_tile) and _mean_change(pre_tile, post_tile) < BLANK_TILE_STD
+        for pre_tile, post_tile in tile_pairs
+    )
+    return n_unfilled / len(tile_pairs)
+
+
+def _newly_blank_fraction(pre: np.ndarray, post: np.ndarray) -> float:
+    pre_tiles, post_tiles = _tiles(pre), _tiles(post)
+    n_newly_blank = sum(
+        not _is_blank(pre_tile) and _is_blank(post_tile)
+        for pre_tile, post_tile in zip(pre_tiles, post_tiles)
+    )
+    return n_newly_blank / len(pre_tiles)
+
+
+def _n_duplicate_tiles(image: np.ndarray) -> int:
+    """Count pairs of near-identical non-blank tiles (e.g. a repeated object)."""
+    tiles = [tile for tile in _tiles(image) if not _is_blank(tile)]
+    n_duplicates = 0
+    for i, tile in enumerate(tiles):
+        for other in tiles[i + 1 :]:
+            if tile.shape == other.shape and np.abs(tile - other).mean() < DUPLICATE_TILE_DIFF:
+                n_duplicates += 1
+    return n_duplicates
+
+
+def _mean_change(pre: np.ndarray, post: np.ndarray, where: np.ndarray | None = None) -> float:
+    change = np.abs(pre - post).mean(axis=-1)
+    if where is not None:
+        if not where.any():
+            return 0.0
+        change = change[where]
+    return float(change.mean())
+
+
+def background_edit_passes_prechecks(
+    render_path: os.PathLike,
+    edited_path: os.PathLike,
+    objects_mask_path: os.PathLike,
+) -> tuple[bool, str | None]:
+    """Cheaply reject background edits that obviously broke the render.
+
+    Checks that the render's objects (its ``all`` mask) are largely unchanged and
+    that the background was actually filled in. Returns whether the edit passed
+    and, if not, why.
+    """
+    pre, post = _load_pair(render_path, edited_path)
+    objects = _load_mask(objects_mask_path, pre.shape[1::-1], grow=0)
+    if (change := _mean_change(pre, post, objects)) > MAX_CHANGE_INSIDE_OBJECTS:
+        return False, f"objects changed too much ({change:.2f})"
+    if (unfilled := _unfilled_fraction(pre, post, objects)) > MAX_UNFILLED_FRACTION:
+        return False, f"{unfilled:.0%} of the background was left blank"
+    return True, None
+
+
+def pose_edit_passes_prechecks(
+    pre_edit_path: os.PathLike,
+    post_edit_path: os.PathLike,
+    object_mask_path: os.PathLike,
+) -> tuple[bool, str | None]:
+    """Cheaply reject pose edits that obviously broke the image.
+
+    Checks that the image barely changed away from the edited object (its grown
+    mask), that it didn't change wholesale, and that no blank or duplicated regions
+    appeared. Returns whether the edit passed and, if not, why.
+    """
+    pre, post = _load_pair(pre_edit_path, post_edit_path)
+    grow = round(MASK_GROWTH * max(pre.shape[:2]))
+    outside_object = ~_load_mask(object_mask_path, pre.shape[1::-1], grow)
+    if (change := _mean_change(pre, post)) > MAX_GLOBAL_CHANGE:
+        return False, f"image changed globally ({change:.2f})"
+    if (newly_blank := _newly_blank_fraction(pre, post)) > MAX_NEWLY_BLANK_FRACTION:
+        return False, f"edit blanked {newly_blank:.0%} of the image"
+    n_new_duplicates = _n_duplicate_tiles(post) - _n_duplicate_tiles(pre)
+    if n_new_duplicates > MAX_DUPLICATE_TILE_INCREASE:
+        return False, f"edit introduced {n_new_duplicates} duplicated regions"
+    if (change := _mean_change(pre, post, outside_object)) > MAX_CHANGE_OUTSIDE_OBJECT:
+        return False, f"image changed away from the edited object ({change:.2f})"
+    return True, None
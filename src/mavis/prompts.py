@@ -1,51 +1,85 @@
-from jinja2 import Environment, FileSystemLoader, Template
+from functools import cache
+from typing import TYPE_CHECKING
 
 from mavis.globals import PROMPTS_DIR_PATH
-from mavis.schema import ActionScene, VLMPrompt, ActionSceneSpecs
+from mavis.schema import ActionScene, VLMMessage, VLMPrompt, ActionSceneSpecs
 
-_env = Environment(loader=FileSystemLoader(PROMPTS_DIR_PATH))
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+
+
+@cache
+def _get_env() -> "Environment":
+    # Imported here so that importing mavis doesn't import jinja2. Compiled templates
+    # are cached on disk (in the system temp dir) across processes, keyed by their
+    # source, and templates are not reloaded once loaded.
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    return Environment(
+        loader=FileSystemLoader(PROMPTS_DIR_PATH),
+        bytecode_cache=FileSystemBytecodeCache(),
+        auto_reload=False,
+    )
+
+
+class _LazyTemplate:
+    """A Templates attribute that loads (and compiles) its template on first access."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def __get__(self, instance, owner) -> "Template":
+        return _get_env().get_template(self.filename)
 
 
 class Templates:
     # Generate scene specs prompts
-    GENERATE_SCENE_SPECS_SYSTEM: Template = _env.get_template(
-        "generate_scene_specs_system.txt"
-    )
-    GENERATE_SCENE_SPECS_USER: Template = _env.get_template(
-        "generate_scene_specs_user.txt"
-    )
+    GENERATE_SCENE_SPECS_SYSTEM = _LazyTemplate("generate_scene_specs_system.txt")
+    GENERATE_SCENE_SPECS_USER = _LazyTemplate("generate_scene_specs_user.txt")
     # Generate scene setup code prompts
-    GENERATE_SCENE_PARAMS_SYSTEM: Template = _env.get_template(
-        "generate_scene_params_system.txt"
-    )
-    GENERATE_SCENE_PARAMS_USER: Template = _env.get_template(
-        "generate_scene_params_user.txt"
-    )
+    GENERATE_SCENE_PARAMS_SYSTEM = _LazyTemplate("generate_scene_params_system.txt")
+    GENERATE_SCENE_PARAMS_USER = _LazyTemplate("generate_scene_params_user.txt")
+    # Repair turn prompt (follow-up asking for a corrected JSON block)
+    REPAIR_JSON_BLOCK = _LazyTemplate("repair_json_block.txt")
     # Modify pose prompt
-    MODIFY_POSE: Template = _env.get_template("modify_pose.txt")
+    MODIFY_POSE = _LazyTemplate("modify_pose.txt")
     # Add background prompt
-    ADD_BACKGROUND: Template = _env.get_template("add_background.txt")
-    # Check object preserved prompt
-    CHECK_OBJECT_PRESERVED: Template = _env.get_template("check_object_preserved.txt")
-    # Check pose edit is improvement prompt
-    CHECK_POSE_EDIT_IS_IMPROVEMENT: Template = _env.get_template(
-        "check_pose_edit_is_improvement.txt"
+    ADD_BACKGROUND = _LazyTemplate("add_background.txt")
+    # Background plate (text-to-image) and composite harmonization prompts
+    BACKGROUND_PLATE = _LazyTemplate("background_plate.txt")
+    HARMONIZE_BACKGROUND = _LazyTemplate("harmonize_background.txt")
+    # Check object preserved prompts
+    CHECK_OBJECT_PRESERVED_SYSTEM = _LazyTemplate("check_object_preserved_system.txt")
+    CHECK_OBJECT_PRESERVED = _LazyTemplate("check_object_preserved.txt")
+    # Check pose edit is improvement prompts
+    CHECK_POSE_EDIT_IS_IMPROVEMENT_SYSTEM = _LazyTemplate(
+        "check_pose_edit_is_improvement_system.txt"
     )
+    CHECK_POSE_EDIT_IS_IMPROVEMENT = _LazyTemplate("check_pose_edit_is_improvement.txt")
 
 
-def render_generate_scene_specs_prompt(action_scene: ActionScene) -> VLMPrompt:
-    system_prompt = Templates.GENERATE_SCENE_SPECS_SYSTEM.render()
+def render_generate_scene_specs_prompt(
+    action_scene: ActionScene, structured_output: bool = False
+) -> VLMPrompt:
+    system_prompt = Templates.GENERATE_SCENE_SPECS_SYSTEM.render(
+        structured_output=structured_output
+    )
     readable_action = action_scene.as_readable_string()
     user_prompt = Templates.GENERATE_SCENE_SPECS_USER.render(action=readable_action)
-    return VLMPrompt(system=system_prompt, user=user_prompt)
+    return VLMPrompt(
+        template_name="generate_scene_specs", system=system_prompt, user=user_prompt
+    )
 
 
 def render_generate_scene_setup_code_prompt(
     action_scene: ActionScene,
     scene_characteristics: str,
     scene_specs: ActionSceneSpecs,
+    structured_output: bool = False,
 ) -> VLMPrompt:
-    system_prompt = Templates.GENERATE_SCENE_PARAMS_SYSTEM.render()
+    system_prompt = Templates.GENERATE_SCENE_PARAMS_SYSTEM.render(
+        structured_output=structured_output
+    )
     readable_action = action_scene.as_readable_string()
     readable_scene_specs = scene_specs.as_readable_string()
     user_prompt = Templates.GENERATE_SCENE_PARAMS_USER.render(
@@ -54,7 +88,25 @@ def render_generate_scene_setup_code_prompt(
         scene_characteristics=scene_characteristics,
         scene_specs=readable_scene_specs,
     )
-    return VLMPrompt(system=system_prompt, user=user_prompt)
+    return VLMPrompt(
+        template_name="generate_scene_params", system=system_prompt, user=user_prompt
+    )
+
+
+def render_json_repair_prompt(
+    prompt: VLMPrompt, previous_response: str, error: str
+) -> VLMPrompt:
+    """Extend a prompt's conversation with its rejected answer and a repair request."""
+    repair_request = Templates.REPAIR_JSON_BLOCK.render(error=error)
+    return prompt.model_copy(
+        update={
+            "follow_ups": [
+                *prompt.follow_ups,
+                VLMMessage(role="assistant", content=previous_response),
+                VLMMessage(role="user", content=repair_request),
+            ]
+        }
+    )
 
 
 def _join_list_grammatically(items: list[str]) -> str:
@@ -76,16 +128,30 @@ def render_add_background_prompt(background_type: str, action_scene: ActionScene
     )
 
 
+def render_background_plate_prompt(background_type: str) -> str:
+    return Templates.BACKGROUND_PLATE.render(background_type=background_type)
+
+
+def render_harmonize_background_prompt(action_scene: ActionScene) -> str:
+    objects_str = _join_list_grammatically(action_scene.object_strs)
+    return Templates.HARMONIZE_BACKGROUND.render(objects_str=objects_str)
+
+
 def render_check_object_preserved_prompt(
     object_name: str, action_scene: ActionScene
-) -> str:
+) -> VLMPrompt:
     all_objects_str = _join_list_grammatically(
         [f"a {name}" for name in action_scene.object_strs]
     )
-    return Templates.CHECK_OBJECT_PRESERVED.render(
+    user_prompt = Templates.CHECK_OBJECT_PRESERVED.render(
         all_objects_str=all_objects_str,
         object=object_name,
     )
+    return VLMPrompt(
+        template_name="check_object_preserved",
+        system=Templates.CHECK_OBJECT_PRESERVED_SYSTEM.render(),
+        user=user_prompt,
+    )
 
 
 def render_modify_pose_prompt(object_name: str, pose_specs: list[str]) -> str:
@@ -97,8 +163,13 @@ def render_modify_pose_prompt(object_name: str, pose_specs: list[str]) -> str:
 
 def render_check_pose_edit_is_improvement_prompt(
     object_name: str, pose_specs: list[str]
-) -> str:
-    return Templates.CHECK_POSE_EDIT_IS_IMPROVEMENT.render(
+) -> VLMPrompt:
+    user_prompt = Templates.CHECK_POSE_EDIT_IS_IMPROVEMENT.render(
         object=object_name,
         pose_specs=pose_specs,
     )
+    return VLMPrompt(
+        template_name="check_pose_edit_is_improvement",
+        system=Templates.CHECK_POSE_EDIT_IS_IMPROVEMENT_SYSTEM.render(),
+        user=user_prompt,
+    )
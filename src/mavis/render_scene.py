@@ -1,10 +1,18 @@
+import argparse
+import cProfile
+import io
 import json
 import math
 import os
+import pstats
 import sys
 import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path as _Path
+from typing import Iterator
 
 import numpy as np
 import bpy
@@ -19,17 +27,54 @@ from mavis.globals import (
     BLENDER_OBJECTS,
     ObjectPlacementSpec,
     BASE_SCENE_PATH,
-    TEMP_JSON_PATH,
     IMG_RESOLUTION_X,
     IMG_RESOLUTION_Y,
-    OUTPUT_RENDERS_DIR_PATH,
-    OUTPUT_MASKS_DIR_PATH,
-    CUR_RUN_UID_ENV_VAR,
+    RENDER_EVENTS_FILENAME,
+    RunContext,
 )
+from mavis.tracing import Tracer, span, use_tracer
 
 MAX_CAMERA_ANGLE_SAMPLES = 50
 MAX_RENDER_ATTEMPTS = 5
 BLENDER_CAMERA_FOV_ANGLE_RADS = math.radians(60)
+# Functions listed (by cumulative time) in --profile output
+N_PROFILE_TOP_FUNCTIONS = 40
+
+
+class RenderTimers:
+    """Wall-clock timings and event counts of render_scene's steps."""
+
+    def __init__(self):
+        self.durations_s: dict[str, list[float]] = defaultdict(list)
+        self.counts: dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, duration_s: float) -> None:
+        self.durations_s[name].append(duration_s)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counts[name] += n
+
+    def summary(self) -> dict:
+        return {
+            "timers": {
+                name: {
+                    "count": len(durations),
+                    "total_s": sum(durations),
+                    "mean_s": sum(durations) / len(durations),
+                    "max_s": max(durations),
+                }
+                for name, durations in self.durations_s.items()
+            },
+            "counts": dict(self.counts),
+        }
 
 
 @dataclass
@@ -231,9 +276,9 @@ def save_masks(
     masks: list[np.ndarray],
     placed_objects: list[bpy.types.Object],
     pov_index: int,
-    run_uid: str,
+    run_ctx: RunContext,
 ) -> None:
-    """Save individual per-object masks and a combined mask to OUTPUT_MASKS_DIR_PATH.
+    """Save individual per-object masks and a combined mask to the run's masks dir.
 
     Files are named ``{pov_index:04d}_{object_name}.png`` for individual masks
     and ``{pov_index:04d}_all_objects.png`` for the combined (union) mask.
@@ -256,7 +301,7 @@ def save_masks(
         bpy.data.images.remove(img)
 
     # Save individual object masks
-    output_masks_dir = OUTPUT_MASKS_DIR_PATH / run_uid / f"{pov_index:04d}"
+    output_masks_dir = run_ctx.masks_dir / f"{pov_index:04d}"
     output_masks_dir.mkdir(parents=True, exist_ok=True)
 
     for mask, obj in zip(masks, placed_objects):
@@ -269,7 +314,27 @@ def save_masks(
     _write_mask(combined, path)
 
 
-def render_scene(object_placement_specs: list[ObjectPlacementSpec], run_uid: str) -> None:
+def publish_render_event(output_render_dir: _Path, render_id: str) -> None:
+    """Append a "POV ready" event for ``render_id`` to the run's events file.
+
+    The line is written and flushed in one go so that readers polling the file
+    never see a partial event.
+    """
+    event = {"render_id": render_id}
+    with open(output_render_dir / RENDER_EVENTS_FILENAME, "a") as f:
+        f.write(json.dumps(event) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def render_scene(
+    object_placement_specs: list[ObjectPlacementSpec],
+    run_ctx: RunContext,
+    first_pov: int = 0,
+    n_povs: int = N_POVS,
+    timers: RenderTimers | None = None,
+) -> None:
+    timers = timers or RenderTimers()
     bpy.ops.wm.open_mainfile(filepath=str(BASE_SCENE_PATH))
 
     # Explicit render engine and lighting setup
@@ -290,7 +355,11 @@ def render_scene(object_placement_specs: list[ObjectPlacementSpec], run_uid: str
     bg_node.inputs["Strength"].default_value = 1.0
 
     # Place objects in the scene according to the placement specifications
-    placed_objects = place_objects(object_placement_specs)
+    with (
+        span("blender.place_objects", "render", n_objects=len(object_placement_specs)),
+        timers.time("place_objects"),
+    ):
+        placed_objects = place_objects(object_placement_specs)
     # Make sure all objects are visible and will be included in renders
     scene_collection = bpy.context.scene.collection
     for obj in placed_objects:
@@ -308,69 +377,131 @@ def render_scene(object_placement_specs: list[ObjectPlacementSpec], run_uid: str
     aspect_ratio = IMG_RESOLUTION_X / IMG_RESOLUTION_Y
     render_args.resolution_percentage = 100
     camera.rotation_mode = "XYZ"
-    # Render for each POV
-    for i in range(N_POVS):
+    # Render for each POV (indices continue across renders of the same run)
+    for i in range(first_pov, first_pov + n_povs):
         # Try to find a camera angle with no visual overlap between objects
         masks: list[np.ndarray] = []
         found_useable_angle = False
-        for _attempt in range(MAX_CAMERA_ANGLE_SAMPLES):
-            # Sample a camera angle to look down at the objects from
-            tilt_min, tilt_max = 0.131, 1.412
-            tilt_mean = math.radians(34)
-            tilt_std = math.radians(12)
-            tilt = np.clip(np.random.normal(tilt_mean, tilt_std), tilt_min, tilt_max)
-            pan = np.random.uniform(-math.pi, math.pi)
-            min_distance = compute_min_camera_distance_to_capture_bbox(
-                bbox=bbox_all_objects,
-                camera_pitch=tilt,
-                camera_tilt=pan,
-                camera_fov_angle_rads=BLENDER_CAMERA_FOV_ANGLE_RADS,
-                camera_aspect_ratio=aspect_ratio,
-            )
-            # Add a little bit of distance to the minimum distance
-            distance = np.random.uniform(0.015, 0.05) * min_distance + min_distance
-            # Camera points at bbox center; place it at center - distance * look_dir (Z-up)
-            look_dir = convert_pitch_and_tilt_to_unit_vector(tilt, pan)
-            camera.location = bbox_all_objects.center - distance * look_dir
-            # Derive rotation from look_dir so camera actually faces the bbox center
-            # Camera local -Z should align with look_dir, with world Z as up reference
-            camera.rotation_euler = look_dir.to_track_quat("-Z", "Y").to_euler("XYZ")
-            # Render per-object masks and check for visual overlap
-            masks = render_object_masks(placed_objects)
-            pov_has_object_overlap = bool(np.any(np.sum(masks, axis=0) > 1))
-            if pov_has_object_overlap:
-                continue
-            found_useable_angle = True
-            break
-
-        if not found_useable_angle:
-            raise ValueError(
-                "Failed to sample a camera angle in which objects did not overlap "
-                f"after {MAX_CAMERA_ANGLE_SAMPLES} attempts."
-            )
+        with span("blender.sample_camera", "render", pov=i) as sample_attrs:
+            for attempt in range(MAX_CAMERA_ANGLE_SAMPLES):
+                sample_start = time.perf_counter()
+                timers.count("camera_samples")
+                # Sample a camera angle to look down at the objects from
+                tilt_min, tilt_max = 0.131, 1.412
+                tilt_mean = math.radians(34)
+                tilt_std = math.radians(12)
+                tilt = np.clip(np.random.normal(tilt_mean, tilt_std), tilt_min, tilt_max)
+                pan = np.random.uniform(-math.pi, math.pi)
+                min_distance = compute_min_camera_distance_to_capture_bbox(
+                    bbox=bbox_all_objects,
+                    camera_pitch=tilt,
+                    camera_tilt=pan,
+                    camera_fov_angle_rads=BLENDER_CAMERA_FOV_ANGLE_RADS,
+                    camera_aspect_ratio=aspect_ratio,
+                )
+                # Add a little bit of distance to the minimum distance
+                distance = np.random.uniform(0.015, 0.05) * min_distance + min_distance
+                # Camera points at bbox center; place it at center - distance * look_dir (Z-up)
+                look_dir = convert_pitch_and_tilt_to_unit_vector(tilt, pan)
+                camera.location = bbox_all_objects.center - distance * look_dir
+                # Derive rotation from look_dir so camera actually faces the bbox center
+                # Camera local -Z should align with look_dir, with world Z as up reference
+                camera.rotation_euler = look_dir.to_track_quat("-Z", "Y").to_euler("XYZ")
+                # Render per-object masks and check for visual overlap
+                with timers.time("render_object_masks"):
+                    masks = render_object_masks(placed_objects)
+                sample_attrs["n_samples"] = attempt + 1
+                pov_has_object_overlap = bool(np.any(np.sum(masks, axis=0) > 1))
+                timers.add("camera_sample", time.perf_counter() - sample_start)
+                if pov_has_object_overlap:
+                    timers.count("camera_samples_rejected_for_overlap")
+                    continue
+                found_useable_angle = True
+                break
+
+            if not found_useable_angle:
+                timers.count("povs_without_useable_camera")
+                raise ValueError(
+                    "Failed to sample a camera angle in which objects did not overlap "
+                    f"after {MAX_CAMERA_ANGLE_SAMPLES} attempts."
+                )
 
         # Save per-object and combined masks
-        save_masks(masks, placed_objects, i, run_uid)
+        with span("blender.save_masks", "render", pov=i), timers.time("save_masks"):
+            save_masks(masks, placed_objects, i, run_ctx)
 
         # Render the scene: output path per POV, bounded retry
-        output_render_dir = OUTPUT_RENDERS_DIR_PATH / run_uid
+        output_render_dir = run_ctx.renders_dir
         output_render_dir.mkdir(parents=True, exist_ok=True)
         output_image = output_render_dir / f"{i:04d}.png"
         render_args.filepath = str(output_image)
-        for attempt in range(MAX_RENDER_ATTEMPTS):
-            try:
-                bpy.ops.render.render(write_still=True)
-                break
-            except Exception as e:
-                print(f"Render attempt {attempt + 1}/{MAX_RENDER_ATTEMPTS} failed: {e}")
-        else:
+        with span("blender.cycles_render", "render", pov=i) as render_attrs:
+            for attempt in range(MAX_RENDER_ATTEMPTS):
+                render_attrs["attempts"] = attempt + 1
+                try:
+                    with timers.time("cycles_render"):
+                        bpy.ops.render.render(write_still=True)
+                    break
+                except Exception as e:
+                    timers.count("cycles_render_failures")
+                    print(f"Render attempt {attempt + 1}/{MAX_RENDER_ATTEMPTS} failed: {e}")
+            else:
+                render_attrs["outcome"] = "failed"
+        if render_attrs.get("outcome") == "failed":
             print(f"Gave up after {MAX_RENDER_ATTEMPTS} render attempts for POV {i}.")
+            continue
+
+        # Let the parent process start editing this POV while the rest render
+        publish_render_event(output_render_dir, f"{i:04d}")
+
+
+def write_render_profile(
+    profile_path: _Path, timers: RenderTimers, profiler: cProfile.Profile
+) -> None:
+    """Write the timers, counts and top cProfile entries to ``profile_path`` (JSON).
+
+    The raw cProfile stats go next to it (``.prof``), e.g. for snakeviz.
+    """
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(profile_path.with_suffix(".prof"))
+    stats_text = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stats_text)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(N_PROFILE_TOP_FUNCTIONS)
+    with open(profile_path, "w") as f:
+        json.dump({**timers.summary(), "cprofile": stats_text.getvalue()}, f, indent=2)
 
 
 if __name__ == "__main__":
-    with open(TEMP_JSON_PATH, "r") as f:
+    # Blender passes the arguments after "--" through to the script
+    script_argv = sys.argv[sys.argv.index("--") + 1 :]
+    run_ctx = RunContext.from_argv(script_argv)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--first-pov", type=int, default=0)
+    parser.add_argument("--n-povs", type=int, default=N_POVS)
+    parser.add_argument(
+        "--profile", action="store_true", help="Write a profile to the renders dir"
+    )
+    pov_args, _ = parser.parse_known_args(script_argv)
+    with open(run_ctx.placement_specs_path, "r") as f:
         obj_placement_specs = json.load(f)
-    os.remove(TEMP_JSON_PATH)
     object_placement_specs = [ObjectPlacementSpec(**spec) for spec in obj_placement_specs]
-    run_uid = os.environ[CUR_RUN_UID_ENV_VAR]
-    render_scene(object_placement_specs, run_uid)
+    timers = RenderTimers()
+    profiler = cProfile.Profile() if pov_args.profile else None
+    # Spans are appended to the run's render spans file, for the parent to load
+    with use_tracer(Tracer(run_ctx.render_spans_path)):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            render_scene(
+                object_placement_specs,
+                run_ctx,
+                pov_args.first_pov,
+                pov_args.n_povs,
+                timers,
+            )
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profile_path = run_ctx.render_profile_path(pov_args.first_pov)
+                write_render_profile(profile_path, timers, profiler)
+                print(f"Render profile written to {profile_path}")
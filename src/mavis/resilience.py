@@ -0,0 +1,241 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Mapping, TypeVar
+
+from mavis.concurrency import Provider
+
+T = TypeVar("T")
+
+# Default (requests per second, burst size) token-bucket limits per provider and
+# model; override per model with set_rate_limit
+DEFAULT_RATE_LIMITS: dict[Provider, tuple[float, int]] = {
+    Provider.openai: (5.0, 10),
+    Provider.fal: (2.0, 4),
+}
+
+MAX_ATTEMPTS = 6
+BASE_BACKOFF_S = 1.0
+MAX_BACKOFF_S = 60.0
+
+# Error codes (OpenAI's error.code, fal's detail[].type) of content-policy rejections
+_CONTENT_POLICY_CODES = {
+    "content_policy_violation",
+    "content_filter",
+    "moderation_blocked",
+}
+# Fallback for errors without a code: substrings of content-policy error messages
+_CONTENT_POLICY_MARKERS = ("content_policy", "content policy", "nsfw", "moderation")
+# Names of (library) exception classes, anywhere in an error's MRO, that mark
+# connection-level failures worth retrying
+_TRANSIENT_ERROR_NAMES = {
+    "APIConnectionError",  # openai (incl. timeouts)
+    "TransportError",  # httpx (used by fal_client)
+    "ConnectionError",  # requests
+    "Timeout",  # requests
+    "ChunkedEncodingError",  # requests
+}
+
+
+class TransientError(Exception):
+    """Base for errors raised by mavis itself that are worth retrying."""
+
+
+class ContentPolicyError(RuntimeError):
+    """A request was rejected by the provider's content policy; retrying won't help."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens/second, holding at most ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, blocking until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+_rate_limits: dict[tuple[Provider, str], tuple[float, int]] = {}
+_buckets: dict[tuple[Provider, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def set_rate_limit(provider: Provider, model: str, rate: float, burst: int) -> None:
+    """Override the request rate limit for one provider model."""
+    with _buckets_lock:
+        _rate_limits[(provider, model)] = (rate, burst)
+        _buckets.pop((provider, model), None)
+
+
+def get_rate_limit_override(provider: Provider, model: str) -> tuple[float, int] | None:
+    """Return the (rate, burst) set for one provider model with set_rate_limit, if any."""
+    with _buckets_lock:
+        return _rate_limits.get((provider, model))
+
+
+def clear_rate_limit(provider: Provider, model: str) -> None:
+    """Return one provider model to its provider's default rate limit."""
+    with _buckets_lock:
+        _rate_limits.pop((provider, model), None)
+        _buckets.pop((provider, model), None)
+
+
+def _get_bucket(provider: Provider, model: str) -> TokenBucket:
+    key = (provider, model)
+    with _buckets_lock:
+        if key not in _buckets:
+            rate, burst = _rate_limits.get(key, DEFAULT_RATE_LIMITS[provider])
+            _buckets[key] = TokenBucket(rate, burst)
+        return _buckets[key]
+
+
+def _status_code(e: Exception) -> int | None:
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return status
+
+
+def _headers(e: Exception) -> Mapping[str, str]:
+    headers = getattr(e, "response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(e, "response", None), "headers", None)
+    return headers or {}
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """Return the server-requested delay in seconds from Retry-After headers, if any."""
+    lower = {k.lower(): v for k, v in headers.items()}
+    if "retry-after-ms" in lower:
+        try:
+            return float(lower["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = lower.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _error_codes(e: Exception) -> set[str]:
+    """Return the error codes in an error's attributes or JSON body, if any."""
+    codes = set()
+    if isinstance(code := getattr(e, "code", None), str):
+        codes.add(code)
+    body = getattr(e, "body", None)
+    if body is None and (response := getattr(e, "response", None)) is not None:
+        try:
+            body = response.json()
+        except Exception:
+            body = None
+    if isinstance(body, dict):
+        # OpenAI: {"error": {"code": ...}} or the error itself
+        # fal: {"detail": [{"type": ...}]}
+        items = [body.get("error", body)]
+        if isinstance(body.get("detail"), list):
+            items += body["detail"]
+        for item in items:
+            if isinstance(item, dict):
+                codes.update(
+                    value for value in (item.get("code"), item.get("type"))
+                    if isinstance(value, str)
+                )
+    return codes
+
+
+def is_content_policy_error(e: Exception) -> bool:
+    """Whether a request was rejected by the provider's content policy.
+
+    Decided by the error's status and error code where present; the message is
+    only searched for content-policy markers when the error has no code.
+    """
+    status = _status_code(e)
+    if status is not None and not (400 <= status < 500 and status != 429):
+        return False
+    codes = _error_codes(e)
+    if codes:
+        return not codes.isdisjoint(_CONTENT_POLICY_CODES)
+    message = str(e).lower()
+    return any(marker in message for marker in _CONTENT_POLICY_MARKERS)
+
+
+def is_transient_error(e: Exception) -> bool:
+    """Whether a failed request is worth retrying (rate limits, 5xx, connection errors)."""
+    if isinstance(e, TransientError):
+        return True
+    status = _status_code(e)
+    if status is not None:
+        return status == 429 or status >= 500
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(e).__mro__)
+
+
+def is_gone_error(e: Exception) -> bool:
+    """Whether a request failed because a resource it refers to no longer exists."""
+    return _status_code(e) in (404, 410)
+
+
+def call_with_backoff(
+    provider: Provider,
+    model: str,
+    fn: Callable[[], T],
+    max_attempts: int = MAX_ATTEMPTS,
+    rate_limited: bool = True,
+) -> T:
+    """Call ``fn`` under the provider model's rate limit, retrying transient failures.
+
+    Rate limits (429) and server errors (5xx) are retried after the Retry-After
+    delay if the provider sent one, else after a jittered exponential backoff.
+    Content-policy rejections raise ContentPolicyError immediately; other errors
+    (and transient ones once ``max_attempts`` is reached) are re-raised as is.
+    Without ``rate_limited``, only the retries apply (e.g. for requests that are
+    not served by the provider's API).
+    """
+    bucket = _get_bucket(provider, model) if rate_limited else None
+    for attempt in range(1, max_attempts + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if is_content_policy_error(e):
+                raise ContentPolicyError(f"{provider}/{model}: {e}") from e
+            if not is_transient_error(e) or attempt == max_attempts:
+                raise
+            delay_s = parse_retry_after(_headers(e))
+            if delay_s is None:
+                # "Full jitter" exponential backoff avoids synchronized retries
+                delay_s = random.uniform(
+                    0, min(MAX_BACKOFF_S, BASE_BACKOFF_S * 2 ** (attempt - 1))
+                )
+            print(
+                f"Transient error from {provider}/{model} (attempt {attempt}/"
+                f"{max_attempts}), retrying in {delay_s:.1f}s: {e}"
+            )
+            time.sleep(delay_s)
+    raise AssertionError("unreachable")
@@ -1,4 +1,5 @@
 import json
+from typing import Iterable
 
 from mavis.globals import BLENDER_OBJECTS, ObjectPlacementSpec
 from mavis.schema import ActionSceneSpecs
@@ -44,3 +45,73 @@ def parse_generate_scene_params_response(response: str) -> list:
             )
 
     return data
+
+
+class JsonBlockStreamParser:
+    """Incrementally scans streamed text for the first ```json code block.
+
+    Feed chunks as they arrive; ``feed`` returns True once the block's closing
+    fence has been seen, at which point ``text`` holds the response up to and
+    including that fence. Raises ValueError as soon as the block's content
+    visibly cannot be the expected JSON value (e.g. a list where an object was
+    expected), so callers can abandon the stream early.
+    """
+
+    def __init__(self, expected_opener: str | None = None) -> None:
+        self.expected_opener = expected_opener
+        self.text = ""
+        self.is_complete = False
+        self._content_start: int | None = None
+        self._opener_checked = False
+
+    def feed(self, chunk: str) -> bool:
+        if self.is_complete:
+            return True
+        self.text += chunk
+        if self._content_start is None:
+            json_start_marker = self.text.find("```json")
+            if json_start_marker == -1:
+                return False
+            self._content_start = json_start_marker + len("```json")
+        if not self._opener_checked:
+            content = self.text[self._content_start :].lstrip()
+            if not content:
+                return False
+            if self.expected_opener is not None and content[0] != self.expected_opener:
+                raise ValueError(
+                    f"Expected ```json block to start with {self.expected_opener!r}, "
+                    f"got {content[0]!r}"
+                )
+            self._opener_checked = True
+        json_end = self.text.find("```", self._content_start)
+        if json_end == -1:
+            return False
+        self.text = self.text[: json_end + len("```")]
+        self.is_complete = True
+        return True
+
+    def consume(self, chunks: Iterable[str]) -> str:
+        """Feed chunks until the block closes, then stop the stream.
+
+        Returns the response text up to and including the closing fence. The
+        chunk iterator is closed (if it supports it) as soon as the block is
+        complete or fails validation, which cancels the remaining generation.
+        On failure, ``text`` still holds everything received so far.
+        """
+        try:
+            for chunk in chunks:
+                if self.feed(chunk):
+                    break
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        return self.text
+
+
+def extract_text_before_json_block(response: str) -> str:
+    """Return the (stripped) free text preceding the first ```json block."""
+    json_start_marker = response.find("```json")
+    if json_start_marker == -1:
+        return response.strip()
+    return response[:json_start_marker].strip()
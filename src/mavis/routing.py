@@ -0,0 +1,201 @@
+import atexit
+import json
+import os
+import random
+import threading
+import uuid
+import weakref
+from dataclasses import asdict, dataclass
+from enum import StrEnum
+from pathlib import Path
+
+from mavis.globals import OUTPUT_DIR_PATH
+
+ROUTING_STATS_PATH = OUTPUT_DIR_PATH / "model_routing_stats.json"
+
+# Pseudo-observations given to the static selection tables when used as priors
+PRIOR_STRENGTH = 6.0
+# Assumed edit latency for models without observations, and its pseudo-count
+PRIOR_LATENCY_S = 30.0
+PRIOR_LATENCY_WEIGHT = 1.0
+# Statistics are saved after this many recorded outcomes (and by save / at exit)
+SAVE_EVERY_N_RECORDS = 20
+
+
+class EditStage(StrEnum):
+    background = "background"
+    pose = "pose"
+
+
+@dataclass
+class ModelStats:
+    """Observed outcomes of one model's edit attempts at one stage."""
+
+    n_attempts: int = 0
+    n_errors: int = 0  # HTTP / content-policy errors
+    n_unchecked: int = 0  # edits not checked, e.g. hedged attempts that lost
+    n_preserved: int = 0  # passed the object preservation check
+    n_improvement_checks: int = 0
+    n_improvements: int = 0  # passed the pose improvement check
+    total_latency_s: float = 0.0
+
+    @property
+    def n_accepted(self) -> int:
+        """Attempts whose edit was kept (preserved and, if checked, an improvement)."""
+        return self.n_preserved - (self.n_improvement_checks - self.n_improvements)
+
+    @property
+    def n_checked(self) -> int:
+        """Attempts that failed or whose edit was checked."""
+        return self.n_attempts - self.n_unchecked
+
+
+class ModelRouter:
+    """Chooses edit models to maximize accepted edits per second.
+
+    Each candidate model's acceptance rate gets a Beta posterior and its latency a
+    running mean, both seeded from the static selection tables (acting as priors)
+    and updated from recorded outcomes. ``select`` does Thompson sampling on
+    sampled acceptance rate / mean latency. Statistics are persisted to a local
+    JSON file so routing improves across runs: every SAVE_EVERY_N_RECORDS records,
+    on ``save`` (e.g. at the end of a batch) and at exit.
+    """
+
+    def __init__(
+        self,
+        distributions_by_stage: dict[EditStage, dict[int, dict[str, float]]],
+        stats_path: Path | None = ROUTING_STATS_PATH,
+    ) -> None:
+        self.distributions_by_stage = distributions_by_stage
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        # Serializes saves, so that an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._n_unsaved = 0
+        self._stats: dict[EditStage, dict[str, ModelStats]] = {
+            stage: {} for stage in EditStage
+        }
+        if stats_path is not None and stats_path.exists():
+            self._load()
+        _routers.add(self)
+
+    def _load(self) -> None:
+        with open(self.stats_path, "r") as f:
+            data = json.load(f)
+        for stage, stats_by_model in data.items():
+            self._stats[EditStage(stage)] = {
+                model: ModelStats(**stats) for model, stats in stats_by_model.items()
+            }
+
+    def save(self) -> None:
+        """Write the statistics to ``stats_path`` (if any) if there are unsaved records."""
+        if self.stats_path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                if self._n_unsaved == 0:
+                    return
+                self._n_unsaved = 0
+                data = {
+                    stage.value: {
+                        model: asdict(stats) for model, stats in stats_by_model.items()
+                    }
+                    for stage, stats_by_model in self._stats.items()
+                }
+            self._write(data)
+
+    def _write(self, data: dict) -> None:
+        self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique per save, so routers sharing a stats file never write the same temp file
+        tmp_path = self.stats_path.with_name(f"{self.stats_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.stats_path)
+
+    def stats(self, stage: EditStage, model: str) -> ModelStats:
+        with self._lock:
+            return ModelStats(**asdict(self._stats[stage].get(model, ModelStats())))
+
+    def _prior_distribution(self, stage: EditStage, try_number: int) -> dict[str, float]:
+        distribution_by_min_try = self.distributions_by_stage[stage]
+        applicable_key = max(k for k in distribution_by_min_try if k <= try_number)
+        return distribution_by_min_try[applicable_key]
+
+    def _sample_score(self, stats: ModelStats, prior_weight: float, max_weight: float) -> float:
+        # Prior mean acceptance rate in [0.25, 0.75], higher for favoured models
+        prior_mean = 0.25 + 0.5 * prior_weight / max_weight
+        alpha = prior_mean * PRIOR_STRENGTH + stats.n_accepted
+        beta = (1 - prior_mean) * PRIOR_STRENGTH + stats.n_checked - stats.n_accepted
+        acceptance_rate = random.betavariate(alpha, beta)
+        mean_latency_s = (
+            PRIOR_LATENCY_S * PRIOR_LATENCY_WEIGHT + stats.total_latency_s
+        ) / (PRIOR_LATENCY_WEIGHT + stats.n_attempts)
+        return acceptance_rate / mean_latency_s
+
+    def select(
+        self,
+        stage: EditStage,
+        try_number: int,
+        exclude: set[str] | frozenset[str] = frozenset(),
+    ) -> str:
+        """Pick a model among the try number's candidates, skipping ``exclude`` if possible."""
+        distribution = self._prior_distribution(stage, try_number)
+        if any(model not in exclude for model in distribution):
+            distribution = {m: w for m, w in distribution.items() if m not in exclude}
+        max_weight = max(distribution.values())
+        with self._lock:
+            scores = {
+                model: self._sample_score(
+                    self._stats[stage].get(model, ModelStats()), weight, max_weight
+                )
+                for model, weight in distribution.items()
+            }
+        return max(scores, key=scores.get)
+
+    def record_attempt(
+        self,
+        stage: EditStage,
+        model: str,
+        latency_s: float,
+        preserved: bool = False,
+        error: bool = False,
+        checked: bool = True,
+    ) -> None:
+        """Record an edit attempt's latency and preservation check (or error) outcome.
+
+        Attempts recorded with ``checked=False`` only count towards the latency.
+        """
+        with self._lock:
+            stats = self._stats[stage].setdefault(model, ModelStats())
+            stats.n_attempts += 1
+            stats.total_latency_s += latency_s
+            stats.n_errors += int(error)
+            stats.n_unchecked += int(not checked)
+            stats.n_preserved += int(preserved)
+            self._n_unsaved += 1
+            save_due = self._n_unsaved >= SAVE_EVERY_N_RECORDS
+        if save_due:
+            self.save()
+
+    def record_improvement_check(
+        self, stage: EditStage, model: str, is_improvement: bool
+    ) -> None:
+        """Record the improvement check outcome of an already-recorded attempt."""
+        with self._lock:
+            stats = self._stats[stage].setdefault(model, ModelStats())
+            stats.n_improvement_checks += 1
+            stats.n_improvements += int(is_improvement)
+            self._n_unsaved += 1
+            save_due = self._n_unsaved >= SAVE_EVERY_N_RECORDS
+        if save_due:
+            self.save()
+
+
+# Live routers, whose unsaved records are saved at exit
+_routers: "weakref.WeakSet[ModelRouter]" = weakref.WeakSet()
+
+
+@atexit.register
+def _save_routers() -> None:
+    for router in list(_routers):
+        router.save()
@@ -1,10 +1,10 @@
 import json
 import os
 from enum import StrEnum
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, field_validator
-from mavis.globals import BlenderObject, BLENDER_OBJECTS
+from mavis.globals import BlenderObject, BLENDER_OBJECTS, ObjectPlacementSpec
 
 
 def _resolve_blender_object(
@@ -139,6 +139,63 @@ class ActionSceneSpecs(BaseModel):
         return json.dumps(self.model_dump(), indent=2)
 
 
+class ObjectSpecs(BaseModel):
+    object_name: str
+    specs: list[str]
+
+
+class StructuredActionSceneSpecs(BaseModel):
+    """ActionSceneSpecs with per-object entries as lists instead of dicts.
+
+    Structured-output schemas must have fixed property names, so the free-form
+    object-name keys of ActionSceneSpecs are represented as ObjectSpecs entries.
+    """
+
+    position: list[ObjectSpecs]
+    orientation: list[ObjectSpecs]
+    size: list[ObjectSpecs]
+    state: list[ObjectSpecs]
+
+    def to_action_scene_specs(self) -> ActionSceneSpecs:
+        def to_dict(entries: list[ObjectSpecs]) -> dict[str, list[str]]:
+            return {entry.object_name: entry.specs for entry in entries}
+
+        return ActionSceneSpecs(
+            position=to_dict(self.position),
+            orientation=to_dict(self.orientation),
+            size=to_dict(self.size),
+            state=to_dict(self.state),
+        )
+
+
+class SceneSpecsResponse(BaseModel):
+    """Structured response for scene spec generation.
+
+    ``scene_characteristics`` comes first so the model reasons before specifying.
+    """
+
+    scene_characteristics: str
+    specs: StructuredActionSceneSpecs
+
+
+class ScenePlacementsResponse(BaseModel):
+    """Structured response for scene placement (params) generation."""
+
+    placements: list[ObjectPlacementSpec]
+
+    @field_validator("placements")
+    @classmethod
+    def check_object_names(
+        cls, v: list[ObjectPlacementSpec]
+    ) -> list[ObjectPlacementSpec]:
+        for i, spec in enumerate(v):
+            if spec.object_name not in BLENDER_OBJECTS:
+                raise ValueError(
+                    f"Placement spec at index {i}: unknown object_name {spec.object_name!r}."
+                )
+        return v
+
+
 class YesNo(StrEnum):
     yes = "Yes"
     no = "No"
@@ -159,7 +216,57 @@ class ImageComparisonResponse(BaseModel):
     confidence: float  # 0.0 (no confidence) to 1.0 (full confidence)
 
 
+class ImageFormat(StrEnum):
+    png = "PNG"
+    jpeg = "JPEG"
+    webp = "WEBP"
+
+
+class ImageDetail(StrEnum):
+    auto = "auto"
+    low = "low"
+    high = "high"
+
+
+class ImagePayloadOptions(BaseModel):
+    """How prompt images are re-encoded before being sent to a VLM.
+
+    Attributes:
+        max_side: Longest side (px) to downscale to. None keeps the original size.
+        format: Codec to re-encode with.
+        quality: Encoder quality for lossy formats (ignored for PNG).
+        detail: Image detail level requested from the VLM provider.
+        crop_mask_path: Optional mask (e.g. from outputs/masks) whose foreground
+            bbox the image is cropped to before encoding.
+        crop_padding: Padding around the mask bbox, as a fraction of its longest side.
+    """
+
+    max_side: int | None = 512
+    format: ImageFormat = ImageFormat.jpeg
+    quality: int = 85
+    detail: ImageDetail = ImageDetail.auto
+    crop_mask_path: os.PathLike | None = None
+    crop_padding: float = 0.25
+
+
+class VLMMessage(BaseModel):
+    """A text-only conversation turn following a prompt's initial user message."""
+
+    role: Literal["user", "assistant"]
+    content: str
+
+
 class VLMPrompt(BaseModel):
+    """A prompt for a VLM call.
+
+    ``system`` should hold only static instructions so it stays byte-stable across
+    calls (and hits provider-side prompt caches); per-call content goes in ``user``.
+    ``template_name`` tags the prompt for usage telemetry and cache routing.
+    """
+
+    template_name: str | None = None
     system: str | None = None
     user: str
     image_paths: list[os.PathLike] = []
+    image_options: ImagePayloadOptions | None = None
+    follow_ups: list[VLMMessage] = []
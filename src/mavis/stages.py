@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import threading
+from enum import StrEnum
+from pathlib import Path
+
+from mavis.images import file_digest
+
+
+class Stage(StrEnum):
+    specs = "specs"
+    params = "params"
+    animacy = "animacy"
+    render = "render"
+    background = "background"
+    pose = "pose"
+    final = "final"
+
+
+def stage_key(stage: Stage, **inputs) -> str:
+    """Hash a stage's name and inputs (JSON-serializable values) into its key.
+
+    Downstream stages include their upstream stage's key in their inputs, so a
+    changed input re-keys exactly the stages that depend on it.
+    """
+    payload = json.dumps({"stage": stage, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+class StageManifest:
+    """Completed stages' outputs, keyed by a hash of their inputs (see stage_key).
+
+    Each entry records the files its stage produced and their digests; an entry
+    whose files are missing or have changed counts as not completed. If ``path``
+    is given, the manifest is loaded from it and saved after every record, so a
+    crashed run can resume from its last completed stages.
+    """
+
+    def __init__(self, path: os.PathLike | None = None):
+        self.path = Path(path) if path is not None else None
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            with open(self.path) as f:
+                self._entries = json.load(f)
+
+    def get(self, key: str) -> dict | None:
+        """Return the outputs recorded for ``key``, or None if it must (re)run."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        for path, digest in entry["files"].items():
+            if not os.path.exists(path) or file_digest(path) != digest:
+                return None
+        return entry["outputs"]
+
+    def record(
+        self,
+        stage: Stage,
+        key: str,
+        outputs: dict,
+        files: list[os.PathLike] = (),
+    ) -> None:
+        entry = {
+            "stage": stage,
+            "outputs": outputs,
+            "files": {str(path): file_digest(path) for path in files},
+        }
+        with self._lock:
+            self._entries[key] = entry
+            if self.path is not None:
+                self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,176 @@
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+# Kept stdlib-only: render_scene.py imports this inside Blender's Python
+
+# Span attributes whose values get their own rows in latency breakdowns
+BREAKDOWN_ATTRS = ("template", "model")
+
+_current_tracer: contextvars.ContextVar["Tracer | None"] = contextvars.ContextVar(
+    "mavis_tracer", default=None
+)
+
+
+class Tracer:
+    """Collects a run's spans as Chrome trace events ("X" events, in µs since the epoch).
+
+    Timestamps are wall-clock, so spans recorded by other processes (e.g. Blender)
+    line up with the parent's. If ``spans_path`` is given, each span is also
+    appended to it as a JSON line when it ends, for another process to load with
+    load_spans. Safe to share between threads.
+    """
+
+    def __init__(self, spans_path: os.PathLike | None = None):
+        self.spans_path = Path(spans_path) if spans_path is not None else None
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, event: dict) -> None:
+        with self._lock:
+            self.events.append(event)
+            if self.spans_path is not None:
+                self.spans_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.spans_path, "a") as f:
+                    f.write(json.dumps(event, default=str) + "\n")
+
+    def load_spans(self, spans_path: os.PathLike) -> None:
+        """Add the spans another process's tracer appended to ``spans_path``."""
+        if not os.path.exists(spans_path):
+            return
+        with open(spans_path) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        with self._lock:
+            self.events += events
+
+    def export_chrome_trace(self, path: os.PathLike) -> None:
+        """Write the spans as Chrome trace JSON (chrome://tracing or ui.perfetto.dev)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        with open(path, "w") as f:
+            json.dump(trace, f, default=str)
+
+    def latency_breakdown(self) -> dict[str, dict]:
+        with self._lock:
+            return latency_breakdown(list(self.events))
+
+
+def current_tracer() -> Tracer | None:
+    return _current_tracer.get()
+
+
+@contextmanager
+def use_tracer(tracer: Tracer | None) -> Iterator[Tracer | None]:
+    """Record spans started in this context (see submit_in_context) to ``tracer``."""
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+@contextmanager
+def span(name: str, category: str = "pipeline", **attrs) -> Iterator[dict]:
+    """Time the enclosed block as a span of the current tracer (a no-op without one).
+
+    Yields the span's attributes (e.g. model, try_number, render_id), which may be
+    updated before the block ends, e.g. with its ``outcome``. A block that raises
+    gets ``outcome="error"`` and the error.
+    """
+    tracer = _current_tracer.get()
+    start_us = time.time_ns() // 1000
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except GeneratorExit:
+        attrs.setdefault("outcome", "closed")
+        raise
+    except BaseException as e:
+        attrs.setdefault("outcome", "error")
+        attrs["error"] = repr(e)
+        raise
+    finally:
+        if tracer is not None:
+            tracer.add(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": start_us,
+                    "dur": round((time.perf_counter() - start) * 1e6),
+                    "pid": os.getpid(),
+                    "tid": threading.get_native_id(),
+                    "args": attrs,
+                }
+            )
+
+
+def submit_in_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """Like ``executor.submit``, but ``fn`` runs in (a copy of) the caller's context.
+
+    Worker threads don't inherit context variables, so without this, spans started
+    by ``fn`` would not reach the caller's tracer.
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def latency_breakdown(events: list[dict]) -> dict[str, dict]:
+    """Aggregate span durations per name and BREAKDOWN_ATTRS, slowest total first."""
+    durations_s: dict[str, list[float]] = defaultdict(list)
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        args = event.get("args", {})
+        key = " ".join(
+            [event["name"]]
+            + [f"[{args[attr]}]" for attr in BREAKDOWN_ATTRS if args.get(attr) is not None]
+        )
+        durations_s[key].append(event["dur"] / 1e6)
+    breakdown = {}
+    for key, values in durations_s.items():
+        values.sort()
+        breakdown[key] = {
+            "count": len(values),
+            "total_s": sum(values),
+            "mean_s": sum(values) / len(values),
+            "p50_s": _percentile(values, 0.5),
+            "p95_s": _percentile(values, 0.95),
+            "max_s": values[-1],
+        }
+    return dict(sorted(breakdown.items(), key=lambda item: -item[1]["total_s"]))
+
+
+def format_latency_breakdown(breakdown: dict[str, dict]) -> str:
+    lines = [f"{'span':<60} {'count':>6} {'total_s':>9} {'mean_s':>8} {'p95_s':>8}"]
+    for key, stats in breakdown.items():
+        lines.append(
+            f"{key:<60} {stats['count']:>6} {stats['total_s']:>9.2f} "
+            f"{stats['mean_s']:>8.2f} {stats['p95_s']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Latency breakdown over one or more exported traces, e.g. all of a batch's runs
+    parser = argparse.ArgumentParser()
+    parser.add_argument("traces", nargs="+", help="Chrome trace JSON files")
+    args = parser.parse_args()
+    events = []
+    for trace_path in args.traces:
+        with open(trace_path) as f:
+            events += json.load(f)["traceEvents"]
+    print(format_latency_breakdown(latency_breakdown(events)))
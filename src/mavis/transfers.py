@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+from PIL import Image
+
+from mavis.concurrency import Provider
+from mavis.fal import get_fal_client
+from mavis.images import file_digest
+from mavis.resilience import TransientError, call_with_backoff, is_gone_error
+from mavis.tracing import span, submit_in_context
+
+if TYPE_CHECKING:
+    import requests
+
+T = TypeVar("T")
+
+MAX_BACKGROUND_DOWNLOADS = 4
+DOWNLOAD_POOL_SIZE = 16
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# (connect, read) timeouts in seconds
+DOWNLOAD_TIMEOUT_S = (10, 60)
+# Cached remote URLs are reused for at most this long (fal CDN files expire) and
+# only this many are kept per cache, least recently used first out
+CACHED_URL_TTL_S = 3600.0
+MAX_CACHED_URLS = 4096
+
+_lock = threading.Lock()
+# (CDN URL, time cached) of files already uploaded, keyed by content hash
+_upload_urls_by_digest: OrderedDict[str, tuple[str, float]] = OrderedDict()
+# (remote URL, time cached) of edit results, keyed by the local path they are saved to
+_remote_urls_by_path: OrderedDict[str, tuple[str, float]] = OrderedDict()
+# In-progress background downloads, keyed by local path
+_pending_downloads: dict[str, Future] = {}
+_download_executor: ThreadPoolExecutor | None = None
+_session: "requests.Session | None" = None
+
+
+def _key(path: os.PathLike) -> str:
+    return str(Path(path).resolve())
+
+
+def _get_cached_url(cache: OrderedDict[str, tuple[str, float]], key: str) -> str | None:
+    """Return the unexpired URL cached under ``key``, if any (hold _lock)."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    url, cached_at = entry
+    if time.monotonic() - cached_at > CACHED_URL_TTL_S:
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return url
+
+
+def _cache_url(cache: OrderedDict[str, tuple[str, float]], key: str, url: str) -> None:
+    """Cache ``url`` under ``key``, evicting the least recently used (hold _lock)."""
+    cache[key] = (url, time.monotonic())
+    cache.move_to_end(key)
+    while len(cache) > MAX_CACHED_URLS:
+        cache.popitem(last=False)
+
+
+def _get_download_executor() -> ThreadPoolExecutor:
+    global _download_executor
+    with _lock:
+        if _download_executor is None:
+            _download_executor = ThreadPoolExecutor(
+                max_workers=MAX_BACKGROUND_DOWNLOADS, thread_name_prefix="mavis-download"
+            )
+        return _download_executor
+
+
+def upload_file(path: os.PathLike) -> str:
+    """Return a fal CDN URL for a local file, uploading it only if necessary.
+
+    Edit results saved with save_remote_result reuse the URL fal returned (even
+    while the local copy is still downloading), and other files are uploaded at
+    most once per distinct content, as long as their URLs are cached (see
+    CACHED_URL_TTL_S and MAX_CACHED_URLS).
+    """
+    with _lock:
+        remote_url = _get_cached_url(_remote_urls_by_path, _key(path))
+    if remote_url is not None:
+        return remote_url
+    # An edit result whose remote URL was dropped is uploaded from its local copy
+    ensure_local(path)
+    digest = file_digest(path)
+    with _lock:
+        cached_url = _get_cached_url(_upload_urls_by_digest, digest)
+    if cached_url is not None:
+        return cached_url
+    with span("upload", "transfer", path=str(path), bytes=os.path.getsize(path)):
+        url = call_with_backoff(
+            Provider.fal, "upload", lambda: get_fal_client().upload_file(path)
+        )
+    with _lock:
+        _cache_url(_upload_urls_by_digest, digest, url)
+    return url
+
+
+def forget_url(url: str) -> None:
+    """Stop reusing ``url`` for the files it was cached for."""
+    with _lock:
+        for cache in (_upload_urls_by_digest, _remote_urls_by_path):
+            for key in [key for key, (cached, _) in cache.items() if cached == url]:
+                del cache[key]
+
+
+def call_with_uploads(paths: list[os.PathLike], fn: Callable[[list[str]], T]) -> T:
+    """Call ``fn`` with remote URLs for the files at ``paths`` (see upload_file).
+
+    If ``fn`` fails because a URL is no longer served (404/410, e.g. an expired
+    CDN file), the URLs are forgotten and ``fn`` is retried once with fresh uploads.
+    """
+    urls = [upload_file(path) for path in paths]
+    try:
+        return fn(urls)
+    except Exception as e:
+        if not is_gone_error(e):
+            raise
+        print(f"Input URL no longer served, uploading again: {e}")
+        for url in urls:
+            forget_url(url)
+        return fn([upload_file(path) for path in paths])
+
+
+def _get_session() -> "requests.Session":
+    """Return the shared keep-alive session used for all result downloads."""
+    # Imported here so that importing mavis doesn't import requests
+    import requests
+    import requests.adapters
+
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=DOWNLOAD_POOL_SIZE, pool_maxsize=DOWNLOAD_POOL_SIZE
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class DownloadIntegrityError(TransientError):
+    """A download was truncated or is not a readable image."""
+
+
+def _verify_image(path: os.PathLike) -> None:
+    try:
+        with Image.open(path) as img:
+            img.verify()
+    except Exception as e:
+        raise DownloadIntegrityError(f"Downloaded file {path} is not a valid image: {e}")
+
+
+def download_file(url: str, save_path: os.PathLike) -> None:
+    """Stream ``url`` to ``save_path`` over the shared connection pool.
+
+    Chunks are written to a temporary file that only replaces ``save_path`` once
+    the body is complete (matching Content-Length, if sent) and decodes as an
+    image, so readers never see a partial file.
+    """
+    save_path = Path(save_path)
+    part_path = save_path.with_name(save_path.name + ".part")
+
+    def download() -> None:
+        with _get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT_S) as response:
+            response.raise_for_status()
+            n_bytes = 0
+            with open(part_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    n_bytes += len(chunk)
+            expected = response.headers.get("Content-Length")
+            if expected is not None and int(expected) != n_bytes:
+                raise DownloadIntegrityError(
+                    f"Download of {url} truncated: got {n_bytes} of {expected} bytes"
+                )
+
+    try:
+        with span("download", "transfer", path=str(save_path)):
+            # Truncated bodies and connection errors are retried like other transient
+            # errors. Results are served by fal's CDN, not its API, so downloads don't
+            # take from the fal request rate limit
+            call_with_backoff(Provider.fal, "download", download, rate_limited=False)
+            _verify_image(part_path)
+        os.replace(part_path, save_path)
+    finally:
+        part_path.unlink(missing_ok=True)
+
+
+def download_files(downloads: list[tuple[str, os.PathLike]]) -> None:
+    """Download several (url, save_path) pairs concurrently, e.g. when edits finish together.
+
+    Blocks until all are done and raises the first error, if any.
+    """
+    executor = _get_download_executor()
+    futures = [
+        submit_in_context(executor, download_file, url, path) for url, path in downloads
+    ]
+    for future in futures:
+        future.result()
+
+
+def save_remote_result(url: str, save_path: os.PathLike) -> None:
+    """Record ``url`` as the remote copy of ``save_path`` and download it in the background.
+
+    Call ensure_local before reading ``save_path``.
+    """
+    key = _key(save_path)
+    future = submit_in_context(_get_download_executor(), download_file, url, save_path)
+    with _lock:
+        _cache_url(_remote_urls_by_path, key, url)
+        _pending_downloads[key] = future
+
+    def forget_if_downloaded(future: Future) -> None:
+        # Failed downloads are kept, so that ensure_local re-raises their error
+        if future.exception() is None:
+            with _lock:
+                if _pending_downloads.get(key) is future:
+                    del _pending_downloads[key]
+
+    future.add_done_callback(forget_if_downloaded)
+
+
+def ensure_local(path: os.PathLike) -> None:
+    """Block until a background download to ``path`` (if any) has finished.
+
+    Re-raises the download's error if it failed.
+    """
+    with _lock:
+        future = _pending_downloads.get(_key(path))
+    if future is None:
+        return
+    future.result()
+    with _lock:
+        if _pending_downloads.get(_key(path)) is future:
+            del _pending_downloads[_key(path)]
+
+
+def forget_remote_urls() -> None:
+    """Forget cached remote URLs and downloads, e.g. after switching fal clients."""
+    with _lock:
+        _upload_urls_by_digest.clear()
+        _remote_urls_by_path.clear()
+        _pending_downloads.clear()
@@ -1,14 +1,48 @@
+import json
 import os
+import subprocess
+import time
+from typing import Iterator
 
-from mavis.globals import OUTPUT_RENDERS_DIR_PATH, OUTPUT_MASKS_DIR_PATH
+from mavis.globals import RENDER_EVENTS_FILENAME, RunContext
 
 
-def get_completed_renders(
-    run_uid: str,
-) -> list[tuple[str, os.PathLike, dict[str, os.PathLike]]]:
-    render_dir = OUTPUT_RENDERS_DIR_PATH / run_uid
-    masks_base_dir = OUTPUT_MASKS_DIR_PATH / run_uid
-    for f in render_dir.glob("*.png"):
-        masks_dir = masks_base_dir / f.stem
-        masks = {f.stem: f for f in masks_dir.glob(f"*.png")}
-        yield f.stem, f, masks
+def get_render_masks(run_ctx: RunContext, render_id: str) -> dict[str, os.PathLike]:
+    masks_dir = run_ctx.masks_dir / render_id
+    return {f.stem: f for f in masks_dir.glob("*.png")}
+
+
+def iter_renders_as_completed(
+    run_ctx: RunContext,
+    render_process: subprocess.Popen,
+    poll_interval: float = 0.25,
+) -> Iterator[tuple[str, os.PathLike, dict[str, os.PathLike]]]:
+    """Yield renders as the render subprocess publishes them, until it exits.
+
+    Follows the run's render events file (see RENDER_EVENTS_FILENAME), so each
+    POV can be consumed as soon as its PNG and masks are written. Raises
+    CalledProcessError after yielding all published renders if the subprocess
+    failed.
+    """
+    render_dir = run_ctx.renders_dir
+    events_path = render_dir / RENDER_EVENTS_FILENAME
+    offset = 0
+    while True:
+        # Check for exit before reading, so no events are missed after the final read
+        has_exited = render_process.poll() is not None
+        if events_path.exists():
+            with open(events_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # Only consume complete lines
+            complete = data[: data.rfind(b"\n") + 1]
+            offset += len(complete)
+            for line in complete.decode("utf-8").splitlines():
+                render_id = json.loads(line)["render_id"]
+                render_path = render_dir / f"{render_id}.png"
+                yield render_id, render_path, get_render_masks(run_ctx, render_id)
+        if has_exited:
+            break
+        time.sleep(poll_interval)
+    if render_process.returncode != 0:
+        raise subprocess.CalledProcessError(render_process.returncode, render_process.args)
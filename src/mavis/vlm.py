@@ -1,12 +1,27 @@
-import base64
+import copy
 import os
-from typing import Protocol, TypeVar, runtime_checkable
+from collections import defaultdict
+from contextlib import ExitStack
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Callable, Iterator, Protocol, TypeVar, runtime_checkable
 
 from pydantic import BaseModel
 
-from mavis.schema import VLMPrompt
+from mavis.budget import RunBudget
+from mavis.concurrency import Provider, provider_slot
+from mavis.images import encode_image_to_data_url
+from mavis.resilience import call_with_backoff
+from mavis.schema import ImageDetail, VLMPrompt
+from mavis.tracing import span
 
 T = TypeVar("T", bound=BaseModel)
+R = TypeVar("R")
+
+# Rough token counts for streams closed before their usage chunk arrives
+CHARS_PER_TOKEN_ESTIMATE = 4
+TOKENS_PER_IMAGE_ESTIMATE = {ImageDetail.low: 85}
+DEFAULT_TOKENS_PER_IMAGE_ESTIMATE = 765  # A 512px image at high detail
 
 
 @runtime_checkable
@@ -17,6 +32,10 @@ class VLM(Protocol):
         """Generate a completion for the given prompt, optionally with images."""
         ...
 
+    def generate_stream(self, prompt: VLMPrompt) -> Iterator[str]:
+        """Stream a completion as text chunks. Closing the iterator cancels it."""
+        ...
+
     def generate_structured(
         self,
         prompt: VLMPrompt,
@@ -26,23 +45,13 @@ class VLM(Protocol):
         ...
 
 
-def _encode_image_to_data_url(path: str) -> str:
-    """Read an image file and return a base64 data URL."""
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    ext = os.path.splitext(path)[1].lower().lstrip(".")
-    mime = {
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "png": "image/png",
-        "gif": "image/gif",
-        "webp": "image/webp",
-    }.get(ext, "image/png")
-    return f"data:{mime};base64,{b64}"
-
-
 def _build_openai_messages(prompt: VLMPrompt) -> list[dict]:
-    """Build an OpenAI-compatible message list from a VLMPrompt."""
+    """Build an OpenAI-compatible message list from a VLMPrompt.
+
+    Content is ordered from most to least reusable (static system prompt, then
+    images, then per-call text) so that repeated calls share a byte-identical
+    prefix, e.g. when the same image is checked once per object.
+    """
     messages: list[dict] = []
     if prompt.system is not None:
         messages.append({"role": "system", "content": prompt.system})
@@ -51,50 +60,230 @@ def _build_openai_messages(prompt: VLMPrompt) -> list[dict]:
     if not prompt.image_paths:
         messages.append({"role": "user", "content": prompt.user})
     else:
-        content: list[dict] = [{"type": "text", "text": prompt.user}]
+        content: list[dict] = []
         for img_path in prompt.image_paths:
-            content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": _encode_image_to_data_url(img_path)},
-                }
-            )
+            image_url = {"url": encode_image_to_data_url(img_path, prompt.image_options)}
+            if prompt.image_options is not None:
+                image_url["detail"] = prompt.image_options.detail.value
+            content.append({"type": "image_url", "image_url": image_url})
+        content.append({"type": "text", "text": prompt.user})
         messages.append({"role": "user", "content": content})
 
+    # Subsequent turns (e.g. a previous answer and a repair request)
+    for message in prompt.follow_ups:
+        messages.append({"role": message.role, "content": message.content})
+
     return messages
 
 
+@dataclass
+class VLMUsageRecord:
+    """Token usage reported for a single VLM response."""
+
+    template_name: str | None
+    model: str
+    prompt_tokens: int
+    cached_tokens: int
+    completion_tokens: int
+    reasoning_tokens: int
+
+
+def _usage_record_from_response_usage(
+    usage, template_name: str | None, model: str
+) -> VLMUsageRecord:
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    completion_details = getattr(usage, "completion_tokens_details", None)
+    return VLMUsageRecord(
+        template_name=template_name,
+        model=model,
+        prompt_tokens=usage.prompt_tokens or 0,
+        cached_tokens=getattr(prompt_details, "cached_tokens", None) or 0,
+        completion_tokens=usage.completion_tokens or 0,
+        reasoning_tokens=getattr(completion_details, "reasoning_tokens", None) or 0,
+    )
+
+
+def _estimate_usage(prompt: VLMPrompt, completion: str) -> SimpleNamespace:
+    """Estimate the usage of a response from its prompt and the completion received."""
+    texts = [prompt.system or "", prompt.user]
+    texts += [m.content for m in prompt.follow_ups if isinstance(m.content, str)]
+    detail = prompt.image_options.detail if prompt.image_options is not None else None
+    tokens_per_image = TOKENS_PER_IMAGE_ESTIMATE.get(
+        detail, DEFAULT_TOKENS_PER_IMAGE_ESTIMATE
+    )
+    return SimpleNamespace(
+        prompt_tokens=sum(map(len, texts)) // CHARS_PER_TOKEN_ESTIMATE
+        + len(prompt.image_paths) * tokens_per_image,
+        completion_tokens=len(completion) // CHARS_PER_TOKEN_ESTIMATE,
+    )
+
+
+def summarize_usage_by_template(records: list[VLMUsageRecord]) -> dict[str, dict]:
+    """Aggregate usage records per prompt template, including the cache hit rate."""
+    summary: dict[str, dict] = defaultdict(
+        lambda: {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+            "reasoning_tokens": 0,
+        }
+    )
+    for record in records:
+        entry = summary[record.template_name or "untagged"]
+        entry["calls"] += 1
+        entry["prompt_tokens"] += record.prompt_tokens
+        entry["cached_tokens"] += record.cached_tokens
+        entry["completion_tokens"] += record.completion_tokens
+        entry["reasoning_tokens"] += record.reasoning_tokens
+    for entry in summary.values():
+        entry["cache_hit_rate"] = (
+            entry["cached_tokens"] / entry["prompt_tokens"] if entry["prompt_tokens"] else 0.0
+        )
+    return dict(summary)
+
+
 class OpenAIVLM:
     """OpenAI-compatible VLM implementation using OPENAI_API_KEY and a model name."""
 
     def __init__(
-        self, model: str = "gpt-5.2-2025-12-11", api_key: str | None = None
+        self,
+        model: str = "gpt-5.2-2025-12-11",
+        api_key: str | None = None,
+        client=None,
     ) -> None:
-        from openai import OpenAI
-
+        """``client`` replaces the OpenAI client, e.g. with mavis.fakes.FakeOpenAIClient."""
         self.model = model
-        api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY must be set or passed explicitly")
-        self._client = OpenAI(api_key=api_key)
+        if client is None:
+            from openai import OpenAI
+
+            api_key = api_key or os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY must be set or passed explicitly")
+            # Retries are handled by mavis.resilience (rate limits, backoff, Retry-After)
+            client = OpenAI(api_key=api_key, max_retries=0)
+        self._client = client
+        self.usage_records: list[VLMUsageRecord] = []
+        self.budget: RunBudget | None = None
+
+    def with_budget(self, budget: RunBudget) -> "OpenAIVLM":
+        """Return a VLM sharing this one's client and usage records, charging ``budget``.
+
+        Its requests raise budget.BudgetExceeded instead of starting once the budget
+        is exceeded.
+        """
+        vlm = copy.copy(self)
+        vlm.budget = budget
+        return vlm
+
+    def _check_budget(self) -> None:
+        if self.budget is not None:
+            self.budget.check()
+
+    def _request_kwargs(self, prompt: VLMPrompt) -> dict:
+        kwargs = {"model": self.model, "messages": _build_openai_messages(prompt)}
+        if prompt.template_name is not None:
+            # Route same-template requests to the same cache shard
+            kwargs["prompt_cache_key"] = prompt.template_name
+        return kwargs
+
+    def _call(self, request: Callable[[], R]) -> R:
+        """Make a request with backoff, holding a provider slot only during attempts."""
+
+        def attempt() -> R:
+            with provider_slot(Provider.openai):
+                return request()
+
+        return call_with_backoff(Provider.openai, self.model, attempt)
+
+    def _record_usage(self, usage, prompt: VLMPrompt) -> None:
+        if usage is None:
+            return
+        record = _usage_record_from_response_usage(usage, prompt.template_name, self.model)
+        self.usage_records.append(record)
+        if self.budget is not None:
+            self.budget.charge_tokens(
+                record.template_name or "untagged",
+                record.model,
+                record.prompt_tokens,
+                record.cached_tokens,
+                record.completion_tokens,
+            )
 
     def generate(self, prompt: VLMPrompt) -> str:
-        messages = _build_openai_messages(prompt)
-        response = self._client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-        )
+        self._check_budget()
+        with span("vlm.generate", "vlm", model=self.model, template=prompt.template_name):
+            response = self._call(
+                lambda: self._client.chat.completions.create(
+                    **self._request_kwargs(prompt)
+                )
+            )
+        self._record_usage(response.usage, prompt)
         return response.choices[0].message.content or ""
 
+    def generate_stream(self, prompt: VLMPrompt) -> Iterator[str]:
+        self._check_budget()
+        with (
+            span("vlm.generate_stream", "vlm", model=self.model, template=prompt.template_name),
+            ExitStack() as stream_slot,
+        ):
+
+            def attempt():
+                with ExitStack() as attempt_slot:
+                    attempt_slot.enter_context(provider_slot(Provider.openai))
+                    stream = self._client.chat.completions.create(
+                        **self._request_kwargs(prompt),
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    # The successful attempt keeps its slot while the response streams in
+                    stream_slot.push(attempt_slot.pop_all())
+                    return stream
+
+            stream = call_with_backoff(Provider.openai, self.model, attempt)
+            received: list[str] = []
+            usage = None
+            try:
+                for chunk in stream:
+                    # Usage arrives in a final, choice-less chunk
+                    usage = chunk.usage or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        received.append(chunk.choices[0].delta.content)
+                        yield received[-1]
+            finally:
+                # Closing the HTTP response stops the server-side generation
+                stream.close()
+                # If closed early (e.g. once a JSON block is complete), the usage chunk
+                # never arrives, so estimate what was consumed
+                if usage is None:
+                    usage = _estimate_usage(prompt, "".join(received))
+                self._record_usage(usage, prompt)
+
     def generate_structured(
         self,
         prompt: VLMPrompt,
         response_format: type[T],
     ) -> T:
-        messages = _build_openai_messages(prompt)
-        response = self._client.beta.chat.completions.parse(
-            model=self.model,
-            messages=messages,
-            response_format=response_format,
-        )
-        return response.choices[0].message.parsed
+        self._check_budget()
+        with span(
+            "vlm.generate_structured", "vlm", model=self.model, template=prompt.template_name
+        ):
+            response = self._call(
+                lambda: self._client.beta.chat.completions.parse(
+                    **self._request_kwargs(prompt),
+                    response_format=response_format,
+                )
+            )
+        self._record_usage(response.usage, prompt)
+        message = response.choices[0].message
+        if message.parsed is None:
+            # e.g. the model refused, so there is no schema-conforming answer
+            refusal = getattr(message, "refusal", None)
+            raise ValueError(
+                f"{self.model} returned no {response_format.__name__}"
+                + (f" (refusal: {refusal})" if refusal else "")
+            )
+        return message.parsed
+
+    def usage_summary(self) -> dict[str, dict]:
+        return summarize_usage_by_template(self.usage_records)
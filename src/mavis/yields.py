@@ -0,0 +1,39 @@
+import math
+
+# Beta prior on the fraction of renders whose edit chain succeeds, used until
+# enough chains have finished to estimate it
+PRIOR_SUCCESS_RATE = 0.5
+PRIOR_STRENGTH = 2
+# Never render more than this many POVs per requested success
+MAX_POVS_PER_TARGET_SUCCESS = 4
+
+
+def estimate_success_rate(n_succeeded: int, n_finished: int) -> float:
+    """Posterior mean success rate of edit chains (Beta prior, see PRIOR_*)."""
+    alpha = PRIOR_SUCCESS_RATE * PRIOR_STRENGTH + n_succeeded
+    beta = (1 - PRIOR_SUCCESS_RATE) * PRIOR_STRENGTH + (n_finished - n_succeeded)
+    return alpha / (alpha + beta)
+
+
+def n_povs_to_request(
+    target_successes: int,
+    n_succeeded: int,
+    n_finished: int,
+    n_in_flight: int,
+    n_povs_so_far: int,
+) -> int:
+    """Return how many more POVs to render so that ``target_successes`` is likely.
+
+    Counts the chains still in flight at the estimated success rate, and asks for
+    enough extra POVs to cover the expected shortfall (0 if there is none, or if
+    the POV budget is used up).
+    """
+    n_needed = target_successes - n_succeeded
+    if n_needed <= 0:
+        return 0
+    success_rate = estimate_success_rate(n_succeeded, n_finished)
+    expected_shortfall = n_needed - success_rate * n_in_flight
+    if expected_shortfall <= 0:
+        return 0
+    budget = MAX_POVS_PER_TARGET_SUCCESS * target_successes - n_povs_so_far
+    return max(0, min(budget, math.ceil(expected_shortfall / success_rate)))
@@ -0,0 +1,140 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from mavis import batch
+from mavis.batch import BatchLimits, SceneStatus, load_action_scenes, run_batch
+from mavis.concurrency import PROVIDER_CONCURRENCY_LIMITS
+from mavis.schema import ActionScene
+
+
+def _write_manifest(tmp_path, entries):
+    manifest_path = tmp_path / "scenes.jsonl"
+    manifest_path.write_text("\n".join(json.dumps(entry) for entry in entries))
+    return manifest_path
+
+
+def test_load_action_scenes_from_jsonl(tmp_path):
+    manifest_path = _write_manifest(
+        tmp_path,
+        [
+            {"who": "dog", "does": "throws", "what": "chair"},
+            {"who": "puma", "does": "chases", "to_whom": "dog"},
+        ],
+    )
+    action_scenes = load_action_scenes(manifest_path)
+    assert [a.object_strs for a in action_scenes] == [["dog", "chair"], ["puma", "dog"]]
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    def fake_plan_scene(vlm, action_scene, structured_generation, run_ctx, budget):
+        if action_scene.does == "fails":
+            raise ValueError("no plan")
+        return SimpleNamespace(
+            run_ctx=run_ctx,
+            action_scene=action_scene,
+            action_scene_specs=None,
+            objects_are_animate={},
+            manifest=None,
+        )
+
+    def fake_iter_scene_renders(plan):
+        for i in range(2):
+            yield f"pov{i}", plan.run_ctx.renders_dir / f"pov{i}.png", {}
+
+    def fake_edit_render(action_scene, render_id, **kwargs):
+        # The "throws" scene's second render fails its edits
+        if action_scene.does == "throws" and render_id == "pov1":
+            return None
+        return kwargs["run_ctx"].final_outputs_dir / f"{render_id}.png"
+
+    monkeypatch.setattr(batch, "plan_scene", fake_plan_scene)
+    monkeypatch.setattr(batch, "iter_scene_renders", fake_iter_scene_renders)
+    monkeypatch.setattr(batch, "edit_render", fake_edit_render)
+
+
+def test_run_batch_writes_per_scene_status(tmp_path, fake_pipeline, monkeypatch):
+    manifest_path = _write_manifest(
+        tmp_path,
+        [
+            {"who": "dog", "does": "chases", "what": "puma"},
+            {"who": "dog", "does": "throws", "what": "chair"},
+            {"who": "puma", "does": "fails"},
+        ],
+    )
+    summary_path = tmp_path / "summary.json"
+    n_summary_writes = 0
+    write_summary = batch._write_summary
+
+    def counting_write_summary(entries, path):
+        nonlocal n_summary_writes
+        n_summary_writes += 1
+        write_summary(entries, path)
+
+    monkeypatch.setattr(batch, "_write_summary", counting_write_summary)
+    default_concurrency = dict(PROVIDER_CONCURRENCY_LIMITS)
+    limits = BatchLimits(spec_workers=2, render_workers=2, edit_workers=4, fal_concurrency=1)
+    with pytest.warns(UserWarning, match="Planning scene 2 failed"):
+        records = run_batch(
+            SimpleNamespace(),
+            load_action_scenes(manifest_path),
+            limits,
+            summary_path,
+            output_dir=tmp_path,
+        )
+    # Written at the start and end (not on every status change) in a short batch
+    assert n_summary_writes == 2
+    # The batch's concurrency limits don't outlive it
+    assert PROVIDER_CONCURRENCY_LIMITS == default_concurrency
+
+    assert [r.status for r in records] == [
+        SceneStatus.succeeded,
+        SceneStatus.partial,
+        SceneStatus.failed,
+    ]
+    assert [r.n_successful_renders for r in records] == [2, 1, 0]
+    assert "no plan" in records[2].error
+    summary = json.loads(summary_path.read_text())
+    assert [s["status"] for s in summary] == ["succeeded", "partial", "failed"]
+    final_dir = tmp_path / "final" / records[0].run_uid
+    assert summary[0]["final_paths"] == [
+        str(final_dir / "pov0.png"),
+        str(final_dir / "pov1.png"),
+    ]
+    # Each planned scene's spans are exported to its own trace
+    assert json.loads(open(records[0].trace_path).read())["traceEvents"] == []
+
+
+def test_run_batch_finishes_scenes_whose_stages_fail_unexpectedly(
+    tmp_path, fake_pipeline, monkeypatch
+):
+    submit_in_context = batch.submit_in_context
+
+    def failing_submit(executor, fn, *args, **kwargs):
+        if fn.__name__ == "render_stage":
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        return submit_in_context(executor, fn, *args, **kwargs)
+
+    monkeypatch.setattr(batch, "submit_in_context", failing_submit)
+    records = []
+    thread = threading.Thread(
+        target=lambda: records.extend(
+            run_batch(
+                SimpleNamespace(),
+                [ActionScene(who="dog", does="chases", what="puma")],
+                summary_path=tmp_path / "summary.json",
+                output_dir=tmp_path,
+            )
+        ),
+        daemon=True,
+    )
+    with pytest.warns(UserWarning, match="Scheduling scene 0 failed"):
+        thread.start()
+        thread.join(timeout=10)
+    # The failure was recorded instead of leaving run_batch waiting forever
+    assert not thread.is_alive()
+    assert records[0].status == SceneStatus.failed
+    assert "after shutdown" in records[0].error
@@ -0,0 +1,26 @@
+from mavis.benchmarks import compare_results, format_comparison, measure_import
+
+
+def test_compare_results_pairs_shared_numeric_results():
+    old = {
+        "git_commit": "abc",
+        "microbenchmarks": {"parse": {"best_us": 10.0, "n_calls": 100}},
+        "pipeline": {"1": {"wall_s": 20.0, "scene_latency": {"p95_s": None}}},
+    }
+    new = {
+        "git_commit": "def",
+        "microbenchmarks": {"parse": {"best_us": 5.0, "n_calls": 200}},
+        "pipeline": {"2": {"wall_s": 8.0}},
+    }
+    comparison = compare_results(old, new)
+    assert comparison == {
+        "microbenchmarks.parse.best_us": (10.0, 5.0),
+        "microbenchmarks.parse.n_calls": (100, 200),
+    }
+    assert "-50%" in format_comparison(comparison)
+
+
+def test_importing_mavis_defers_clients_templates_and_catalog():
+    result = measure_import("mavis.mavis", n_runs=1)
+    assert result["deferred_imports_loaded"] == []
+    assert not result["catalog_loaded"]
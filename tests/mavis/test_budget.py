@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from mavis import mavis
+from mavis.budget import BudgetExceeded, RunBudget, with_budget
+from mavis.globals import RunContext
+from mavis.schema import ActionScene, ActionSceneSpecs, VLMPrompt
+from mavis.vlm import OpenAIVLM
+
+
+def test_budget_records_costs_per_stage_and_enforces_limits():
+    budget = RunBudget(max_usd=0.1)
+    budget.charge_tokens("check_object_preserved", "gpt-5.2-2025-12-11", 1000, 800, 100)
+    budget.charge_images("background", "fal-ai/flux-2/turbo/edit")
+    budget.charge_images("background", "fal-ai/flux-2/turbo/edit")
+    budget.charge_render_seconds(60)
+    summary = budget.summary()
+    assert set(summary["by_stage"]) == {"check_object_preserved", "background", "render"}
+    assert summary["by_stage"]["background"]["calls"] == 2
+    assert summary["by_stage"]["background"]["cost_usd"] == pytest.approx(0.016)
+    assert budget.exceeded() is None
+    budget.charge_images("pose", "fal-ai/hunyuan-image/v3/instruct/edit")
+    assert "spent" in budget.exceeded()
+    with pytest.raises(BudgetExceeded):
+        budget.check()
+    assert "ran" in RunBudget(max_wall_s=0).exceeded()
+
+
+def test_vlm_with_budget_charges_usage_and_stops_over_budget():
+    vlm = object.__new__(OpenAIVLM)
+    vlm.model, vlm.usage_records, vlm.budget = "gpt-5.2-2025-12-11", [], None
+    budget = RunBudget(max_usd=0.001)
+    budgeted = with_budget(vlm, budget)
+    usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=100)
+    budgeted._record_usage(usage, VLMPrompt(user="hi", template_name="check"))
+    # Usage records are shared; only the budgeted copy charges the budget
+    assert len(vlm.usage_records) == 1 and vlm.budget is None
+    assert budget.summary()["by_stage"]["check"]["quantity"] == 1100
+    with pytest.raises(BudgetExceeded):
+        budgeted.generate(VLMPrompt(user="hi"))
+
+
+def test_edit_render_stops_when_over_budget(tmp_path, monkeypatch):
+    render_path = tmp_path / "render.png"
+    Image.new("RGB", (8, 8)).save(render_path)
+
+    def over_budget_background(*args):
+        raise BudgetExceeded("spent $1.00 of $1.00")
+
+    monkeypatch.setattr(mavis, "_add_background_with_retries", over_budget_background)
+    specs = ActionSceneSpecs(position={}, orientation={"dog": []}, size={}, state={"dog": []})
+    kwargs = dict(
+        vlm=SimpleNamespace(),
+        action_scene=ActionScene(who="dog", does="throws", what="chair"),
+        action_scene_specs=specs,
+        objects_are_animate={"dog": True},
+        run_ctx=RunContext(run_uid="run", output_dir=tmp_path),
+        render_id="0000",
+        render_path=render_path,
+        masks={"dog": render_path, "all": render_path},
+    )
+    assert mavis.edit_render(**kwargs, budget=RunBudget(max_usd=1.0)) is None
+    # A budget that is already exceeded stops the chain before any edit
+    assert mavis.edit_render(**kwargs, budget=RunBudget(max_wall_s=0)) is None
+
+
+def test_target_mode_renders_nothing_once_over_budget(monkeypatch):
+    def fake_iter_scene_renders(plan, first_pov, n_povs):
+        raise AssertionError("rendered over budget")
+
+    monkeypatch.setattr(mavis, "iter_scene_renders", fake_iter_scene_renders)
+    plan = SimpleNamespace(run_ctx=None, budget=RunBudget(max_wall_s=0))
+    with pytest.warns(UserWarning, match="over budget"):
+        final_paths = mavis._edit_until_target_successes(plan, 2, max_concurrent_renders=1)
+    assert final_paths == {}
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mavis import compositing
+from mavis.compositing import (
+    PLATE_RESERVATION_TIMEOUT_S,
+    PLATES_PER_BG_TYPE,
+    PlateUnavailableError,
+    blend_local_edit,
+    choose_plate,
+    composite_render_onto_plate,
+    crop_for_local_edit,
+    group_disjoint_regions,
+    list_plates,
+    merge_local_edits,
+    release_plate_reservation,
+    reserve_plate_path,
+)
+
+
+def test_composite_keeps_objects_and_replaces_background(tmp_path):
+    render = np.zeros((40, 60, 3), dtype=np.uint8)
+    render[10:30, 20:40] = (200, 40, 40)
+    mask = np.zeros((40, 60), dtype=np.uint8)
+    mask[10:30, 20:40] = 255
+    Image.fromarray(render).save(tmp_path / "render.png")
+    Image.fromarray(mask).save(tmp_path / "mask.png")
+    # Plate of a different size/aspect ratio is fitted to the render
+    Image.new("RGB", (120, 120), (30, 160, 30)).save(tmp_path / "plate.png")
+
+    save_path = tmp_path / "composite.png"
+    composite_render_onto_plate(
+        tmp_path / "render.png", tmp_path / "mask.png", tmp_path / "plate.png", save_path
+    )
+
+    composite = np.asarray(Image.open(save_path)).astype(int)
+    assert composite.shape == (40, 60, 3)
+    assert tuple(composite[0, 0]) == (30, 160, 30)
+    # Object stays red, slightly pulled toward the plate's colour
+    r, g, b = composite[20, 30]
+    assert r > 120 and r < 200 and g > 40 and g < r
+    # Contact shadow darkens the plate just below the object
+    assert composite[31, 30, 1] < 160
+
+
+def test_plate_bank_reserves_distinct_slots_until_full(tmp_path, monkeypatch):
+    monkeypatch.setattr(compositing, "BACKGROUND_PLATES_DIR_PATH", tmp_path)
+    reserved = [reserve_plate_path("City Street") for _ in range(PLATES_PER_BG_TYPE)]
+    assert len(set(reserved)) == PLATES_PER_BG_TYPE
+    assert reserve_plate_path("City Street") is None
+
+    # A failed generation frees its slot; a finished one keeps it
+    release_plate_reservation(reserved[0])
+    Image.new("RGB", (4, 4)).save(reserved[1])
+    release_plate_reservation(reserved[1])
+    assert reserve_plate_path("City Street") == reserved[0]
+    assert list_plates("City Street") == [reserved[1]]
+
+
+def test_stale_plate_reservations_are_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(compositing, "BACKGROUND_PLATES_DIR_PATH", tmp_path)
+    reserved = [reserve_plate_path("Beach") for _ in range(PLATES_PER_BG_TYPE)]
+    assert reserve_plate_path("Beach") is None
+    # A crashed run never released its reservation
+    stale_time = time.time() - PLATE_RESERVATION_TIMEOUT_S - 1
+    os.utime(reserved[2].with_suffix(".reserved"), (stale_time, stale_time))
+    assert reserve_plate_path("Beach") == reserved[2]
+
+
+def test_choose_plate_waits_for_plates_being_generated(tmp_path, monkeypatch):
+    monkeypatch.setattr(compositing, "BACKGROUND_PLATES_DIR_PATH", tmp_path)
+    monkeypatch.setattr(compositing, "PLATE_POLL_INTERVAL_S", 0.01)
+    plate_path = reserve_plate_path("Forest")
+    timer = threading.Timer(0.1, lambda: Image.new("RGB", (4, 4)).save(plate_path))
+    timer.start()
+    assert choose_plate("Forest", timeout_s=5) == plate_path
+    timer.join()
+
+    # Without plates or reservations in flight, there is nothing to wait for
+    with pytest.raises(PlateUnavailableError):
+        choose_plate("Desert", timeout_s=5)
+    reserve_plate_path("Desert")
+    with pytest.raises(PlateUnavailableError):
+        choose_plate("Desert", timeout_s=0.05)
+
+
+def _save_mask(path, box, size=(100, 100)):
+    mask = np.zeros(size[::-1], dtype=np.uint8)
+    left, top, right, bottom = box
+    mask[top:bottom, left:right] = 255
+    Image.fromarray(mask).save(path)
+
+
+def test_local_edit_only_changes_pixels_near_the_object(tmp_path):
+    Image.new("RGB", (100, 100), (90, 90, 90)).save(tmp_path / "image.png")
+    _save_mask(tmp_path / "mask.png", (10, 10, 30, 30))
+
+    bbox = crop_for_local_edit(
+        tmp_path / "image.png",
+        tmp_path / "mask.png",
+        tmp_path / "crop.png",
+        tmp_path / "crop_mask.png",
+    )
+    left, top, right, bottom = bbox
+    assert Image.open(tmp_path / "crop.png").size == (right - left, bottom - top)
+
+    # The edit model returns its crop at a different resolution, fully repainted
+    Image.new("RGB", (256, 256), (250, 0, 0)).save(tmp_path / "edited_crop.png")
+    blend_local_edit(
+        tmp_path / "image.png",
+        tmp_path / "edited_crop.png",
+        tmp_path / "mask.png",
+        bbox,
+        tmp_path / "blended.png",
+    )
+
+    blended = np.asarray(Image.open(tmp_path / "blended.png")).astype(int)
+    assert tuple(blended[20, 20]) == (250, 0, 0)
+    assert tuple(blended[top, right - 1]) == (90, 90, 90)  # crop corner
+    assert tuple(blended[80, 80]) == (90, 90, 90)
+
+
+def test_disjoint_local_edits_are_grouped_and_merged(tmp_path):
+    regions = {"a": (0, 0, 40, 40), "b": (50, 50, 90, 90), "c": (30, 30, 60, 60)}
+    assert group_disjoint_regions(regions) == [["a", "b"], ["c"]]
+    assert group_disjoint_regions({"a": (0, 0, 9, 9), "b": None}) == [["a"], ["b"]]
+
+    Image.new("RGB", (100, 100), (0, 0, 0)).save(tmp_path / "image.png")
+    _save_mask(tmp_path / "mask_a.png", (5, 5, 15, 15))
+    _save_mask(tmp_path / "mask_b.png", (70, 70, 80, 80))
+    for name, color, (left, top, right, bottom) in [
+        ("a", (255, 0, 0), (5, 5, 15, 15)),
+        ("b", (0, 0, 255), (70, 70, 80, 80)),
+    ]:
+        edit = np.zeros((100, 100, 3), dtype=np.uint8)
+        edit[top:bottom, left:right] = color
+        Image.fromarray(edit).save(tmp_path / f"edit_{name}.png")
+
+    merge_local_edits(
+        tmp_path / "image.png",
+        [
+            (tmp_path / "edit_a.png", tmp_path / "mask_a.png"),
+            (tmp_path / "edit_b.png", tmp_path / "mask_b.png"),
+        ],
+        tmp_path / "merged.png",
+    )
+    merged = np.asarray(Image.open(tmp_path / "merged.png"))
+    assert tuple(merged[10, 10]) == (255, 0, 0)
+    assert tuple(merged[75, 75]) == (0, 0, 255)
+    assert tuple(merged[40, 40]) == (0, 0, 0)
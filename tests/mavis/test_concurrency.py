@@ -0,0 +1,35 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mavis.concurrency import (
+    PROVIDER_CONCURRENCY_LIMITS,
+    Provider,
+    provider_slot,
+    set_provider_concurrency_limit,
+)
+
+
+def test_provider_slot_bounds_concurrent_requests():
+    original_limit = PROVIDER_CONCURRENCY_LIMITS[Provider.fal]
+    set_provider_concurrency_limit(Provider.fal, 2)
+    in_flight, max_in_flight = 0, 0
+    lock = threading.Lock()
+
+    def request():
+        nonlocal in_flight, max_in_flight
+        with provider_slot(Provider.fal):
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            for _ in range(6):
+                executor.submit(request)
+    finally:
+        set_provider_concurrency_limit(Provider.fal, original_limit)
+    assert max_in_flight == 2
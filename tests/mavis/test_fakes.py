@@ -0,0 +1,146 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mavis.budget import RunBudget
+from mavis.edits import EditCancelled, add_background
+from mavis.fakes import (
+    FaultModel,
+    FakeHTTPError,
+    LatencyModel,
+    fake_blender,
+    fake_fal,
+    fake_scene_placements_response,
+    fake_vlm,
+)
+from mavis.globals import RunContext
+from mavis.mavis import generate_scene_params_structured, start_scene_render_subprocess
+from mavis.prechecks import background_edit_passes_prechecks
+from mavis.resilience import ContentPolicyError
+from mavis.schema import ActionScene, ActionSceneSpecs, BinaryResponse, YesNo
+from mavis.transfers import ensure_local
+from mavis.utils import iter_renders_as_completed
+from mavis.vlm import VLMPrompt
+
+
+def _prompt(template_name: str) -> VLMPrompt:
+    return VLMPrompt(template_name=template_name, user="Is it a dog? (Yes/No)")
+
+
+def test_fake_vlm_answers_checks_and_records_usage():
+    vlm = fake_vlm(responses={"greeting": "hello there"})
+    response = vlm.generate_structured(_prompt("check"), BinaryResponse)
+    assert response.answer == YesNo.yes
+    assert vlm.generate(_prompt("greeting")) == "hello there"
+    assert "".join(vlm.generate_stream(_prompt("greeting"))) == "hello there"
+    assert len(vlm.usage_records) == 3
+    assert all(record.prompt_tokens > 0 for record in vlm.usage_records)
+
+
+def test_fake_vlm_streams_closed_early_still_charge_usage():
+    budget = RunBudget()
+    vlm = fake_vlm(responses={"long": "x" * 400}).with_budget(budget)
+    stream = vlm.generate_stream(_prompt("long"))
+    next(stream)
+    stream.close()
+    # The usage chunk never arrived, so the usage was estimated
+    (record,) = vlm.usage_records
+    assert record.prompt_tokens > 0 and 0 < record.completion_tokens < 100
+    assert budget.spent_usd > 0
+
+
+def test_structured_scene_params_are_regenerated_when_invalid():
+    action_scene = ActionScene(who="dog", does="throws", what="chair")
+    n_calls = 0
+
+    def placements(messages, response_format):
+        nonlocal n_calls
+        n_calls += 1
+        if n_calls == 1:
+            # What the schema's validators raise for e.g. an unknown object_name
+            raise ValueError("Unknown object_name 'cat'")
+        return fake_scene_placements_response(action_scene)
+
+    vlm = fake_vlm(responses={"generate_scene_params": placements})
+    no_specs = ActionSceneSpecs(position={}, orientation={}, size={}, state={})
+    specs = generate_scene_params_structured(vlm, action_scene, "", no_specs)
+    assert [spec["object_name"] for spec in specs] == ["dog", "chair"]
+    assert n_calls == 2
+
+
+def test_fake_vlm_faults_go_through_resilience():
+    vlm = fake_vlm(faults=FaultModel(rate_limit_rate=1.0))
+    with pytest.raises(FakeHTTPError):
+        vlm.generate_structured(_prompt("rate_limited"), BinaryResponse)
+    # Each attempt (all 429s) was retried until the attempt limit
+    assert vlm._client.n_calls["rate_limited"] > 1
+
+    vlm = fake_vlm(faults=FaultModel(content_policy_rate=1.0))
+    with pytest.raises(ContentPolicyError):
+        vlm.generate_structured(_prompt("rejected"), BinaryResponse)
+    assert vlm._client.n_calls["rejected"] == 1
+
+
+def test_fake_fal_background_edit_round_trips(tmp_path):
+    run_ctx = RunContext(run_uid="run", output_dir=tmp_path)
+    pixels = np.full((128, 128, 3), 128, dtype=np.uint8)
+    pixels[48:80, 48:80] = (200, 40, 40)
+    render_path, mask_path = tmp_path / "render.png", tmp_path / "all.png"
+    Image.fromarray(pixels).save(render_path)
+    mask = np.zeros((128, 128), dtype=np.uint8)
+    mask[48:80, 48:80] = 255
+    Image.fromarray(mask).save(mask_path)
+
+    with fake_fal(tmp_path / "fal_store") as fal_client:
+        edited_path = add_background(
+            "0000",
+            run_ctx,
+            render_path,
+            ActionScene(who="dog", does="throws", what="chair"),
+            model="fal-ai/flux-2/edit",
+        )
+        ensure_local(edited_path)
+    assert fal_client.n_calls == {"upload": 1, "fal-ai/flux-2/edit": 1}
+    passed, reason = background_edit_passes_prechecks(render_path, edited_path, mask_path)
+    assert passed, reason
+
+
+def test_queued_edits_are_cancelled_once_not_needed(tmp_path):
+    run_ctx = RunContext(run_uid="run", output_dir=tmp_path)
+    render_path = tmp_path / "render.png"
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(render_path)
+    budget = RunBudget()
+    cancelled = threading.Event()
+    cancelled.set()
+
+    with fake_fal(tmp_path / "fal_store", queue_latency=LatencyModel(5.0)) as fal_client:
+        with pytest.raises(EditCancelled):
+            add_background(
+                "0000",
+                run_ctx,
+                render_path,
+                ActionScene(who="dog", does="throws", what="chair"),
+                model="fal-ai/flux-2/edit",
+                budget=budget,
+                cancelled=cancelled,
+            )
+    assert fal_client.n_calls == {"upload": 1, "cancel": 1}
+    assert budget.spent_usd == 0
+
+
+def test_fake_blender_publishes_renders_and_masks(tmp_path):
+    run_ctx = RunContext(run_uid="run", output_dir=tmp_path)
+    run_ctx.renders_dir.mkdir(parents=True)
+    placements = [{"object_name": "dog"}, {"object_name": "chair"}]
+    run_ctx.placement_specs_path.write_text(json.dumps(placements))
+
+    with fake_blender():
+        process = start_scene_render_subprocess(run_ctx, first_pov=2, n_povs=2)
+        renders = list(iter_renders_as_completed(run_ctx, process, poll_interval=0.05))
+    assert [render_id for render_id, _, _ in renders] == ["0002", "0003"]
+    for _, render_path, masks in renders:
+        assert render_path.exists()
+        assert set(masks) == {"dog", "chair", "all"}
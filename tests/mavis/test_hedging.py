@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from mavis.budget import BudgetExceeded
+from mavis.hedging import HedgeConfig, run_hedged_attempts
+
+
+def _select_model(try_number: int, in_flight: set[str]) -> str:
+    for model in ["slow", "fast", "other"]:
+        if model not in in_flight:
+            return model
+    return "slow"
+
+
+def test_first_successful_attempt_wins_without_waiting_for_losers():
+    started_models = []
+
+    def attempt(try_number: int, model: str, cancelled: threading.Event):
+        started_models.append(model)
+        time.sleep(0.5 if model == "slow" else 0.01)
+        return None if cancelled.is_set() else f"{model}-result"
+
+    start = time.perf_counter()
+    result = run_hedged_attempts(attempt, _select_model, 4, HedgeConfig(k=2))
+    assert result == "fast-result"
+    assert time.perf_counter() - start < 0.4
+    # Concurrent attempts used different models
+    assert started_models[:2] == ["slow", "fast"]
+
+
+def test_failed_attempts_are_replaced_until_max_attempts():
+    n_calls = 0
+
+    def attempt(try_number: int, model: str, cancelled: threading.Event):
+        nonlocal n_calls
+        n_calls += 1
+        if try_number == 2:
+            raise RuntimeError("content policy violation")
+        return None
+
+    with pytest.warns(UserWarning, match="content policy violation"):
+        assert run_hedged_attempts(attempt, _select_model, 3, HedgeConfig(k=2)) is None
+    assert n_calls == 3
+
+
+def test_reraised_errors_cancel_the_other_attempts():
+    n_calls = 0
+    cancelled_seen = []
+
+    def attempt(try_number: int, model: str, cancelled: threading.Event):
+        nonlocal n_calls
+        n_calls += 1
+        if model == "fast":
+            raise BudgetExceeded("cost limit reached")
+        time.sleep(0.05)
+        cancelled_seen.append(cancelled.is_set())
+        return None
+
+    with pytest.raises(BudgetExceeded):
+        run_hedged_attempts(
+            attempt, _select_model, 4, HedgeConfig(k=2), reraise=(BudgetExceeded,)
+        )
+    time.sleep(0.1)
+    # No attempt was started after the error, and the one in flight saw it cancelled
+    assert n_calls == 2
+    assert cancelled_seen == [True]
+
+
+def test_extra_attempts_are_capped_across_edits():
+    hedge = HedgeConfig(k=3, max_extra_in_flight=1)
+    max_in_flight, in_flight = 0, 0
+    lock = threading.Lock()
+
+    def attempt(try_number: int, model: str, cancelled: threading.Event):
+        nonlocal max_in_flight, in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return None
+
+    threads = [
+        threading.Thread(target=run_hedged_attempts, args=(attempt, _select_model, 3, hedge))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # One primary attempt per edit plus at most one speculative attempt overall
+    assert max_in_flight <= 3
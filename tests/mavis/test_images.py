@@ -0,0 +1,72 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from mavis import images
+from mavis.images import compute_mask_bbox, encode_image_to_data_url
+from mavis.schema import ImageFormat, ImagePayloadOptions
+
+
+def _decode(data_url: str) -> Image.Image:
+    b64 = data_url.split(",", 1)[1]
+    return Image.open(io.BytesIO(base64.b64decode(b64)))
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "render.png"
+    Image.new("RGBA", (1024, 1024), (120, 80, 40, 255)).save(path)
+    return path
+
+
+@pytest.fixture
+def mask_path(tmp_path):
+    path = tmp_path / "dog.png"
+    mask = Image.new("L", (512, 512), 0)
+    mask.paste(255, (100, 200, 200, 300))
+    mask.save(path)
+    return path
+
+
+def test_encode_without_options_sends_original_bytes(image_path):
+    data_url = encode_image_to_data_url(image_path)
+    assert data_url.startswith("data:image/png;base64,")
+    assert base64.b64decode(data_url.split(",", 1)[1]) == image_path.read_bytes()
+
+
+def test_encode_downscales_and_reencodes(image_path):
+    options = ImagePayloadOptions(max_side=256, format=ImageFormat.jpeg)
+    data_url = encode_image_to_data_url(image_path, options)
+    assert data_url.startswith("data:image/jpeg;base64,")
+    img = _decode(data_url)
+    assert img.format == "JPEG"
+    assert img.size == (256, 256)
+
+
+def test_compute_mask_bbox_scales_to_image(mask_path):
+    # Mask is 512px, image is 1024px: bbox doubles; padding is 10% of 200px
+    bbox = compute_mask_bbox(mask_path, (1024, 1024), padding=0.1)
+    assert bbox == (180, 380, 420, 620)
+
+
+def test_encode_crops_to_mask(image_path, mask_path):
+    options = ImagePayloadOptions(
+        max_side=None, format=ImageFormat.png, crop_mask_path=mask_path, crop_padding=0.0
+    )
+    img = _decode(encode_image_to_data_url(image_path, options))
+    assert img.size == (200, 200)
+
+
+def test_encodings_are_memoized_by_content(image_path, tmp_path, monkeypatch):
+    options = ImagePayloadOptions(max_side=128)
+    first = encode_image_to_data_url(image_path, options)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("expected a cache hit")
+
+    monkeypatch.setattr(images, "_encode_transformed", fail)
+    copy_path = tmp_path / "copy.png"
+    copy_path.write_bytes(image_path.read_bytes())
+    assert encode_image_to_data_url(copy_path, options) == first
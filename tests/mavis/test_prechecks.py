@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from mavis.prechecks import background_edit_passes_prechecks, pose_edit_passes_prechecks
+
+SIZE = 128
+
+
+@pytest.fixture
+def scene(tmp_path):
+    """A textured scene with one object (a bright square) and its mask."""
+    rng = np.random.default_rng(0)
+    image = rng.integers(40, 200, (SIZE // 8, SIZE // 8, 3), dtype=np.uint8)
+    image = np.kron(image, np.ones((8, 8, 1), dtype=np.uint8))
+    image[40:70, 40:70] = (240, 220, 30)
+    mask = np.zeros((SIZE, SIZE), dtype=np.uint8)
+    mask[40:70, 40:70] = 255
+    Image.fromarray(image).save(tmp_path / "pre.png")
+    Image.fromarray(mask).save(tmp_path / "mask.png")
+    return tmp_path, image
+
+
+def _save(path, image):
+    Image.fromarray(image).save(path)
+    return path
+
+
+def test_pose_edit_near_object_passes(scene):
+    tmp_path, image = scene
+    edited = image.copy()
+    edited[38:72, 44:66] = (30, 220, 240)  # Reshaped/recoloured object
+    # Edit models often return a different resolution
+    post = Image.fromarray(edited).resize((2 * SIZE, 2 * SIZE))
+    post.save(tmp_path / "post.png")
+    passed, reason = pose_edit_passes_prechecks(
+        tmp_path / "pre.png", tmp_path / "post.png", tmp_path / "mask.png"
+    )
+    assert passed, reason
+
+
+@pytest.mark.parametrize(
+    "breakage, expected_reason",
+    [
+        ("repaint", "changed globally"),
+        ("change_background", "away from the edited object"),
+        ("blank", "blanked"),
+        ("duplicate", "duplicated"),
+    ],
+)
+def test_pose_edit_obviously_broken_is_rejected(scene, breakage, expected_reason):
+    tmp_path, image = scene
+    edited = image.copy()
+    if breakage == "repaint":
+        edited = 255 - edited
+    elif breakage == "change_background":
+        edited[:, 76:] = 255 - edited[:, 76:]
+    elif breakage == "blank":
+        edited[:48, :] = 128
+    elif breakage == "duplicate":
+        edited[88:120, 0:128] = np.tile(image[40:72, 40:72], (1, 4, 1))
+    post = _save(tmp_path / "post.png", edited)
+    passed, reason = pose_edit_passes_prechecks(tmp_path / "pre.png", post, tmp_path / "mask.png")
+    assert not passed
+    assert expected_reason in reason
+
+
+def test_background_edit_prechecks(scene):
+    tmp_path, image = scene
+    render = np.full_like(image, 64)
+    render[40:70, 40:70] = image[40:70, 40:70]
+    _save(tmp_path / "render.png", render)
+
+    passed, reason = background_edit_passes_prechecks(
+        tmp_path / "render.png", tmp_path / "pre.png", tmp_path / "mask.png"
+    )
+    assert passed, reason
+
+    # Background left as rendered
+    passed, reason = background_edit_passes_prechecks(
+        tmp_path / "render.png", tmp_path / "render.png", tmp_path / "mask.png"
+    )
+    assert not passed and "left blank" in reason
+
+    # Object replaced
+    broken = image.copy()
+    broken[40:70, 40:70] = (0, 0, 0)
+    passed, reason = background_edit_passes_prechecks(
+        tmp_path / "render.png", _save(tmp_path / "broken.png", broken), tmp_path / "mask.png"
+    )
+    assert not passed and "objects changed" in reason
@@ -9,7 +9,9 @@ from mavis.schema import (
 from mavis.prompts import (
     render_generate_scene_specs_prompt,
     render_generate_scene_setup_code_prompt,
+    render_json_repair_prompt,
 )
+from mavis.vlm import _build_openai_messages
 
 
 @pytest.fixture
@@ -73,3 +75,17 @@ def test_render_generate_scene_setup_code_prompt(
         action_scene, scene_characteristics, action_scene_specs
     )
     assert isinstance(prompts, VLMPrompt)
+
+
+def test_render_json_repair_prompt_keeps_conversation(action_scene):
+    prompt = render_generate_scene_specs_prompt(action_scene)
+    repaired = render_json_repair_prompt(
+        prompt, "```json\n{oops}\n```", "Expecting property name"
+    )
+    assert repaired.user == prompt.user
+    assert [m.role for m in repaired.follow_ups] == ["assistant", "user"]
+    assert "Expecting property name" in repaired.follow_ups[1].content
+
+    messages = _build_openai_messages(repaired)
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    assert messages[2]["content"] == "```json\n{oops}\n```"
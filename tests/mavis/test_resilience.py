@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+from mavis import resilience
+from mavis.concurrency import Provider
+from mavis.resilience import (
+    ContentPolicyError,
+    TokenBucket,
+    call_with_backoff,
+    clear_rate_limit,
+    get_rate_limit_override,
+    is_content_policy_error,
+    parse_retry_after,
+    set_rate_limit,
+)
+
+
+class FakeHTTPError(Exception):
+    def __init__(
+        self, status_code: int, message: str = "", headers=None, body=None
+    ) -> None:
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response_headers = headers or {}
+        self.body = body
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(resilience.time, "sleep", recorded.append)
+    return recorded
+
+
+def _failing_then_ok(errors: list[Exception]):
+    calls = []
+
+    def fn():
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return fn, calls
+
+
+def test_rate_limits_honour_retry_after(sleeps):
+    fn, calls = _failing_then_ok([FakeHTTPError(429, headers={"Retry-After": "7"})])
+    assert call_with_backoff(Provider.fal, "test-retry-after", fn) == "ok"
+    assert len(calls) == 2
+    assert 7.0 in sleeps
+
+
+def test_server_errors_back_off_exponentially(sleeps, monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    fn, calls = _failing_then_ok([FakeHTTPError(503), FakeHTTPError(502)])
+    assert call_with_backoff(Provider.fal, "test-5xx", fn) == "ok"
+    backoffs = [s for s in sleeps if s >= resilience.BASE_BACKOFF_S]
+    assert backoffs == [1.0, 2.0]
+
+
+def test_content_policy_errors_fail_immediately(sleeps):
+    error = FakeHTTPError(422, "content_policy_violation: image flagged")
+    fn, calls = _failing_then_ok([error])
+    with pytest.raises(ContentPolicyError):
+        call_with_backoff(Provider.fal, "test-policy", fn)
+    assert len(calls) == 1
+
+
+def test_content_policy_errors_are_detected_by_error_code():
+    openai_error = FakeHTTPError(
+        400, "Request rejected", body={"error": {"code": "content_policy_violation"}}
+    )
+    fal_error = FakeHTTPError(
+        422, "Unprocessable", body={"detail": [{"type": "content_policy_violation"}]}
+    )
+    assert is_content_policy_error(openai_error)
+    assert is_content_policy_error(fal_error)
+    # A code (or a retryable status) overrides policy-like words in the message
+    invalid_error = FakeHTTPError(
+        400, "moderation field missing", body={"error": {"code": "invalid_value"}}
+    )
+    assert not is_content_policy_error(invalid_error)
+    assert not is_content_policy_error(FakeHTTPError(503, "moderation is unavailable"))
+
+
+def test_client_errors_are_not_retried(sleeps):
+    fn, calls = _failing_then_ok([FakeHTTPError(400, "bad request")])
+    with pytest.raises(FakeHTTPError):
+        call_with_backoff(Provider.openai, "test-400", fn)
+    assert len(calls) == 1
+
+
+def test_parse_retry_after_variants():
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"Retry-After": "3"}) == 3.0
+    assert parse_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert parse_retry_after({}) is None
+
+
+def test_token_bucket_blocks_once_burst_is_spent():
+    bucket = TokenBucket(rate=20.0, capacity=2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two requests come from the burst; the next two wait ~1/20s each
+    assert time.monotonic() - start >= 0.09
+
+
+def test_cleared_rate_limits_fall_back_to_the_provider_default():
+    set_rate_limit(Provider.fal, "test-model", 1.0, 1)
+    assert get_rate_limit_override(Provider.fal, "test-model") == (1.0, 1)
+    clear_rate_limit(Provider.fal, "test-model")
+    assert get_rate_limit_override(Provider.fal, "test-model") is None
+    assert resilience._get_bucket(Provider.fal, "test-model").rate == (
+        resilience.DEFAULT_RATE_LIMITS[Provider.fal][0]
+    )
+
+
+def test_calls_without_rate_limit_skip_the_token_bucket():
+    set_rate_limit(Provider.fal, "unlimited-test-model", 1.0, 1)
+    try:
+        start = time.monotonic()
+        for _ in range(3):
+            call_with_backoff(
+                Provider.fal, "unlimited-test-model", lambda: "ok", rate_limited=False
+            )
+        assert time.monotonic() - start < 0.5
+    finally:
+        clear_rate_limit(Provider.fal, "unlimited-test-model")
@@ -1,4 +1,7 @@
+import pytest
+
 from mavis.responses import (
+    JsonBlockStreamParser,
     parse_generate_scene_specs_response,
     parse_generate_scene_params_response,
 )
@@ -176,3 +179,42 @@ Make sure to replace the placeholder paths with the actual file paths where your
 
     blender_setup_code = parse_generate_scene_params_response(response)
     assert blender_setup_code == script
+
+
+def _stream(text: str, consumed: list[str], chunk_size: int = 7):
+    """Yield ``text`` in chunks, appending each yielded chunk to ``consumed``."""
+    for i in range(0, len(text), chunk_size):
+        consumed.append(text[i : i + chunk_size])
+        yield consumed[-1]
+
+
+def test_json_block_stream_parser_stops_at_closing_fence():
+    specs_json = (
+        '{"position": {"dog": ["near puma"]}, "orientation": {"dog": ["facing puma"]}, '
+        '"size": {}, "state": {"dog": ["mid-throw"]}}'
+    )
+    response = f"Some reasoning.\n\n```json\n{specs_json}\n```" + " trailing" * 200
+    consumed = []
+    chunks = _stream(response, consumed)
+    response = JsonBlockStreamParser(expected_opener="{").consume(chunks)
+    scene_characteristics, specs = parse_generate_scene_specs_response(response)
+    assert scene_characteristics == "Some reasoning."
+    assert specs.state == {"dog": ["mid-throw"]}
+    assert "".join(consumed).count("trailing") <= 1
+    # The generator was closed, so nothing more can be pulled from it
+    assert next(chunks, None) is None
+
+
+def test_json_block_stream_parser_fails_fast_on_wrong_json_type():
+    response = '```json\n{"object_name": "dog"}\n```' + " trailing" * 200
+    consumed = []
+    with pytest.raises(ValueError, match="start with '\\['"):
+        JsonBlockStreamParser(expected_opener="[").consume(_stream(response, consumed))
+    assert len(consumed) < 5
+
+
+def test_json_block_stream_parser_unclosed_block():
+    chunks = _stream('```json\n[{"object_name": "dog"', [])
+    response = JsonBlockStreamParser(expected_opener="[").consume(chunks)
+    with pytest.raises(ValueError, match="unclosed"):
+        parse_generate_scene_params_response(response)
@@ -0,0 +1,65 @@
+from collections import Counter
+
+from mavis import routing
+from mavis.routing import EditStage, ModelRouter
+
+DISTRIBUTIONS = {
+    EditStage.background: {1: {"model-a": 0.5, "model-b": 0.5}},
+    EditStage.pose: {1: {"model-a": 0.9, "model-c": 0.1}},
+}
+
+
+def test_select_favours_models_with_more_accepted_edits_per_second(tmp_path):
+    router = ModelRouter(DISTRIBUTIONS, stats_path=tmp_path / "stats.json")
+    for _ in range(30):
+        router.record_attempt(EditStage.background, "model-a", 10.0, preserved=True)
+        router.record_attempt(EditStage.background, "model-b", 40.0, preserved=False)
+    picks = Counter(router.select(EditStage.background, 1) for _ in range(200))
+    assert picks["model-a"] > 190
+
+
+def test_select_skips_excluded_models_when_possible(tmp_path):
+    router = ModelRouter(DISTRIBUTIONS, stats_path=None)
+    assert router.select(EditStage.pose, 1, exclude={"model-a"}) == "model-c"
+    assert router.select(EditStage.pose, 1, exclude={"model-a", "model-c"}) in {
+        "model-a",
+        "model-c",
+    }
+
+
+def test_stats_are_persisted(tmp_path):
+    stats_path = tmp_path / "stats.json"
+    router = ModelRouter(DISTRIBUTIONS, stats_path=stats_path)
+    router.record_attempt(EditStage.pose, "model-c", 12.0, preserved=True)
+    router.record_improvement_check(EditStage.pose, "model-c", is_improvement=False)
+    router.record_attempt(EditStage.pose, "model-c", 0.0, error=True)
+    # Records are saved in batches
+    assert not stats_path.exists()
+    router.save()
+
+    stats = ModelRouter(DISTRIBUTIONS, stats_path=stats_path).stats(
+        EditStage.pose, "model-c"
+    )
+    assert stats.n_attempts == 2
+    assert stats.n_errors == 1
+    assert stats.n_accepted == 0
+    assert stats.total_latency_s == 12.0
+
+
+def test_stats_are_saved_every_n_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(routing, "SAVE_EVERY_N_RECORDS", 2)
+    stats_path = tmp_path / "stats.json"
+    router = ModelRouter(DISTRIBUTIONS, stats_path=stats_path)
+    router.record_attempt(EditStage.pose, "model-c", 12.0, preserved=True)
+    assert not stats_path.exists()
+    router.record_improvement_check(EditStage.pose, "model-c", is_improvement=True)
+    assert stats_path.exists()
+
+
+def test_unchecked_attempts_only_count_towards_latency(tmp_path):
+    router = ModelRouter(DISTRIBUTIONS, stats_path=None)
+    router.record_attempt(EditStage.pose, "model-c", 10.0, preserved=True)
+    router.record_attempt(EditStage.pose, "model-c", 20.0, checked=False)
+    stats = router.stats(EditStage.pose, "model-c")
+    assert (stats.n_attempts, stats.n_checked, stats.n_accepted) == (2, 1, 1)
+    assert stats.total_latency_s == 30.0
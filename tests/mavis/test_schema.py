@@ -0,0 +1,39 @@
+import pytest
+from pydantic import ValidationError
+
+from mavis.schema import SceneSpecsResponse, ScenePlacementsResponse
+
+
+def test_scene_specs_response_converts_to_action_scene_specs():
+    response = SceneSpecsResponse.model_validate(
+        {
+            "scene_characteristics": "The dog must be mid-throw.",
+            "specs": {
+                "position": [{"object_name": "dog", "specs": ["near the puma"]}],
+                "orientation": [{"object_name": "dog", "specs": ["facing puma"]}],
+                "size": [],
+                "state": [
+                    {"object_name": "dog", "specs": ["paw outstretched"]},
+                    {"object_name": "chair", "specs": ["flying through air"]},
+                ],
+            },
+        }
+    )
+    specs = response.specs.to_action_scene_specs()
+    assert specs.position == {"dog": ["near the puma"]}
+    assert specs.size == {}
+    assert specs.state == {
+        "dog": ["paw outstretched"],
+        "chair": ["flying through air"],
+    }
+
+
+def test_scene_placements_response_rejects_unknown_objects():
+    placement = {
+        "object_name": "not-an-object",
+        "target_location": [0.0, 0.0, 0.0],
+        "target_facing_direction": None,
+        "touching_ground": True,
+    }
+    with pytest.raises(ValidationError, match="unknown object_name"):
+        ScenePlacementsResponse(placements=[placement])
@@ -0,0 +1,77 @@
+from PIL import Image
+
+from mavis import mavis
+from mavis.globals import RunContext
+from mavis.schema import ActionSceneSpecs
+from mavis.stages import Stage, StageManifest, stage_key
+
+
+def test_manifest_persists_and_invalidates_changed_artifacts(tmp_path):
+    artifact = tmp_path / "background.png"
+    artifact.write_bytes(b"v1")
+    key = stage_key(Stage.background, render="abc", render_id="0000")
+    assert key == stage_key(Stage.background, render_id="0000", render="abc")
+    assert key != stage_key(Stage.background, render="abd", render_id="0000")
+
+    StageManifest(tmp_path / "manifest.json").record(
+        Stage.background, key, {"path": str(artifact)}, files=[artifact]
+    )
+    resumed = StageManifest(tmp_path / "manifest.json")
+    assert resumed.get(key) == {"path": str(artifact)}
+
+    artifact.write_bytes(b"v2")
+    assert resumed.get(key) is None
+
+
+def test_changed_pose_spec_reruns_only_dependent_stages(tmp_path, monkeypatch):
+    run_ctx = RunContext(run_uid="run", output_dir=tmp_path)
+    render_path = tmp_path / "render.png"
+    Image.new("RGB", (8, 8)).save(render_path)
+    calls = []
+
+    def fake_add_background(vlm, action_scene, run_ctx, render_id, render_path, *args):
+        calls.append("background")
+        path = tmp_path / "background.png"
+        path.write_bytes(b"background")
+        return path, "model"
+
+    def fake_edit_object_pose(*args):
+        object_name, start_img_path = args[7], args[6]
+        calls.append(object_name)
+        path = tmp_path / f"{object_name}.png"
+        path.write_bytes(open(start_img_path, "rb").read() + object_name.encode())
+        return path
+
+    monkeypatch.setattr(mavis, "_add_background_with_retries", fake_add_background)
+    monkeypatch.setattr(mavis, "_edit_object_pose", fake_edit_object_pose)
+
+    def edit(dog_state: str) -> None:
+        specs = ActionSceneSpecs(
+            position={},
+            size={},
+            orientation={"puma": ["facing left"], "dog": [], "chair": []},
+            state={"puma": ["crouching"], "dog": [dog_state], "chair": ["upright"]},
+        )
+        final_path = mavis.edit_render(
+            vlm=None,
+            action_scene=None,
+            action_scene_specs=specs,
+            objects_are_animate={"puma": True, "dog": True, "chair": False},
+            run_ctx=run_ctx,
+            render_id="0000",
+            render_path=render_path,
+            masks={name: tmp_path / f"{name}_mask.png" for name in specs.state},
+            manifest=StageManifest(run_ctx.stage_manifest_path),
+        )
+        assert final_path.read_bytes() == b"backgroundpumadogchair"
+
+    edit("sitting")
+    assert calls == ["background", "puma", "dog", "chair"]
+
+    calls.clear()
+    edit("sitting")
+    assert calls == []
+
+    calls.clear()
+    edit("jumping")
+    assert calls == ["dog", "chair"]
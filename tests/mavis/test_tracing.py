@@ -0,0 +1,62 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mavis.tracing import (
+    Tracer,
+    format_latency_breakdown,
+    latency_breakdown,
+    span,
+    submit_in_context,
+    use_tracer,
+)
+
+
+def test_spans_reach_the_tracer_from_worker_threads_and_export(tmp_path):
+    tracer = Tracer()
+
+    def edit(try_number: int) -> None:
+        with span("edit.pose", "edit", model="m", try_number=try_number) as attrs:
+            attrs["outcome"] = "passed"
+
+    with use_tracer(tracer), ThreadPoolExecutor(2) as executor:
+        futures = [submit_in_context(executor, edit, i) for i in range(3)]
+        # Plain submits run outside the tracer's context
+        futures.append(executor.submit(edit, 99))
+        for future in futures:
+            future.result()
+        with pytest.raises(ValueError), span("check.pose", "check"):
+            raise ValueError("bad")
+    with span("outside"):
+        pass
+
+    names = [event["name"] for event in tracer.events]
+    assert sorted(names) == ["check.pose", "edit.pose", "edit.pose", "edit.pose"]
+    error_event = next(e for e in tracer.events if e["name"] == "check.pose")
+    assert error_event["args"]["outcome"] == "error"
+
+    tracer.export_chrome_trace(tmp_path / "trace.json")
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert {event["ph"] for event in trace["traceEvents"]} == {"X"}
+    assert trace["traceEvents"][0]["args"]["model"] == "m"
+
+
+def test_spans_from_another_process_are_loaded_and_broken_down(tmp_path):
+    spans_path = tmp_path / "spans.jsonl"
+    with use_tracer(Tracer(spans_path)):
+        for pov in range(2):
+            with span("blender.cycles_render", "render", pov=pov):
+                pass
+
+    parent = Tracer()
+    with use_tracer(parent), span("vlm.generate", "vlm", model="m", template="t"):
+        pass
+    parent.load_spans(spans_path)
+    parent.load_spans(tmp_path / "missing.jsonl")
+
+    breakdown = parent.latency_breakdown()
+    assert breakdown["blender.cycles_render"]["count"] == 2
+    assert breakdown["vlm.generate [t] [m]"]["count"] == 1
+    assert breakdown == latency_breakdown(parent.events)
+    assert "blender.cycles_render" in format_latency_breakdown(breakdown)
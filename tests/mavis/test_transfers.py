@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from mavis import fal, transfers
+from mavis.transfers import (
+    DownloadIntegrityError,
+    call_with_uploads,
+    download_file,
+    download_files,
+    ensure_local,
+    save_remote_result,
+    upload_file,
+)
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    monkeypatch.setattr(transfers, "_upload_urls_by_digest", OrderedDict())
+    monkeypatch.setattr(transfers, "_remote_urls_by_path", OrderedDict())
+    monkeypatch.setattr(transfers, "_pending_downloads", {})
+    uploaded = []
+
+    def fake_upload_file(path):
+        uploaded.append(path)
+        return f"https://cdn.example/{len(uploaded)}"
+
+    monkeypatch.setattr(fal, "_client", SimpleNamespace(upload_file=fake_upload_file))
+    return uploaded
+
+
+def test_identical_content_is_uploaded_once(tmp_path, uploads):
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"same bytes")
+    second.write_bytes(b"same bytes")
+    assert upload_file(first) == upload_file(second) == upload_file(first)
+    assert len(uploads) == 1
+
+
+def test_cached_urls_expire_and_are_bounded(tmp_path, uploads, monkeypatch):
+    monkeypatch.setattr(transfers, "MAX_CACHED_URLS", 2)
+    paths = [tmp_path / f"{i}.png" for i in range(3)]
+    for i, path in enumerate(paths):
+        path.write_bytes(bytes([i]))
+        upload_file(path)
+    assert len(transfers._upload_urls_by_digest) == 2
+    # The least recently used URL was evicted
+    upload_file(paths[0])
+    assert len(uploads) == 4
+
+    monkeypatch.setattr(transfers, "CACHED_URL_TTL_S", 0.0)
+    upload_file(paths[0])
+    assert len(uploads) == 5
+
+
+def test_gone_urls_are_uploaded_again(tmp_path, uploads):
+    path = tmp_path / "render.png"
+    path.write_bytes(b"render")
+    first_url = upload_file(path)
+    calls = []
+
+    def run(urls):
+        calls.append(urls)
+        if urls == [first_url]:
+            raise FakeHTTPError(410)
+        return "ok"
+
+    assert call_with_uploads([path], run) == "ok"
+    assert calls == [[first_url], ["https://cdn.example/2"]]
+    assert upload_file(path) == "https://cdn.example/2"
+
+
+def test_edit_results_chain_their_remote_url(tmp_path, uploads, monkeypatch):
+    release_download = threading.Event()
+
+    def slow_download(url, save_path):
+        release_download.wait(timeout=5)
+        save_path.write_bytes(b"edited")
+
+    monkeypatch.setattr(transfers, "download_file", slow_download)
+    save_path = tmp_path / "background.png"
+    save_remote_result("https://fal.example/result.png", save_path)
+
+    # The next edit can use the result before its local copy exists
+    assert upload_file(save_path) == "https://fal.example/result.png"
+    assert not save_path.exists()
+    assert uploads == []
+
+    release_download.set()
+    ensure_local(save_path)
+    assert save_path.read_bytes() == b"edited"
+
+
+def test_finished_downloads_are_forgotten(tmp_path, uploads, monkeypatch):
+    def download(url, save_path):
+        if save_path.name == "broken.png":
+            raise ConnectionError("reset by peer")
+        save_path.write_bytes(b"edited")
+
+    monkeypatch.setattr(transfers, "download_file", download)
+    save_remote_result("https://fal.example/dog.png", tmp_path / "dog.png")
+    save_remote_result("https://fal.example/broken.png", tmp_path / "broken.png")
+    # Only the failed download is kept (without ensure_local), so that ensure_local
+    # can still re-raise its error
+    deadline = time.monotonic() + 5
+    while len(transfers._pending_downloads) > 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert list(transfers._pending_downloads) == [transfers._key(tmp_path / "broken.png")]
+    with pytest.raises(ConnectionError):
+        ensure_local(tmp_path / "broken.png")
+
+
+def test_ensure_local_reraises_download_errors(tmp_path, uploads, monkeypatch):
+    def failing_download(url, save_path):
+        raise ConnectionError("reset by peer")
+
+    monkeypatch.setattr(transfers, "download_file", failing_download)
+    save_path = tmp_path / "dog.png"
+    save_remote_result("https://fal.example/dog.png", save_path)
+    with pytest.raises(ConnectionError):
+        ensure_local(save_path)
+
+
+@pytest.fixture
+def image_server(tmp_path):
+    from PIL import Image
+
+    png_path = tmp_path / "served.png"
+    Image.new("RGB", (32, 32), (200, 10, 10)).save(png_path)
+    bodies = {"/result.png": png_path.read_bytes(), "/broken.png": b"not an image"}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = bodies.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", bodies
+    server.shutdown()
+
+
+def test_download_files_streams_results_to_disk(tmp_path, image_server):
+    base_url, bodies = image_server
+    targets = [tmp_path / f"edit_{i}.png" for i in range(3)]
+    download_files([(f"{base_url}/result.png", path) for path in targets])
+    for path in targets:
+        assert path.read_bytes() == bodies["/result.png"]
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_download_rejects_corrupt_images(tmp_path, image_server):
+    base_url, _ = image_server
+    save_path = tmp_path / "edit.png"
+    with pytest.raises(DownloadIntegrityError):
+        download_file(f"{base_url}/broken.png", save_path)
+    assert not save_path.exists()
@@ -0,0 +1,77 @@
+import subprocess
+import sys
+
+import pytest
+
+from mavis import mavis, utils
+from mavis.globals import RunContext
+from mavis.utils import iter_renders_as_completed
+
+# Publishes two POVs a little apart, like render_scene.py, then optionally fails
+_FAKE_RENDERER = """
+import json, sys, time
+events_path = sys.argv[1]
+for render_id in ["0000", "0001"]:
+    with open(events_path, "a") as f:
+        f.write(json.dumps({"render_id": render_id}) + "\\n")
+    time.sleep(0.3)
+sys.exit(int(sys.argv[2]))
+"""
+
+
+@pytest.fixture
+def run_ctx(tmp_path):
+    run_ctx = RunContext(run_uid="run", output_dir=tmp_path)
+    run_ctx.renders_dir.mkdir(parents=True)
+    return run_ctx
+
+
+def _start_fake_renderer(run_ctx, exit_code: int) -> subprocess.Popen:
+    events_path = run_ctx.renders_dir / utils.RENDER_EVENTS_FILENAME
+    return subprocess.Popen(
+        [sys.executable, "-c", _FAKE_RENDERER, str(events_path), str(exit_code)]
+    )
+
+
+def test_renders_are_yielded_before_the_subprocess_exits(run_ctx):
+    process = _start_fake_renderer(run_ctx, exit_code=0)
+    seen = []
+    for render_id, render_path, masks in iter_renders_as_completed(
+        run_ctx, process, poll_interval=0.02
+    ):
+        seen.append((render_id, process.poll() is None))
+        assert render_path == run_ctx.renders_dir / f"{render_id}.png"
+    assert [render_id for render_id, _ in seen] == ["0000", "0001"]
+    # The first POV was handed over while Blender was still running
+    assert seen[0][1]
+
+
+def test_subprocess_failure_is_raised_after_published_renders(run_ctx):
+    process = _start_fake_renderer(run_ctx, exit_code=1)
+    seen = []
+    with pytest.raises(subprocess.CalledProcessError):
+        for render_id, _, _ in iter_renders_as_completed(run_ctx, process, poll_interval=0.02):
+            seen.append(render_id)
+    assert seen == ["0000", "0001"]
+
+
+def test_run_contexts_are_unique_and_round_trip_through_argv(tmp_path):
+    first, second = RunContext.create("dog"), RunContext.create("dog")
+    assert first.run_uid != second.run_uid
+
+    run_ctx = RunContext.create("dog", output_dir=tmp_path)
+    argv = ["--python", "render_scene.py", "--", *run_ctx.to_argv()]
+    assert RunContext.from_argv(argv[argv.index("--") + 1 :]) == run_ctx
+    assert run_ctx.placement_specs_path.parent == tmp_path / "renders" / run_ctx.run_uid
+
+
+def test_render_profiling_is_opt_in(run_ctx, monkeypatch):
+    argvs = []
+    monkeypatch.setattr(mavis.subprocess, "Popen", lambda args, **kwargs: argvs.append(args))
+    monkeypatch.delenv("MAVIS_PROFILE_RENDERS", raising=False)
+    mavis.start_scene_render_subprocess(run_ctx, first_pov=4, n_povs=2)
+    monkeypatch.setenv("MAVIS_PROFILE_RENDERS", "1")
+    mavis.start_scene_render_subprocess(run_ctx, first_pov=4, n_povs=2)
+    assert "--profile" not in argvs[0]
+    assert argvs[1][-1] == "--profile"
+    assert run_ctx.render_profile_path(4).name == "profile_0004.json"
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from PIL import Image
+
+from mavis.prompts import render_check_object_preserved_prompt
+from mavis.schema import ActionScene
+from mavis.vlm import (
+    _build_openai_messages,
+    _usage_record_from_response_usage,
+    summarize_usage_by_template,
+)
+
+
+def test_check_prompts_share_a_static_prefix(tmp_path):
+    image_path = tmp_path / "render.png"
+    Image.new("RGB", (64, 64), (10, 20, 30)).save(image_path)
+    action_scene = ActionScene(who="dog", does="throws", what="chair", to_whom="puma")
+
+    messages_by_object = []
+    for object_name in action_scene.object_strs:
+        prompt = render_check_object_preserved_prompt(object_name, action_scene)
+        prompt = prompt.model_copy(update={"image_paths": [image_path]})
+        messages_by_object.append(_build_openai_messages(prompt))
+
+    first, second = messages_by_object[0], messages_by_object[1]
+    # System prompt and image come before the per-object text and are identical
+    assert first[0] == second[0]
+    assert first[1]["content"][0]["type"] == "image_url"
+    assert first[1]["content"][0] == second[1]["content"][0]
+    assert first[1]["content"][-1]["type"] == "text"
+    assert first[1]["content"][-1] != second[1]["content"][-1]
+
+
+def test_summarize_usage_by_template():
+    def usage(prompt_tokens, cached_tokens):
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=10,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+            completion_tokens_details=None,
+        )
+
+    records = [
+        _usage_record_from_response_usage(usage(1000, 0), "check_object_preserved", "m"),
+        _usage_record_from_response_usage(usage(1000, 800), "check_object_preserved", "m"),
+        _usage_record_from_response_usage(usage(500, 0), None, "m"),
+    ]
+    summary = summarize_usage_by_template(records)
+    assert summary["check_object_preserved"]["calls"] == 2
+    assert summary["check_object_preserved"]["cache_hit_rate"] == 0.4
+    assert summary["untagged"]["completion_tokens"] == 10
@@ -0,0 +1,86 @@
+import time
+from types import SimpleNamespace
+
+from mavis import mavis
+from mavis.fakes import (
+    fake_blender,
+    fake_fal,
+    fake_scene_placements_response,
+    fake_scene_specs_response,
+    fake_vlm,
+)
+from mavis.globals import RunContext
+from mavis.schema import ActionScene
+from mavis.yields import MAX_POVS_PER_TARGET_SUCCESS, n_povs_to_request
+
+
+def test_n_povs_to_request_covers_expected_shortfall():
+    # Prior success rate 0.5: 3 successes need 6 POVs up front
+    assert n_povs_to_request(3, 0, 0, 0, 0) == 6
+    # Chains in flight count toward the target at the estimated rate
+    assert n_povs_to_request(3, 0, 0, 6, 6) == 0
+    # Failures so far lower the rate, so more POVs are requested
+    assert n_povs_to_request(3, 0, 4, 2, 6) > 0
+    assert n_povs_to_request(3, 3, 5, 1, 6) == 0
+    # Never beyond the POV budget
+    assert n_povs_to_request(1, 0, 50, 0, MAX_POVS_PER_TARGET_SUCCESS) == 0
+
+
+def test_edit_until_target_successes_overprovisions_then_stops(monkeypatch):
+    rendered, closed = [], []
+
+    def fake_iter_scene_renders(plan, first_pov, n_povs):
+        try:
+            for i in range(first_pov, first_pov + n_povs):
+                rendered.append(i)
+                yield f"{i:04d}", f"{i:04d}.png", {}
+        finally:
+            closed.append((first_pov, n_povs))
+
+    def fake_edit_render(render_id, cancelled, **kwargs):
+        # Only every third POV's edits succeed
+        return f"final/{render_id}.png" if int(render_id) % 3 == 2 else None
+
+    monkeypatch.setattr(mavis, "iter_scene_renders", fake_iter_scene_renders)
+    monkeypatch.setattr(mavis, "edit_render", fake_edit_render)
+    plan = SimpleNamespace(run_ctx=None, budget=None)
+    final_paths = mavis._edit_until_target_successes(plan, 2, max_concurrent_renders=1)
+
+    successes = [path for path in final_paths.values() if path is not None]
+    assert successes == ["final/0002.png", "final/0005.png"]
+    # More than the initial 4 POVs were requested, within the POV budget
+    assert len(closed) > 1
+    assert 5 <= len(rendered) <= 2 * MAX_POVS_PER_TARGET_SUCCESS
+
+
+def test_run_with_target_successes_stops_all_work_on_return(monkeypatch, tmp_path):
+    run_ctx = RunContext(run_uid="run", output_dir=tmp_path / "outputs")
+    monkeypatch.setattr(mavis.RunContext, "create", lambda label: run_ctx)
+    results = []
+
+    def recording_render_and_edit(*args, **kwargs):
+        results.append(render_and_edit(*args, **kwargs))
+        return results[-1]
+
+    render_and_edit = mavis._render_and_edit
+    monkeypatch.setattr(mavis, "_render_and_edit", recording_render_and_edit)
+    action_scene = ActionScene(who="dog", does="throws", what="chair")
+    vlm = fake_vlm(
+        responses={
+            "generate_scene_specs": fake_scene_specs_response(action_scene),
+            "generate_scene_params": fake_scene_placements_response(action_scene),
+        },
+    )
+    with fake_fal(tmp_path / "fal_store") as fal_client, fake_blender():
+        mavis.run(vlm, action_scene, target_successes=2, max_concurrent_renders=2)
+        n_calls = (dict(fal_client.n_calls), dict(vlm._client.n_calls))
+        finals = sorted(run_ctx.final_outputs_dir.iterdir())
+        time.sleep(0.2)
+        # No edit chain is still running (or paying for calls) after run returns
+        assert (dict(fal_client.n_calls), dict(vlm._client.n_calls)) == n_calls
+        assert sorted(run_ctx.final_outputs_dir.iterdir()) == finals
+
+    (edits_were_successful,) = results
+    succeeded = {render_id for render_id, ok in edits_were_successful.items() if ok}
+    assert len(succeeded) >= 2
+    assert {path.stem for path in finals} == succeeded